@@ -0,0 +1,951 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+from PIL import Image
+
+from database import Database
+from migrations import migrate, MIGRATIONS
+from cache import TeamRegistry
+from leaderboards import Leaderboards
+from keep_alive import keep_alive
+from fakes import FakeGuild, FakeInteraction, AssetServer
+import metrics
+import tracing
+from roles import edit_roles
+from embeds import EMBED_MAX_FIELDS, EMBED_MAX_CHARS, FIELD_VALUE_MAX, split_field, pack_pages
+from cards import CardRenderer, CARD_FORMATS, W, H, encode_card, prepare_custom_background, prepare_color_background, prepare_avatar
+
+# --- OFFLINE BENCHMARKS ---
+# Run with: python bench.py
+# Uses a throwaway database and fake role/member objects, no Discord needed.
+
+
+def fake_role(role_id):
+    return SimpleNamespace(id=role_id, name=f"role-{role_id}", is_default=lambda: False)
+
+
+def fake_member(user_id, roles):
+    return SimpleNamespace(id=user_id, name=f"user-{user_id}", roles=roles)
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6  # microseconds per call
+
+
+async def timed_async(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+async def bench_find_user_team(db, team_count=30, repeat=200):
+    team_ids = list(range(1000, 1000 + team_count))
+    for role_id in team_ids:
+        await db.save_team(1, role_id, "🛡️", 20, None)
+    registry = TeamRegistry(db)
+    await registry.load_all()
+
+    results = {}
+    for role_count in (5, 15, 30):
+        # Team role is last, which is the worst case for the per-role lookup
+        roles = [fake_role(r) for r in range(1, role_count)] + [fake_role(random.choice(team_ids))]
+        member = fake_member(1, roles)
+
+        async def per_role_sql():
+            for role in member.roles:
+                if await db.get_team_data(role.id):
+                    return role
+
+        results[f"{role_count}_roles"] = {
+            "sql_per_role_us": round(await timed_async(per_role_sql, repeat), 2),
+            "registry_us": round(timed(lambda: registry.find(member), repeat * 10), 2),
+        }
+    return results
+
+
+def sample_image_bytes(size, color):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def bench_card_render(cards=48):
+    bg = prepare_custom_background(sample_image_bytes((1920, 1080), (30, 90, 160)))
+    avatar = prepare_avatar(sample_image_bytes((256, 256), (200, 120, 40)))
+    results = {}
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        renderer = CardRenderer(workers)
+        renderer.start()
+        try:
+            await renderer.render(bg, avatar, "OFFICIAL SIGNING", "warmup")
+            started = time.perf_counter()
+            await asyncio.gather(*(renderer.render(bg, avatar, "OFFICIAL SIGNING", f"player{i}") for i in range(cards)))
+            elapsed = time.perf_counter() - started
+        finally:
+            renderer.close()
+        results[f"{workers}_workers"] = {"cards_per_sec": round(cards / elapsed, 2)}
+    return results
+
+
+def photo_like_bytes():
+    # Noise over a gradient compresses roughly like a real photo
+    noise = Image.effect_noise((1600, 800), 64).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((1600, 800)).convert("RGB")
+    buffer = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def bench_card_encoding(repeat=5):
+    backgrounds = {
+        "photo": prepare_custom_background(photo_like_bytes()),
+        "solid": prepare_color_background((30, 90, 160)),
+    }
+    results = {}
+    for name, background in backgrounds.items():
+        img = Image.frombytes("RGB", (W, H), background)
+        results[name] = {}
+        for card_format in CARD_FORMATS:
+            data, ext = encode_card(img, card_format, 85)
+            results[name][card_format] = {
+                "encode_ms": round(timed(lambda: encode_card(img, card_format, 85), repeat) / 1000, 2),
+                "bytes": len(data),
+                "ext": ext,
+            }
+    return results
+
+
+def bench_guild_scoping(tmp, guilds=100, players=5000, agents=500, repeat=20):
+    # "before" mimics the old single-guild tables and queries, "after" is the
+    # migrated schema with its guild-scoped queries
+    rows = [(g * 1_000_000 + u, random.randint(0, 50), random.randint(0, 3), g)
+            for g in range(1, guilds + 1) for u in range(players)]
+    fa_rows = [(g * 1_000_000 + u, "EU", "ST", "desc", "2024-01-01", g)
+               for g in range(1, guilds + 1) for u in range(agents)]
+
+    before = sqlite3.connect(os.path.join(tmp, "before.db"))
+    before.execute("CREATE TABLE player_stats (user_id INTEGER PRIMARY KEY, transfers INTEGER DEFAULT 0, demands INTEGER DEFAULT 0)")
+    before.execute("CREATE TABLE free_agents (user_id INTEGER PRIMARY KEY, region TEXT, position TEXT, description TEXT, timestamp TEXT)")
+    before.executemany("INSERT INTO player_stats VALUES (?, ?, ?)", [r[:3] for r in rows])
+    before.executemany("INSERT INTO free_agents VALUES (?, ?, ?, ?, ?)", [r[:5] for r in fa_rows])
+    before.commit()
+
+    after = sqlite3.connect(os.path.join(tmp, "after.db"))
+    migrate(after)
+    after.executemany("INSERT INTO player_stats (user_id, transfers, demands, guild_id) VALUES (?, ?, ?, ?)", rows)
+    after.executemany("INSERT INTO free_agents VALUES (?, ?, ?, ?, ?, ?)", fa_rows)
+    after.commit()
+    after.execute("ANALYZE")
+
+    guild = guilds // 2
+    queries = {
+        "top_transfers": (
+            lambda: before.execute("SELECT user_id, transfers FROM player_stats ORDER BY transfers DESC LIMIT 15").fetchall(),
+            lambda: after.execute("SELECT user_id, transfers FROM player_stats WHERE guild_id = ? ORDER BY transfers DESC LIMIT 15", (guild,)).fetchall(),
+        ),
+        "free_agents": (
+            lambda: before.execute("SELECT * FROM free_agents").fetchall(),
+            lambda: after.execute("SELECT user_id, region, position, description, timestamp FROM free_agents WHERE guild_id = ?", (guild,)).fetchall(),
+        ),
+        "player_stats": (
+            lambda: before.execute("SELECT * FROM player_stats WHERE user_id = ?", (guild * 1_000_000 + 7,)).fetchone(),
+            lambda: after.execute("SELECT user_id, transfers, demands FROM player_stats WHERE guild_id = ? AND user_id = ?", (guild, guild * 1_000_000 + 7)).fetchone(),
+        ),
+    }
+    results = {"guilds": guilds, "players_per_guild": players}
+    for name, (old, new) in queries.items():
+        results[name] = {
+            "before_ms": round(timed(old, repeat) / 1000, 3),
+            "after_ms": round(timed(new, repeat) / 1000, 3),
+        }
+    before.close()
+    after.close()
+    return results
+
+
+async def bench_free_agent_pages(tmp, listings=50000, page_size=10, repeat=50):
+    path = os.path.join(tmp, "agents.db")
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    regions, positions = ("ASIA", "EU", "NA", "SA"), ("ST", "MF", "DF", "GK")
+    conn.executemany("INSERT INTO free_agents VALUES (?, ?, ?, ?, ?, ?)",
+                     [(u, random.choice(regions), random.choice(positions), "desc", f"2024-01-01 00:00:{u:09d}", 1) for u in range(listings)])
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    results = {"listings": listings}
+    try:
+        for label, region, position in (("unfiltered", None, None), ("region+position", "EU", "ST")):
+            # Walk to a deep page so both ends of the table are measured
+            cursor, deep_cursor = None, None
+            for page in range(200):
+                rows = await db.free_agent_page(1, region, position, True, cursor, page_size)
+                cursor = (rows[-1][4], rows[-1][0])
+                if page == 150:
+                    deep_cursor = cursor
+            results[label] = {
+                "first_page_us": round(await timed_async(lambda: db.free_agent_page(1, region, position, True, None, page_size), repeat), 2),
+                "page_150_us": round(await timed_async(lambda: db.free_agent_page(1, region, position, True, deep_cursor, page_size), repeat), 2),
+            }
+    finally:
+        db.close()
+    return results
+
+
+async def bench_leaderboards(tmp, players=1_000_000, repeat=200):
+    path = os.path.join(tmp, "stats.db")
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    rng = random.Random(17)
+    conn.executemany("INSERT INTO player_stats (user_id, transfers, demands, guild_id) VALUES (?, ?, ?, 1)",
+                     ((u, int(rng.expovariate(0.3)), int(rng.expovariate(1.0))) for u in range(players)))
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    await db.start()
+    boards = Leaderboards(db)
+    async def keep(ids):
+        return {uid for uid in ids if uid % 5 != 0}  # one in five players has left the server
+    try:
+        naive = lambda: db.fetchall("SELECT user_id, transfers FROM player_stats WHERE guild_id = ? ORDER BY transfers DESC LIMIT 15", (1,))
+        started = time.perf_counter()
+        await boards.page(1, "transfers", keep)
+        rebuild_ms = (time.perf_counter() - started) * 1000
+
+        cursor = None
+        for _ in range(20):  # 300 rows in, well past the cached top-K
+            rows, _ = await boards.page(1, "transfers", keep, cursor)
+            cursor = rows[-1]
+        cached_top = (await boards.page(1, "transfers", keep))[0][-1][0]
+
+        # Incremental updates must leave the board identical to the index
+        for _ in range(500):
+            await boards.update_stat(1, rng.randrange(players), "transfer", rng.randint(1, 40))
+        await db.pending.flush()
+        expected = await db.ranked("transfers", 1, limit=100)
+        got, after = [], None
+        while len(got) < 100:
+            rows, _ = await boards.page(1, "transfers", None, after, 50)
+            got += rows
+            after = rows[-1]
+
+        return {
+            "players": players,
+            "naive_top15_us": round(await timed_async(naive, repeat), 2),
+            "rebuild_ms": round(rebuild_ms, 3),
+            "cached_page_us": round(await timed_async(lambda: boards.page(1, "transfers", keep), repeat), 2),
+            "page_20_us": round(await timed_async(lambda: boards.page(1, "transfers", keep, cursor), repeat), 2),
+            "update_cached_us": round(await timed_async(lambda: boards.update_stat(1, cached_top, "transfer"), repeat), 2),
+            "update_uncached_us": round(await timed_async(lambda: boards.update_stat(1, rng.randrange(players), "transfer"), repeat), 2),
+            "matches_index": [tuple(r) for r in expected] == [tuple(r) for r in got[:100]],
+            "counters": boards.snapshot(),
+        }
+    finally:
+        await db.stop()
+
+
+class HeldOfferView(discord.ui.View):
+    # Shape of the old in-memory TransferView, for comparison
+    def __init__(self, guild, player, from_team, to_team, to_manager, logo):
+        super().__init__(timeout=86400)
+        self.guild, self.player, self.from_team, self.to_team, self.to_manager, self.logo = guild, player, from_team, to_team, to_manager, logo
+
+    @discord.ui.button(label="Accept Transfer", style=discord.ButtonStyle.green, emoji="✅")
+    async def accept(self, interaction, button):
+        pass
+
+    @discord.ui.button(label="Decline", style=discord.ButtonStyle.red, emoji="❌")
+    async def decline(self, interaction, button):
+        pass
+
+
+async def bench_transfer_offers(tmp, offers=10_000, repeat=200):
+    db = Database(os.path.join(tmp, "offers.db"))
+    db.open(progress=None)
+    await db.start()
+    try:
+        now = time.time()
+        guild = SimpleNamespace(id=1)
+        roles = [fake_role(r) for r in range(20)]
+
+        # Old: one live view per pending offer (the members it points at
+        # exist anyway and aren't counted)
+        members = [fake_member(i, []) for i in range(offers)]
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        held = [HeldOfferView(guild, members[i], roles[i % 20], roles[(i + 1) % 20], members[-i], "🛡️")
+                for i in range(offers)]
+        held_bytes = tracemalloc.get_traced_memory()[0] - base
+        for view in held:
+            view.stop()
+        del held
+
+        # New: offers are rows; the process keeps nothing per offer
+        base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        ids = [await db.create_offer(1, i, i % 20, (i + 1) % 20, -i, "🛡️", now + (60 if i % 2 else -60)) for i in range(offers)]
+        create_us = (time.perf_counter() - started) / offers * 1e6
+        stored_bytes = tracemalloc.get_traced_memory()[0] - base - sys.getsizeof(ids) - sum(sys.getsizeof(i) for i in ids)
+        tracemalloc.stop()
+
+        live = ids[1::2]
+        get_us = await timed_async(lambda: db.get_offer(random.choice(live), now), repeat)
+        started = time.perf_counter()
+        taken = [await db.take_offer(i, now) for i in live[:repeat]]
+        take_us = (time.perf_counter() - started) / repeat * 1e6
+        double_take = await db.take_offer(live[0], now)
+        started = time.perf_counter()
+        expired = await db.delete_expired_offers(now)
+        sweep_ms = (time.perf_counter() - started) * 1000
+        return {
+            "offers": offers,
+            "held_views_bytes_per_offer": round(held_bytes / offers),
+            "stored_offers_bytes_per_offer": round(max(stored_bytes, 0) / offers),
+            "create_us": round(create_us, 2),
+            "get_us": round(get_us, 2),
+            "take_us": round(take_us, 2),
+            "second_take_is_none": double_take is None and all(taken),
+            "sweep_expired": expired,
+            "sweep_ms": round(sweep_ms, 3),
+        }
+    finally:
+        await db.stop()
+
+
+async def bench_ledger(tmp, rate=500, seconds=2.0, history_rows=200_000, repeat=100):
+    db = Database(os.path.join(tmp, "ledger.db"))
+    db.open(progress=None)
+    await db.start()
+    rng = random.Random(5)
+    try:
+        # Sustained inserts while a ticker measures how late the loop runs
+        lag = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag.append(time.perf_counter() - started - 0.005)
+
+        tick = asyncio.create_task(ticker())
+        expected = {}
+        started = time.perf_counter()
+        total = int(rate * seconds)
+        for i in range(total):
+            player, team = rng.randrange(2000), rng.randrange(40)
+            kind = rng.choice(("sign", "transfer", "release", "demand"))
+            await db.record_transaction(1, kind, player, None if kind == "sign" else team, team if kind in ("sign", "transfer") else None, 0)
+            if kind in ("sign", "transfer", "demand"):
+                await db.update_stat(1, player, "demand" if kind == "demand" else "transfer")
+            await asyncio.sleep(max(0.0, started + (i + 1) / rate - time.perf_counter()))
+        await db.pending.flush()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await tick
+        before = sorted(await db.fetchall("SELECT user_id, transfers, demands FROM player_stats WHERE guild_id = 1"))
+        await db.recompute_stats(1)
+        after = sorted(await db.fetchall("SELECT user_id, transfers, demands FROM player_stats WHERE guild_id = 1"))
+
+        # History paging on a bigger ledger
+        await db.execute_many([("INSERT INTO transactions (guild_id, type, player_id, from_team_id, to_team_id, actor_id, created_at) VALUES (1, 'transfer', ?, ?, ?, 0, 0)",
+                                (rng.randrange(20000), rng.randrange(40), rng.randrange(40))) for _ in range(history_rows)])
+        deep = (await db.fetchone("SELECT MAX(tx_id) FROM transactions"))[0] // 10
+        started = time.perf_counter()
+        await db.recompute_stats(1)
+        recompute_ms = (time.perf_counter() - started) * 1000
+        return {
+            "inserts_per_sec": round(total / elapsed),
+            "max_loop_lag_ms": round(max(lag) * 1000, 3),
+            "flushes": db.pending.flush_count,
+            "recompute_matches_counters": before == after,
+            "ledger_rows": history_rows + total,
+            "player_page_us": round(await timed_async(lambda: db.player_history(1, rng.randrange(20000)), repeat), 2),
+            "team_page_us": round(await timed_async(lambda: db.team_history(1, rng.randrange(40)), repeat), 2),
+            "team_deep_page_us": round(await timed_async(lambda: db.team_history(1, rng.randrange(40), deep), repeat), 2),
+            "recompute_ms": round(recompute_ms, 2),
+        }
+    finally:
+        await db.stop()
+
+
+async def bench_health_server(tmp, repeat=200):
+    # Scrapes the real endpoints on a local port with a stand-in bot
+    db = Database(os.path.join(tmp, "health.db"))
+    db.open(progress=None)
+    await db.start()
+    bot = SimpleNamespace(ready=False, loaded=True, latency=0.042, is_closed=lambda: False)
+    bot.is_ready = lambda: bot.ready
+    timings = metrics.histogram("bench_seconds", "Bench observations", ("kind",))
+    for i in range(50):
+        timings.observe(i / 100, "sample")
+    runner = await keep_alive(bot, db, host="127.0.0.1", port=0)
+    port = runner.addresses[0][1]
+    try:
+        async with aiohttp.ClientSession(f"http://127.0.0.1:{port}") as session:
+            async def get(path):
+                async with session.get(path) as resp:
+                    return resp.status, resp.headers.get("Content-Type"), await resp.text()
+
+            statuses = {"before_ready": {p: (await get(p))[0] for p in ("/", "/healthz", "/readyz")}}
+            bot.ready = True
+            statuses["after_ready"] = {p: (await get(p))[0] for p in ("/", "/healthz", "/readyz")}
+            _, content_type, body = await get("/metrics")
+            return {
+                "statuses": statuses,
+                "healthz": json.loads((await get("/healthz"))[2]),
+                "metrics_content_type": content_type,
+                "metrics_has_histogram": 'proxima_bench_seconds_bucket{kind="sample",le="+Inf"} 50' in body,
+                "metrics_lines": body.count("\n"),
+                "healthz_us": round(await timed_async(lambda: get("/healthz"), repeat), 2),
+                "metrics_us": round(await timed_async(lambda: get("/metrics"), repeat), 2),
+            }
+    finally:
+        await runner.cleanup()
+        await db.stop()
+
+
+async def bench_tracing(tmp, commands=200, repeat=20000):
+    # A /sign-shaped command through the real DB, role helper and render
+    # pool, with the trace log and slow-command profiler switched on
+    tracing.TRACE_LOG = os.path.join(tmp, "traces.jsonl")
+    tracing.PROFILE_DIR = os.path.join(tmp, "profiles")
+    tracing.PROFILE_MS = 30.0
+    db = Database(os.path.join(tmp, "trace.db"))
+    db.open(progress=None)
+    await db.start()
+    renderer = CardRenderer(workers=0)
+    renderer.start()
+    bg = prepare_color_background((40, 80, 160))
+
+    async def edit(**kwargs):
+        await asyncio.sleep(0.002)  # stands in for the REST call
+
+    member = fake_member(1, [fake_role(r) for r in range(1, 5)])
+    member.edit = edit
+    try:
+        for i in range(commands):
+            trace = tracing.start("sign")
+            await db.get_player_stats(1, i)
+            await edit_roles(member, add=[fake_role(99)])
+            with tracing.span("fetch"):
+                await asyncio.sleep(0.05 if i % 50 == 0 else 0.001)  # every 50th avatar fetch is slow
+            await renderer.render(bg, None, "OFFICIAL SIGNING", f"player{i}")
+            await db.update_stat(1, i, "transfer")
+            with tracing.span("send"):
+                await asyncio.sleep(0)
+            tracing.finish(trace)
+            tracing._current.reset(trace.token)
+
+        tracing.PROFILE_MS = 0
+        trace = tracing.start("overhead")
+
+        def one_span():
+            with tracing.span("db"):
+                pass
+        span_us = timed(one_span, repeat)
+        tracing._current.reset(trace.token)
+        tracing.flush_log()
+        with open(tracing.TRACE_LOG) as f:
+            lines = [json.loads(line) for line in f]
+        return {
+            "report": tracing.report()["sign"],
+            "log_lines": len(lines),
+            "log_sample": lines[-1],
+            "profiles_written": len(os.listdir(tracing.PROFILE_DIR)) if os.path.isdir(tracing.PROFILE_DIR) else 0,
+            "span_overhead_us": round(span_us, 3),
+        }
+    finally:
+        tracing.PROFILE_MS = 0
+        tracing.TRACE_LOG = ""
+        renderer.close()
+        await db.stop()
+
+
+def bench_team_list(teams=100, members=25, repeat=20):
+    # /team_list packing for a large league; every page must fit one embed
+    title = "🏆 Registered Teams List"
+    rosters = [(f"🛡️ Team {t} ({members})", [f"<@{10**17 + t * 1000 + m}> **(TM)**" for m in range(members)])
+               for t in range(teams)]
+
+    def build():
+        fields = (f for name, lines in rosters for f in split_field(name, lines))
+        return list(pack_pages(fields, reserved=len(title) + 32))
+
+    pages = build()
+    page_chars = [len(title) + 32 + sum(len(n) + len(v) for n, v in page) for page in pages]
+    return {
+        "teams": teams,
+        "members_per_team": members,
+        "pages": len(pages),
+        "max_fields_per_page": max(len(page) for page in pages),
+        "max_chars_per_page": max(page_chars),
+        "max_field_value": max(len(v) for page in pages for _, v in page),
+        "within_limits": all(len(page) <= EMBED_MAX_FIELDS for page in pages)
+                         and max(page_chars) <= EMBED_MAX_CHARS
+                         and all(len(v) <= FIELD_VALUE_MAX for page in pages for _, v in page),
+        "build_us": timed(build, repeat),
+    }
+
+
+# --- BOT CORE (main.py with fake Discord objects) ---
+
+def percentiles(values):
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": pick(1.0)}
+
+
+async def bench_bot_core(tmp, team_count=40, free_agents=1000, repeat=200):
+    # main.py must import without touching disk or network; point it at a
+    # throwaway database first
+    os.environ["DB_FILE"] = os.path.join(tmp, "core.db")
+    started = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - started) * 1000
+    side_effect_free = not os.path.exists(os.environ["DB_FILE"]) and "flask" not in sys.modules
+
+    assets = AssetServer(latency=0.005)
+    base_url = await assets.start()
+    main.db.open(progress=None)
+    await main.db.start()
+    main.backgrounds.directory = os.path.join(tmp, "card_cache")
+    main.client.http_session = main.make_http_session()
+    await main.load_cards()
+    try:
+        # A league: manager + 25-player roster per team, plus a free agent pool
+        guild = FakeGuild(1, latency=0.02)
+        mgr_role, asst_role, fa_role = guild.add_role(2, "Manager"), guild.add_role(3, "Assistant"), guild.add_role(4, "Free Agent")
+        channel = guild.add_channel(5)
+        await main.configs.save(main.GuildConfig(guild.id, mgr_role.id, asst_role.id, channel.id, fa_role.id, 1, 3))
+        team_roles, managers = [], []
+        for t in range(team_count):
+            role = guild.add_role(100 + t, f"Team {t}", 0x100000 * (t % 16) + 0x3366)
+            bg = f"{base_url}/backgrounds/{t}.png" if t % 2 else None
+            await main.teams.save(guild.id, role.id, "🛡️", 60, bg)
+            team_roles.append(role)
+            managers.append(guild.add_member(1000 + t, f"manager{t}", [role, mgr_role], asset_url=base_url))
+            for p in range(24):
+                guild.add_member(10_000 + t * 100 + p, f"player{t}-{p}", [role, asst_role] if p == 0 else [role], asset_url=base_url)
+        agents = [guild.add_member(100_000 + i, f"agent{i}", [fa_role], asset_url=base_url) for i in range(free_agents)]
+        for i, agent in enumerate(agents):
+            await main.db.save_free_agent(guild.id, agent.id, "EU", "ST", "Looking for a team", f"2024-01-01 00:{i // 60:02d}:{i % 60:02d}")
+        await main.db.pending.flush()
+
+        busy = guild.get_member(10_000)  # 3 roles, on a team
+        roster = team_roles[0].members
+        staff = main.staff_ids(guild, await main.configs.get(guild.id))
+        results = {
+            "import_ms": round(import_ms, 2),
+            "import_side_effect_free": side_effect_free,
+            "find_user_team_us": round(timed(lambda: main.find_user_team(busy), repeat * 10), 2),
+            "get_managers_of_team_us": round(await timed_async(lambda: main.get_managers_of_team(guild, team_roles[0]), repeat), 2),
+            "format_roster_list_us": round(timed(lambda: main.format_roster_list(roster, *staff), repeat * 10), 2),
+        }
+
+        started = time.perf_counter()
+        await main.generate_transaction_card(agents[0], team_roles[1].name, team_roles[1].color, "OFFICIAL SIGNING", f"{base_url}/backgrounds/1.png", team_roles[1].id, guild.id)
+        results["card_cold_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        results["card_warm_ms"] = round(await timed_async(lambda: main.generate_transaction_card(
+            agents[0], team_roles[1].name, team_roles[1].color, "OFFICIAL SIGNING", f"{base_url}/backgrounds/1.png", team_roles[1].id, guild.id), 20) / 1000, 2)
+
+        view = main.FreeAgentView(guild)
+        results["free_agent_page_us"] = round(await timed_async(view.load_page, repeat), 2)
+
+        # Transfer window opens: every manager signs free agents at once
+        lag = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                tick = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lag.append(time.perf_counter() - tick - 0.01)
+
+        calls = [FakeInteraction(guild, managers[i % team_count]) for i in range(free_agents)]
+        requests_before = assets.requests
+        tick = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*(main.sign.callback(call, agent) for call, agent in zip(calls, agents)))
+        burst_s = time.perf_counter() - started
+        stop.set()
+        await tick
+
+        signed = sum(1 for call in calls if any(reply == "✅ Player Signed!" for _, reply in call.replies))
+        done = [call.replies[-1][0] for call in calls if call.replies]
+        await main.db.pending.flush()
+        results["sign_burst"] = {
+            "calls": len(calls),
+            "signed": signed,
+            "wall_s": round(burst_s, 3),
+            "throughput_per_s": round(len(calls) / burst_s, 1),
+            "latency": percentiles(done),
+            "max_loop_lag_ms": round(max(lag) * 1000, 3),
+            "role_edits": guild.edits,
+            "asset_requests": assets.requests - requests_before,
+            "transfers_recorded": (await main.db.fetchone("SELECT COALESCE(SUM(transfers), 0) FROM player_stats WHERE guild_id = ?", (guild.id,)))[0],
+            "delivery": main.delivery.snapshot(),
+        }
+        return results
+    finally:
+        await main.delivery.drain(timeout=0)
+        await main.client.http_session.close()
+        main.renderer.close()
+        await main.db.stop()
+        await assets.stop()
+
+
+# --- STARTUP ---
+# Boots main.py in a fresh interpreter up to on_ready, with the gateway login
+# and tree.sync() left out (they need Discord). tree.sync is replaced by a
+# counter, so the report shows how often a restart would have synced.
+
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+imported = time.perf_counter()
+
+async def probe():
+    client = main.client
+    syncs = []
+    async def sync(*args, **kwargs):
+        syncs.append(1)
+        return []
+    client.tree.sync = sync
+    async with client:
+        await client.setup_hook()
+        hooked = time.perf_counter()
+        await client.on_ready()
+        ready = time.perf_counter()
+        if hasattr(main, "load_cards"):
+            await main.load_cards()  # warmed in the background since setup_hook
+        cards = time.perf_counter()
+    ms = lambda t: round((t - started) * 1000, 2)
+    return {"import_ms": ms(imported), "setup_hook_ms": ms(hooked), "ready_ms": ms(ready), "cards_ready_ms": ms(cards), "syncs": len(syncs)}
+
+print("STARTUP " + json.dumps(asyncio.run(probe())))
+"""
+
+
+def bench_startup(tmp, tree=None, restarts=3):
+    # Cold = empty working dir (new database, never synced); warm = restarts
+    # in the same dir afterwards. --tree points this at another checkout
+    # (e.g. a git worktree of an older commit) for before/after numbers.
+    tree = os.path.abspath(tree or os.path.dirname(os.path.abspath(__file__)))
+    cwd = os.path.join(tmp, "startup")
+    os.makedirs(cwd, exist_ok=True)
+    shutil.copy(os.path.join(tree, "font.ttf"), cwd)  # no download mid-measurement
+    env = dict(os.environ, PORT="0", TRACE_LOG="", DB_FILE=os.path.join(cwd, "team_manager.db"))
+
+    def boot():
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE, tree], cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+        wall = (time.perf_counter() - started) * 1000
+        line = next((l for l in out.stdout.splitlines() if l.startswith("STARTUP ")), None)
+        if line is None:
+            raise RuntimeError(out.stderr[-2000:])
+        return dict(json.loads(line[len("STARTUP "):]), process_ms=round(wall, 2))
+
+    cold = boot()
+    warm = [boot() for _ in range(restarts)]
+    return {
+        "tree": tree,
+        "cold": cold,
+        "warm": {key: sorted(run[key] for run in warm)[len(warm) // 2] for key in warm[0]},
+    }
+
+
+# --- GATEWAY MEMORY ---
+# A synthetic guild fed through discord.py's own member chunk handling, in a
+# fresh interpreter per MEMORY_MODE, so RSS is the process's own.
+
+MEMORY_PROBE = """
+import asyncio, gc, json, resource, sys
+sys.path.insert(0, sys.argv[1])
+import discord
+from discord.state import ChunkRequest
+from members import MemberCache, client_options
+
+mode, total, teams, roster, free_agents = sys.argv[2], *map(int, sys.argv[3:])
+CHUNK = 1000
+GUILD = 1 << 40
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+
+
+def member_roles(i):
+    # Team players first, then free agents, then everyone else with a
+    # couple of cosmetic roles
+    if i < teams * roster:
+        return [str(GUILD + 10 + i // roster)]
+    if i < teams * roster + free_agents:
+        return [str(GUILD + 3)]
+    return [str(GUILD + 1000 + i % 20)]
+
+
+def chunk_payload(index, count, nonce, presences):
+    ids = range(index * CHUNK, min(total, (index + 1) * CHUNK))
+    members = [{
+        "user": {"id": str(1 << 50 | i), "username": f"player{i}", "global_name": f"Player {i}", "discriminator": "0", "avatar": "%032x" % i},
+        "roles": member_roles(i), "joined_at": "2024-01-01T00:00:00+00:00", "nick": None, "deaf": False, "mute": False, "flags": 0,
+    } for i in ids]
+    data = {"guild_id": str(GUILD), "members": members, "chunk_index": index, "chunk_count": count, "nonce": nonce}
+    if presences:  # with the presences intent, chunks carry the online third
+        data["presences"] = [{
+            "user": {"id": str(1 << 50 | i)}, "status": "online", "client_status": {"desktop": "online"},
+            "activities": [{"name": "Rocket League", "type": 0, "created_at": 0}],
+        } for i in ids if i % 3 == 0]
+    return data
+
+
+async def probe():
+    client = discord.Client(**client_options(mode))
+    state = client._connection
+    roles = [{"id": str(GUILD), "name": "@everyone", "permissions": "0", "position": 0, "color": 0}]
+    roles += [{"id": str(GUILD + 3), "name": "Free Agent", "permissions": "0", "position": 1, "color": 0}]
+    roles += [{"id": str(GUILD + 10 + t), "name": f"Team {t}", "permissions": "0", "position": 2, "color": 0} for t in range(teams)]
+    roles += [{"id": str(GUILD + 1000 + r), "name": f"Level {r}", "permissions": "0", "position": 3, "color": 0} for r in range(20)]
+    guild = discord.Guild(data={"id": str(GUILD), "name": "Bench League", "roles": roles, "member_count": total}, state=state)
+    state._add_guild(guild)
+    gc.collect()
+    baseline = rss_kb()
+
+    full = mode == "full"
+    request = ChunkRequest(guild.id, 0, asyncio.get_running_loop(), state._get_guild, cache=full)
+    state._chunk_requests[request.nonce] = request
+    done = request.get_future()
+    count = -(-total // CHUNK)
+    for index in range(count):
+        state.parse_guild_members_chunk(chunk_payload(index, count, request.nonce, full and client.intents.presences))
+    chunked = await done
+    if not full:
+        league = {GUILD + 3, *(GUILD + 10 + t for t in range(teams))}
+        MemberCache(None, None, mode).adopt(guild, chunked, league)
+    del chunked, done, request
+    gc.collect()
+    return {
+        "intents": client.intents.value,
+        "cached_members": len(guild.members),
+        "team_0_members": len(guild.get_role(GUILD + 10).members),
+        "rss_mb": round(rss_kb() / 1024, 1),
+        "members_rss_mb": round((rss_kb() - baseline) / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+print("MEMORY " + json.dumps(asyncio.run(probe())))
+"""
+
+
+def bench_gateway_memory(total=100_000, teams=40, roster=25, free_agents=1000):
+    tree = os.path.dirname(os.path.abspath(__file__))
+    results = {"guild_members": total, "league_members": teams * roster + free_agents}
+    for mode in ("full", "lean"):
+        out = subprocess.run([sys.executable, "-c", MEMORY_PROBE, tree, mode, str(total), str(teams), str(roster), str(free_agents)],
+                             capture_output=True, text=True, timeout=600)
+        line = next((l for l in out.stdout.splitlines() if l.startswith("MEMORY ")), None)
+        if line is None:
+            raise RuntimeError(out.stderr[-2000:])
+        results[mode] = json.loads(line[len("MEMORY "):])
+    return results
+
+
+# --- SHARDING ---
+# Guild routing with fake shard ids, and several processes sharing one
+# database file the way sharded bot processes do.
+
+SHARD_PROBE = """
+import asyncio, json, random, sys, time
+sys.path.insert(0, sys.argv[1])
+from database import Database
+
+path, worker, offers, bumps = sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+
+
+async def probe():
+    db = Database(path)
+    errors = []
+    try:
+        db.open(progress=None)  # every worker races to migrate the same file
+    except Exception as e:
+        errors.append(repr(e))
+    await db.start()
+    while (await db.fetchone("SELECT COUNT(*) FROM transfer_offers"))[0] < offers:
+        await asyncio.sleep(0.01)  # the parent seeds offers once everyone has migrated
+    ids = list(range(1, offers + 1))
+    random.Random(worker).shuffle(ids)
+    taken = []
+
+    async def take(offer_id):
+        try:
+            if await db.take_offer(offer_id, 0):
+                taken.append(offer_id)
+        except Exception as e:
+            errors.append(repr(e))
+
+    async def bump(i):
+        try:
+            await db.update_stat(1, i % 50, "transfer")
+            await db.pending.flush()
+        except Exception as e:
+            errors.append(repr(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(take(i) for i in ids), *(bump(i) for i in range(bumps)))
+    elapsed = time.perf_counter() - started
+    await db.stop()
+    return {"taken": taken, "errors": errors, "seconds": round(elapsed, 3)}
+
+print("SHARD " + json.dumps(asyncio.run(probe())))
+"""
+
+
+async def bench_sharding(tmp, shard_count=4, processes=4, offers=2000, bumps=500):
+    import sharding
+
+    # Routing: fake shard ids split across two processes, checked against
+    # discord.py's Guild.shard_id and the SQL the offer relay uses
+    rng = random.Random(25)
+    guild_ids = [rng.getrandbits(63) for _ in range(5000)]
+    halves = ([0, 1], [2, 3])
+    state = discord.AutoShardedClient(intents=discord.Intents.none(), shard_count=shard_count)._connection
+    owners = [sum(sharding.owns(g, shard_count, ids) for ids in halves) for g in guild_ids]
+    sample = guild_ids[:500]
+    matches_discord = all(discord.Guild(data={"id": str(g), "name": "g"}, state=state).shard_id == sharding.shard_for(g, shard_count) for g in sample)
+
+    db = Database(os.path.join(tmp, "relay.db"))
+    db.open(progress=None)
+    await db.start()
+    try:
+        for i, g in enumerate(guild_ids):
+            await db.queue_offer_action(i, g, "accept", 1, 2, 3, "token", time.time())
+        relayed = [{row[1] for row in await db.take_offer_actions(shard_count, ids)} for ids in halves]
+    finally:
+        await db.stop()
+    expected = [{g for g in guild_ids if sharding.shard_for(g, shard_count) in ids} for ids in halves]
+
+    # Shared database: every process migrates the same fresh file, then they
+    # all grab the same offers and bump the same stats at once
+    path = os.path.join(tmp, "shared.db")
+    tree = os.path.dirname(os.path.abspath(__file__))
+    workers = [subprocess.Popen([sys.executable, "-c", SHARD_PROBE, tree, path, str(w), str(offers), str(bumps)],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for w in range(processes)]
+    conn = sqlite3.connect(path, timeout=30)
+    while conn.execute("PRAGMA user_version").fetchone()[0] < MIGRATIONS[-1][0]:
+        await asyncio.sleep(0.05)
+    with conn:
+        conn.executemany("INSERT INTO transfer_offers (guild_id, player_id, from_team_id, to_team_id, manager_id, logo, expires_at) VALUES (1, ?, 2, 3, 4, NULL, 1e12)",
+                         ((i,) for i in range(offers)))
+    results = []
+    for proc in workers:
+        out, err = await asyncio.to_thread(proc.communicate, timeout=300)
+        line = next((l for l in out.splitlines() if l.startswith("SHARD ")), None)
+        if line is None:
+            raise RuntimeError(err[-2000:])
+        results.append(json.loads(line[len("SHARD "):]))
+    taken = [offer_id for r in results for offer_id in r["taken"]]
+    transfers = conn.execute("SELECT COALESCE(SUM(transfers), 0) FROM player_stats").fetchone()[0]
+    conn.close()
+
+    return {
+        "guilds": len(guild_ids),
+        "owned_by_exactly_one": all(n == 1 for n in owners),
+        "matches_discord_shard_id": matches_discord,
+        "sql_routing_matches": relayed == expected,
+        "processes": processes,
+        "offers": offers,
+        "offers_taken_once": sorted(taken) == list(range(1, offers + 1)),
+        "stat_bumps": transfers,
+        "stat_bumps_expected": processes * bumps,
+        "errors": sum(len(r["errors"]) for r in results),
+        "error_sample": next((r["errors"][:3] for r in results if r["errors"]), []),
+        "worker_seconds": [r["seconds"] for r in results],
+    }
+
+
+BENCHMARKS = ("find_user_team", "card_render", "card_encoding", "guild_scoping", "free_agent_pages", "team_list",
+              "leaderboards", "transfer_offers", "ledger", "health_server", "tracing", "bot_core", "startup", "gateway_memory", "sharding")
+
+
+async def run(names, tmp, tree=None):
+    db = Database(os.path.join(tmp, "bench.db"))
+    db.open(progress=None)
+    await db.start()
+    runners = {
+        "find_user_team": lambda: bench_find_user_team(db),
+        "card_render": bench_card_render,
+        "card_encoding": bench_card_encoding,
+        "guild_scoping": lambda: bench_guild_scoping(tmp),
+        "free_agent_pages": lambda: bench_free_agent_pages(tmp),
+        "team_list": bench_team_list,
+        "leaderboards": lambda: bench_leaderboards(tmp),
+        "transfer_offers": lambda: bench_transfer_offers(tmp),
+        "ledger": lambda: bench_ledger(tmp),
+        "health_server": lambda: bench_health_server(tmp),
+        "tracing": lambda: bench_tracing(tmp),
+        "bot_core": lambda: bench_bot_core(tmp),
+        "startup": lambda: bench_startup(tmp, tree),
+        "gateway_memory": bench_gateway_memory,
+        "sharding": lambda: bench_sharding(tmp),
+    }
+    results = {}
+    try:
+        for name in names:
+            result = runners[name]()
+            results[name] = await result if asyncio.iscoroutine(result) else result
+    finally:
+        await db.stop()
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks; prints a JSON report")
+    parser.add_argument("only", nargs="*", choices=BENCHMARKS, help="benchmarks to run (default: all)")
+    parser.add_argument("--out", help="also write the report to this file")
+    parser.add_argument("--tree", help="source tree for the startup benchmark (default: this one)")
+    parser.add_argument("--label", default="", help="free-form tag stored in the report, e.g. a version")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {
+            "label": args.label,
+            "timestamp": round(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "results": await run(args.only or BENCHMARKS, tmp, args.tree),
+        }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# --- IN-MEMORY CACHES ---
+# The database stays the durable copy; these hold hot rows so commands
+# don't go back to SQLite for data that only admins ever change.
+
+
+@dataclass
+class GuildConfig:
+    guild_id: int
+    manager_role_id: int = None
+    asst_role_id: int = None
+    contract_channel_id: int = None
+    free_agent_role_id: int = None
+    window_open: int = 1
+    demand_limit: int = 3
+    card_format: str = "png"
+    card_quality: int = 85
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_row(self):
+        return (self.guild_id, self.manager_role_id, self.asst_role_id, self.contract_channel_id,
+                self.free_agent_role_id, self.window_open, self.demand_limit, self.card_format, self.card_quality)
+
+
+class ConfigCache:
+    def __init__(self, db):
+        self.db = db
+        self._configs = {}  # guild_id -> GuildConfig, or None if the guild has no config
+        self._writes = {}   # guild_id -> writes so far, to spot a read that raced one
+        self.hits = 0
+        self.misses = 0
+
+    async def load_all(self):
+        for row in await self.db.fetchall("SELECT * FROM global_config"):
+            config = GuildConfig.from_row(row)
+            self._configs[config.guild_id] = config
+
+    async def get(self, guild_id):
+        if guild_id in self._configs:
+            self.hits += 1
+            return self._configs[guild_id]
+        self.misses += 1
+        writes = self._writes.get(guild_id, 0)
+        row = await self.db.get_global_config(guild_id)
+        if guild_id in self._configs:
+            return self._configs[guild_id]  # filled while we read
+        config = GuildConfig.from_row(row) if row else None
+        # A write that landed during the read may have made the row stale
+        if self._writes.get(guild_id, 0) == writes:
+            self._configs[guild_id] = config
+        return config
+
+    # --- WRITE-THROUGH ---
+    def _wrote(self, guild_id):
+        self._writes[guild_id] = self._writes.get(guild_id, 0) + 1
+
+    async def save(self, config):
+        await self.db.save_global_config(*config.to_row())
+        self._wrote(config.guild_id)
+        self._configs[config.guild_id] = config
+
+    async def set_window(self, guild_id, status):
+        await self.db.set_window(guild_id, status)
+        self._wrote(guild_id)
+        config = self._configs.get(guild_id)
+        if config:
+            config.window_open = status
+        else:
+            # Not cached yet; let the next get() read the real row
+            self._configs.pop(guild_id, None)
+
+    async def set_card_format(self, guild_id, card_format, card_quality):
+        await self.db.set_card_format(guild_id, card_format, card_quality)
+        self._wrote(guild_id)
+        config = self._configs.get(guild_id)
+        if config:
+            config.card_format = card_format
+            config.card_quality = card_quality
+        else:
+            self._configs.pop(guild_id, None)
+
+    async def delete(self, guild_id):
+        await self.db.delete_global_config(guild_id)
+        self._wrote(guild_id)
+        self._configs[guild_id] = None
+
+    def snapshot(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._configs),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class TeamRegistry:
+    def __init__(self, db):
+        self.db = db
+        self._teams = {}  # team_role_id -> (team_role_id, logo, roster_limit, transaction_image, guild_id)
+
+    async def load_all(self):
+        self._teams = {row[0]: row for row in await self.db.get_all_teams()}
+
+    def get(self, role_id):
+        return self._teams.get(role_id)
+
+    def all(self, guild_id):
+        return [row for row in self._teams.values() if row[4] == guild_id]
+
+    def find(self, member):
+        matches = {r.id for r in member.roles} & self._teams.keys()
+        if not matches:
+            return None
+        # Keep the old "first team role in member.roles" order for members on several teams
+        for role in member.roles:
+            if role.id in matches:
+                return role, self._teams[role.id]
+        return None
+
+    # --- WRITE-THROUGH ---
+    async def save(self, guild_id, role_id, logo, roster_limit, transaction_image):
+        await self.db.save_team(guild_id, role_id, logo, roster_limit, transaction_image)
+        self._teams[role_id] = (role_id, logo, roster_limit, transaction_image, guild_id)
+
+    async def delete(self, role_id):
+        await self.db.delete_team(role_id)
+        self._teams.pop(role_id, None)
+
+    async def set_image(self, role_id, url):
+        await self.db.set_team_image(role_id, url)
+        row = self._teams.get(role_id)
+        if row:
+            self._teams[role_id] = (row[0], row[1], row[2], url, row[4])
+
+
+# --- IMAGE CACHES ---
+
+class LRUBytesCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        data = self._items.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        if len(data) > self.max_bytes:
+            return
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def discard_prefix(self, prefix):
+        for key in [k for k in self._items if k.startswith(prefix)]:
+            self.size -= len(self._items.pop(key))
+
+    def snapshot(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class BackgroundCache:
+    # Prepared card backgrounds (raw RGB, overlay already applied). Team
+    # backgrounds are keyed by team role id + URL hash and also written to
+    # disk so a restart doesn't re-download every team's image.
+
+    def __init__(self, directory="card_cache", max_bytes=64 * 1024 * 1024, item_size=None):
+        self.directory = directory
+        self.item_size = item_size
+        self.memory = LRUBytesCache(max_bytes)
+        self.disk_hits = 0
+
+    @staticmethod
+    def team_key(team_id, url):
+        return f"{team_id}-{hashlib.sha256(url.encode()).hexdigest()[:16]}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.rgb")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if self.item_size and len(data) != self.item_size:
+            return None
+        return data
+
+    def _write_disk(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+    def _delete_disk(self, prefix):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    async def get(self, key, persist=True):
+        data = self.memory.get(key)
+        if data is None and persist:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self.disk_hits += 1
+                self.memory.put(key, data)
+        return data
+
+    async def put(self, key, data, persist=True):
+        self.memory.put(key, data)
+        if persist:
+            try:
+                await asyncio.to_thread(self._write_disk, key, data)
+            except OSError as e:
+                print(f"System: Could not write background cache. Error: {e}")
+
+    async def invalidate_team(self, team_id):
+        prefix = f"{team_id}-"
+        self.memory.discard_prefix(prefix)
+        await asyncio.to_thread(self._delete_disk, prefix)
+
+    def snapshot(self):
+        return dict(self.memory.snapshot(), disk_hits=self.disk_hits)
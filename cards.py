@@ -0,0 +1,199 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from fonts import get_font, paste_text, warm_titles
+import tracing
+
+# --- CARD RENDERING ---
+# Everything in this module is CPU-bound and free of Discord / network code,
+# so it can run in a worker process. The bot fetches the image bytes and
+# hands them over; we hand back the encoded card.
+
+W, H = 800, 400
+TITLE_SIZE = 40
+NAME_SIZE = 60
+
+
+# --- BACKGROUNDS ---
+# Backgrounds are prepared once and passed around as raw RGB bytes
+# (W * H * 3), which is what the background cache stores.
+
+BACKGROUND_SIZE = W * H * 3
+
+
+def prepare_custom_background(bg_bytes):
+    # Custom URL (from /decorate_transactions)
+    try:
+        img = Image.open(io.BytesIO(bg_bytes)).convert("RGB").resize((W, H))
+    except Exception:
+        return None
+    # Dark Overlay so text pops
+    overlay = Image.new("RGBA", (W, H), (0, 0, 0, 0))
+    draw_overlay = ImageDraw.Draw(overlay)
+    draw_overlay.rectangle([(0, 240), (W, H)], fill=(0, 0, 0, 160))
+    img.paste(overlay, (0, 0), mask=overlay)
+    return img.tobytes()
+
+
+def prepare_file_background(path):
+    # Local File (If you ever upload one)
+    try:
+        return Image.open(path).convert("RGB").resize((W, H)).tobytes()
+    except Exception:
+        return None
+
+
+def prepare_color_background(team_rgb):
+    # FALLBACK: Paint the background with the Team Color
+    # If color is default (black/transparent), make it Dark Grey
+    if tuple(team_rgb) == (0, 0, 0):
+        team_rgb = (44, 47, 51)
+    return Image.new("RGB", (W, H), color=tuple(team_rgb)).tobytes()
+
+
+# --- AVATARS ---
+# Avatars are cropped once into a circular RGBA image (raw bytes) and cached
+# by the bot, so a player carded again skips the download and the resize.
+
+AVATAR_SIZE = 200
+
+# Circular Mask, built once per process
+AVATAR_MASK = Image.new("L", (AVATAR_SIZE, AVATAR_SIZE), 0)
+ImageDraw.Draw(AVATAR_MASK).ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
+
+
+def prepare_avatar(avatar_bytes):
+    try:
+        avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA").resize((AVATAR_SIZE, AVATAR_SIZE))
+    except Exception:
+        return None  # If avatar fails, just skip it
+    avatar.putalpha(AVATAR_MASK)
+    return avatar.tobytes()
+
+
+# --- ENCODING ---
+# Per-guild card_format: "png", "png_optimized", "webp", "jpeg" or "auto".
+# Auto encodes PNG, WebP and JPEG and keeps the smallest, lowering the lossy
+# quality until the card fits the byte budget.
+
+CARD_FORMATS = ("png", "png_optimized", "webp", "jpeg", "auto")
+CARD_BYTE_BUDGET = 512 * 1024
+MIN_AUTO_QUALITY = 40
+
+
+def _encode(img, card_format, quality):
+    buffer = io.BytesIO()
+    if card_format == "png_optimized":
+        img.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), "png"
+    if card_format == "webp":
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+        return buffer.getvalue(), "webp"
+    if card_format == "jpeg":
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return buffer.getvalue(), "jpg"
+    img.save(buffer, format="PNG")
+    return buffer.getvalue(), "png"
+
+
+def encode_card(img, card_format="png", quality=85, budget=CARD_BYTE_BUDGET):
+    if card_format != "auto":
+        return _encode(img, card_format, quality)
+
+    best = min((_encode(img, fmt, quality) for fmt in ("png", "webp", "jpeg")), key=lambda r: len(r[0]))
+    while len(best[0]) > budget and quality > MIN_AUTO_QUALITY:
+        quality = max(quality - 15, MIN_AUTO_QUALITY)
+        best = min((_encode(img, fmt, quality) for fmt in ("webp", "jpeg")), key=lambda r: len(r[0]))
+    return best
+
+
+def render_card(background, avatar, title_text, player_name, card_format="png", quality=85):
+    # Returns (bytes, file extension)
+    return encode_card(draw_card(background, avatar, title_text, player_name), card_format, quality)
+
+
+def draw_card(background, avatar, title_text, player_name):
+    img = Image.frombytes("RGB", (W, H), background)
+    draw = ImageDraw.Draw(img)
+
+    # 4. Avatar (already resized and masked)
+    if avatar:
+        crop = Image.frombytes("RGBA", (AVATAR_SIZE, AVATAR_SIZE), avatar)
+        img.paste(crop, (300, 50), mask=crop)
+        # Border
+        draw.ellipse((300, 50, 500, 250), outline="white", width=3)
+
+    # 5. Text: the title is a cached layer, only the name is drawn per card
+    paste_text(img, (W / 2, 290), title_text, TITLE_SIZE)
+    draw.text((W / 2, 350), player_name.upper(), fill="white", font=get_font(NAME_SIZE), anchor="mm")
+    return img
+
+
+def _render_timed(background, avatar, title_text, player_name, card_format, quality):
+    # Worker side of CardRenderer.render: also reports draw / encode seconds,
+    # since the caller's trace can't see inside the pool
+    started = time.perf_counter()
+    img = draw_card(background, avatar, title_text, player_name)
+    drawn = time.perf_counter()
+    data, ext = encode_card(img, card_format, quality)
+    return data, ext, drawn - started, time.perf_counter() - drawn
+
+
+# --- RENDER POOL ---
+# CARD_WORKERS=0 renders in a thread instead of separate processes.
+
+def warm_up():
+    # Runs once in every worker: parse fonts and rasterize the titles up front
+    get_font(NAME_SIZE)
+    warm_titles(TITLE_SIZE, W)
+
+
+def _make_executor(workers):
+    if workers > 0:
+        try:
+            # The pool is started lazily, once the database threads are
+            # running, so fork (Linux's default) could copy a lock one of
+            # them holds. The forkserver forks from its own single thread.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up, mp_context=multiprocessing.get_context(method))
+            # Fail fast here rather than on the first card if processes are unavailable
+            executor.submit(int).result(timeout=30)
+            return executor
+        except Exception as e:
+            print(f"System: Process pool unavailable, rendering cards in threads. Error: {e}")
+    warm_up()
+    return ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="card-render")
+
+
+class CardRenderer:
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(os.environ.get("CARD_WORKERS", os.cpu_count() or 1))
+        self.workers = workers
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = _make_executor(self.workers)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def render(self, background, avatar, title_text, player_name, card_format="png", quality=85):
+        data, ext, draw_seconds, encode_seconds = await self.run(_render_timed, background, avatar, title_text, player_name, card_format, quality)
+        tracing.record("render", draw_seconds)
+        tracing.record("encode", encode_seconds)
+        return data, ext
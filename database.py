@@ -0,0 +1,562 @@
+import sqlite3
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from migrations import migrate
+import tracing
+
+# --- ASYNC DATABASE LAYER ---
+# SQLite never runs on the event loop. Reads go through a small pool of
+# threads that each own a connection; every write goes through ONE writer
+# thread, so writes are serialized and never fight over the database lock.
+# Sharded processes share the file: write transactions start with BEGIN
+# IMMEDIATE, so a read-then-write in one process can't be invalidated by
+# another process committing in between; they wait (busy timeout) instead.
+
+DB_FILE = "team_manager.db"
+
+# Leaderboard name -> (table, id column, score column). Each has a covering
+# index on (guild_id, score DESC, id).
+RANKINGS = {
+    "transfers": ("player_stats", "user_id", "transfers"),
+    "demands": ("player_stats", "user_id", "demands"),
+    "teams": ("team_stats", "team_role_id", "moves"),
+}
+
+
+class Database:
+    def __init__(self, path=DB_FILE, readers=4):
+        self.path = path
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+        self._read_pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self.pending = WriteBehind(self)
+
+    # --- CONNECTIONS ---
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # One connection per pool thread, opened on first use
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def open(self, progress=print):
+        conn = self._connect()
+        try:
+            migrate(conn, progress=progress)
+        finally:
+            conn.close()
+
+    async def start(self):
+        self.pending.start()
+
+    async def stop(self):
+        await self.pending.stop()
+        self.close()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._read_pool.shutdown(wait=True)
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+
+    # --- LOW LEVEL ---
+    async def _run(self, pool, fn, *args):
+        loop = asyncio.get_running_loop()
+        with tracing.span("db"):
+            return await loop.run_in_executor(pool, fn, *args)
+
+    def _read(self, sql, params, one):
+        cur = self._conn().execute(sql, params)
+        return cur.fetchone() if one else cur.fetchall()
+
+    def _write(self, statements):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params in statements:
+                conn.execute(sql, params)
+
+    async def fetchone(self, sql, params=()):
+        return await self._run(self._read_pool, self._read, sql, params, True)
+
+    async def fetchall(self, sql, params=()):
+        return await self._run(self._read_pool, self._read, sql, params, False)
+
+    async def execute(self, sql, params=()):
+        await self._run(self._writer, self._write, [(sql, params)])
+
+    async def execute_many(self, statements):
+        # Several statements, one transaction, one commit
+        await self._run(self._writer, self._write, statements)
+
+    def _transact(self, fn):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return fn(conn)
+
+    async def transaction(self, fn):
+        # fn(conn) runs on the writer thread inside one transaction; for
+        # writes that need a result back (new row ids, read-then-delete)
+        return await self._run(self._writer, self._transact, fn)
+
+    # --- GLOBAL CONFIG ---
+    async def get_global_config(self, guild_id):
+        return await self.fetchone("SELECT * FROM global_config WHERE guild_id = ?", (guild_id,))
+
+    async def save_global_config(self, guild_id, manager_role_id, asst_role_id, channel_id, free_agent_role_id, window_state, demand_limit, card_format="png", card_quality=85):
+        await self.execute("INSERT OR REPLACE INTO global_config VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (guild_id, manager_role_id, asst_role_id, channel_id, free_agent_role_id, window_state, demand_limit, card_format, card_quality))
+
+    async def set_window(self, guild_id, status):
+        await self.execute("UPDATE global_config SET window_open = ? WHERE guild_id = ?", (status, guild_id))
+
+    async def set_card_format(self, guild_id, card_format, card_quality):
+        await self.execute("UPDATE global_config SET card_format = ?, card_quality = ? WHERE guild_id = ?", (card_format, card_quality, guild_id))
+
+    async def delete_global_config(self, guild_id):
+        await self.execute("DELETE FROM global_config WHERE guild_id = ?", (guild_id,))
+
+    # --- TEAMS ---
+    async def get_team_data(self, role_id):
+        return await self.fetchone("SELECT * FROM teams WHERE team_role_id = ?", (role_id,))
+
+    async def get_all_teams(self, guild_id=None):
+        if guild_id is None:
+            return await self.fetchall("SELECT * FROM teams")
+        return await self.fetchall("SELECT * FROM teams WHERE guild_id = ?", (guild_id,))
+
+    async def save_team(self, guild_id, role_id, logo, roster_limit, transaction_image):
+        await self.execute_many([
+            # Replaces an unclaimed (guild_id 0) row for the same role, if any
+            ("DELETE FROM teams WHERE team_role_id = ?", (role_id,)),
+            ("INSERT INTO teams VALUES (?, ?, ?, ?, ?)", (role_id, logo, roster_limit, transaction_image, guild_id)),
+        ])
+
+    async def delete_team(self, role_id):
+        await self.execute("DELETE FROM teams WHERE team_role_id = ?", (role_id,))
+
+    async def set_team_image(self, role_id, url):
+        await self.execute("UPDATE teams SET transaction_image = ? WHERE team_role_id = ?", (url, role_id))
+
+    # --- PLAYER STATS ---
+    async def get_player_stats(self, guild_id, user_id):
+        # Include increments that are still waiting in the write-behind queue
+        data, (add_t, add_d) = await self.pending.read(
+            lambda: self.fetchone("SELECT user_id, transfers, demands FROM player_stats WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)),
+            lambda: self.pending.stat_delta(guild_id, user_id))
+        transfers, demands = (data[1], data[2]) if data else (0, 0)
+        return (user_id, transfers + add_t, demands + add_d)
+
+    async def update_stat(self, guild_id, user_id, stat_type, amount=1):
+        if stat_type == "transfer":
+            self.pending.add_stat(guild_id, user_id, amount, 0)
+        elif stat_type == "demand":
+            self.pending.add_stat(guild_id, user_id, 0, amount)
+
+    # --- TEAM STATS ---
+    async def get_team_moves(self, guild_id, role_id):
+        data, delta = await self.pending.read(
+            lambda: self.fetchone("SELECT moves FROM team_stats WHERE guild_id = ? AND team_role_id = ?", (guild_id, role_id)),
+            lambda: self.pending.moves_delta(guild_id, role_id))
+        return (data[0] if data else 0) + delta
+
+    async def update_team_moves(self, guild_id, role_id, amount=1):
+        self.pending.add_moves(guild_id, role_id, amount)
+
+    # --- LEADERBOARDS ---
+    async def ranked(self, board, guild_id, after=None, limit=100):
+        # (id, score) rows ordered score DESC, id ASC, straight off the
+        # board's index. `after` is the (id, score) of the last row already
+        # seen. Callers flush the write-behind queue first.
+        table, key, score = RANKINGS[board]
+        if not after:
+            return await self.fetchall(f"SELECT {key}, {score} FROM {table} WHERE guild_id = ? AND {score} > 0 "
+                                       f"ORDER BY {score} DESC, {key} LIMIT ?", (guild_id, limit))
+        # Rest of the tie at the cursor's score, then everything below it. Two
+        # index seeks; a single OR condition would walk the whole tie group.
+        return await self.fetchall(f"""SELECT * FROM (SELECT {key}, {score} FROM {table}
+                                                      WHERE guild_id = ?1 AND {score} = ?2 AND {key} > ?3
+                                                      ORDER BY {key} LIMIT ?4)
+                                       UNION ALL
+                                       SELECT * FROM (SELECT {key}, {score} FROM {table}
+                                                      WHERE guild_id = ?1 AND {score} > 0 AND {score} < ?2
+                                                      ORDER BY {score} DESC, {key} LIMIT ?4)
+                                       LIMIT ?4""", (guild_id, after[1], after[0], limit))
+
+    async def score(self, board, guild_id, key_id):
+        # Current score on a board, pending increments included
+        if board == "teams":
+            return await self.get_team_moves(guild_id, key_id)
+        stats = await self.get_player_stats(guild_id, key_id)
+        return stats[1] if board == "transfers" else stats[2]
+
+    # --- FREE AGENTS ---
+    async def save_free_agent(self, guild_id, user_id, region, position, description, timestamp):
+        self.pending.set_free_agent(guild_id, user_id, (user_id, region, position, description, timestamp, guild_id))
+
+    async def delete_free_agent(self, guild_id, user_id):
+        self.pending.set_free_agent(guild_id, user_id, None)
+
+    async def free_agent_page(self, guild_id, region=None, position=None, newest=True, after=None, limit=10):
+        # Keyset pagination: `after` is the (timestamp, user_id) of the last
+        # row on the previous page, so every page is an index range scan
+        await self.pending.flush()
+        sql = "SELECT user_id, region, position, description, timestamp FROM free_agents WHERE guild_id = ?"
+        params = [guild_id]
+        if region:
+            sql += " AND region = ?"
+            params.append(region)
+        if position:
+            sql += " AND position = ?"
+            params.append(position)
+        order = "DESC" if newest else "ASC"
+        if after:
+            sql += f" AND (timestamp, user_id) {'<' if newest else '>'} (?, ?)"
+            params.extend(after)
+        sql += f" ORDER BY timestamp {order}, user_id {order} LIMIT ?"
+        params.append(limit)
+        return await self.fetchall(sql, params)
+
+    # --- TRANSFER OFFERS ---
+    async def create_offer(self, guild_id, player_id, from_team_id, to_team_id, manager_id, logo, expires_at):
+        params = (guild_id, player_id, from_team_id, to_team_id, manager_id, logo, expires_at)
+        return await self.transaction(lambda conn: conn.execute(
+            "INSERT INTO transfer_offers (guild_id, player_id, from_team_id, to_team_id, manager_id, logo, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            params).lastrowid)
+
+    async def get_offer(self, offer_id, now):
+        return await self.fetchone("SELECT * FROM transfer_offers WHERE offer_id = ? AND expires_at > ?", (offer_id, now))
+
+    async def take_offer(self, offer_id, now):
+        # Removes and returns a live offer. The read and delete share one
+        # immediate transaction, so two clicks on the same offer (even in
+        # different processes) can't both get it.
+        def take(conn):
+            row = conn.execute("SELECT * FROM transfer_offers WHERE offer_id = ? AND expires_at > ?", (offer_id, now)).fetchone()
+            if row:
+                conn.execute("DELETE FROM transfer_offers WHERE offer_id = ?", (offer_id,))
+            return row
+        return await self.transaction(take)
+
+    async def restore_offer(self, row):
+        await self.execute("INSERT OR IGNORE INTO transfer_offers VALUES (?, ?, ?, ?, ?, ?, ?, ?)", tuple(row))
+
+    async def delete_offer(self, offer_id):
+        await self.execute("DELETE FROM transfer_offers WHERE offer_id = ?", (offer_id,))
+
+    async def delete_expired_offers(self, now):
+        return await self.transaction(lambda conn: conn.execute("DELETE FROM transfer_offers WHERE expires_at <= ?", (now,)).rowcount)
+
+    # --- OFFER HANDOFF (sharding) ---
+    async def queue_offer_action(self, offer_id, guild_id, action, user_id, channel_id, message_id, token, now):
+        # First click wins, like take_offer
+        await self.execute("INSERT OR IGNORE INTO offer_actions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (offer_id, guild_id, action, user_id, channel_id, message_id, token, now))
+
+    async def take_offer_actions(self, shard_count, shard_ids):
+        # Removes and returns the queued clicks for guilds on these shards;
+        # same routing as sharding.shard_for
+        marks = ", ".join("?" * len(shard_ids))
+        return await self.transaction(lambda conn: conn.execute(
+            f"DELETE FROM offer_actions WHERE ((guild_id >> 22) % ?) IN ({marks}) RETURNING *",
+            (shard_count, *shard_ids)).fetchall())
+
+    async def delete_stale_offer_actions(self, before):
+        # Nobody picked them up (owning process down); the interaction
+        # token is dead by now anyway
+        return await self.transaction(lambda conn: conn.execute("DELETE FROM offer_actions WHERE created_at <= ?", (before,)).rowcount)
+
+    # --- TRANSACTION LEDGER ---
+    async def record_transaction(self, guild_id, tx_type, player_id, from_team_id=None, to_team_id=None, actor_id=None):
+        # Queued like stat increments; rows get their tx_id (and order) when flushed
+        self.pending.add_transaction((guild_id, tx_type, player_id, from_team_id, to_team_id, actor_id, time.time()))
+
+    async def player_history(self, guild_id, player_id, before=None, limit=10):
+        # Newest first; `before` is the last tx_id of the previous page
+        await self.pending.flush()
+        return await self.fetchall("""SELECT * FROM transactions WHERE guild_id = ? AND player_id = ? AND tx_id < ?
+                                      ORDER BY tx_id DESC LIMIT ?""", (guild_id, player_id, before or LEDGER_END, limit))
+
+    async def team_history(self, guild_id, team_id, before=None, limit=10):
+        # A team shows up on either side of a move: one index seek per side
+        await self.pending.flush()
+        return await self.fetchall("""SELECT * FROM (SELECT * FROM transactions WHERE guild_id = ?1 AND to_team_id = ?2 AND tx_id < ?3
+                                                     ORDER BY tx_id DESC LIMIT ?4)
+                                      UNION
+                                      SELECT * FROM (SELECT * FROM transactions WHERE guild_id = ?1 AND from_team_id = ?2 AND tx_id < ?3
+                                                     ORDER BY tx_id DESC LIMIT ?4)
+                                      ORDER BY tx_id DESC LIMIT ?4""", (guild_id, team_id, before or LEDGER_END, limit))
+
+    async def recompute_stats(self, guild_id):
+        # Rebuilds player_stats and team_stats for a guild from the ledger, in
+        # one transaction. Returns (players, teams) written.
+        await self.pending.flush()
+
+        def rebuild(conn):
+            conn.execute("DELETE FROM player_stats WHERE guild_id = ?", (guild_id,))
+            players = conn.execute("""INSERT INTO player_stats (user_id, transfers, demands, guild_id)
+                                      SELECT player_id, SUM(type IN ('sign', 'transfer')), SUM(type = 'demand'), guild_id
+                                      FROM transactions WHERE guild_id = ? AND type IN ('sign', 'transfer', 'demand')
+                                      GROUP BY player_id""", (guild_id,)).rowcount
+            conn.execute("DELETE FROM team_stats WHERE guild_id = ?", (guild_id,))
+            teams = conn.execute("""INSERT INTO team_stats (team_role_id, moves, guild_id)
+                                    SELECT team_id, COUNT(*), ? FROM (
+                                        SELECT to_team_id AS team_id FROM transactions WHERE guild_id = ? AND to_team_id IS NOT NULL
+                                        UNION ALL
+                                        SELECT from_team_id FROM transactions WHERE guild_id = ? AND from_team_id IS NOT NULL)
+                                    GROUP BY team_id""", (guild_id, guild_id, guild_id)).rowcount
+            return (players, teams)
+        return await self.transaction(rebuild)
+
+    # --- LEGACY ROWS ---
+    async def claim_legacy_rows(self, guild_id, role_ids, member_ids):
+        # Hands rows left with guild_id 0 by the v1 migration to the guild
+        # that actually owns the role / member. First guild to claim wins.
+        # If the guild already has a row of its own, legacy stats are added
+        # to it and its team / listing is kept; the legacy row goes either
+        # way. Returns how many teams and players were claimed.
+        teams = await self.fetchall("SELECT team_role_id FROM teams WHERE guild_id = 0")
+        users = await self.fetchall("SELECT user_id FROM player_stats WHERE guild_id = 0 UNION SELECT user_id FROM free_agents WHERE guild_id = 0")
+        role_ids, member_ids = set(role_ids), set(member_ids)
+        statements = []
+        claimed = 0
+        for (role_id,) in teams:
+            if role_id in role_ids:
+                statements.append((LEGACY_TEAM_CLAIM, (guild_id, role_id)))
+                statements.append(("DELETE FROM teams WHERE guild_id = 0 AND team_role_id = ?", (role_id,)))
+                claimed += 1
+        for (user_id,) in users:
+            if user_id in member_ids:
+                statements.append((LEGACY_STATS_CLAIM, (guild_id, user_id)))
+                statements.append(("DELETE FROM player_stats WHERE guild_id = 0 AND user_id = ?", (user_id,)))
+                statements.append((LEGACY_FREE_AGENT_CLAIM, (guild_id, user_id)))
+                statements.append(("DELETE FROM free_agents WHERE guild_id = 0 AND user_id = ?", (user_id,)))
+                claimed += 1
+        statements.append(("INSERT OR REPLACE INTO legacy_claims (guild_id, claimed_at) VALUES (?, ?)", (guild_id, time.time())))
+        await self.execute_many(statements)
+        return claimed
+
+    async def unclaimed_guilds(self, guild_ids):
+        # The guilds claim_legacy_rows hasn't run for yet
+        claimed = {row[0] for row in await self.fetchall("SELECT guild_id FROM legacy_claims")}
+        return [guild_id for guild_id in guild_ids if guild_id not in claimed]
+
+    async def has_legacy_rows(self):
+        row = await self.fetchone("""SELECT EXISTS(SELECT 1 FROM teams WHERE guild_id = 0)
+                                         OR EXISTS(SELECT 1 FROM player_stats WHERE guild_id = 0)
+                                         OR EXISTS(SELECT 1 FROM free_agents WHERE guild_id = 0)""")
+        return bool(row[0])
+
+
+LEGACY_TEAM_CLAIM = """INSERT OR IGNORE INTO teams (team_role_id, logo, roster_limit, transaction_image, guild_id)
+                       SELECT team_role_id, logo, roster_limit, transaction_image, ? FROM teams WHERE guild_id = 0 AND team_role_id = ?"""
+
+LEGACY_STATS_CLAIM = """INSERT INTO player_stats (user_id, transfers, demands, guild_id)
+                        SELECT user_id, transfers, demands, ? FROM player_stats WHERE guild_id = 0 AND user_id = ?
+                        ON CONFLICT(guild_id, user_id) DO UPDATE SET transfers = transfers + excluded.transfers,
+                                                           demands = demands + excluded.demands"""
+
+LEGACY_FREE_AGENT_CLAIM = """INSERT OR IGNORE INTO free_agents (user_id, region, position, description, timestamp, guild_id)
+                             SELECT user_id, region, position, description, timestamp, ? FROM free_agents WHERE guild_id = 0 AND user_id = ?"""
+
+
+# --- WRITE-BEHIND QUEUE ---
+# Stat increments, team move counts, free agent upserts/deletes and ledger
+# rows are coalesced in memory and written in one transaction every
+# `interval` seconds, or sooner once `max_ops` operations are waiting.
+
+LEDGER_END = (1 << 63) - 1  # tx_id cursor meaning "from the newest row"
+
+TRANSACTION_INSERT = """INSERT INTO transactions (guild_id, type, player_id, from_team_id, to_team_id, actor_id, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+STAT_UPSERT = """INSERT INTO player_stats (guild_id, user_id, transfers, demands) VALUES (?, ?, ?, ?)
+                 ON CONFLICT(guild_id, user_id) DO UPDATE SET transfers = transfers + excluded.transfers,
+                                                    demands = demands + excluded.demands"""
+
+TEAM_MOVES_UPSERT = """INSERT INTO team_stats (guild_id, team_role_id, moves) VALUES (?, ?, ?)
+                       ON CONFLICT(guild_id, team_role_id) DO UPDATE SET moves = moves + excluded.moves"""
+
+FREE_AGENT_UPSERT = """INSERT INTO free_agents (user_id, region, position, description, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(guild_id, user_id) DO UPDATE SET region = excluded.region, position = excluded.position,
+                                                          description = excluded.description, timestamp = excluded.timestamp"""
+
+
+class WriteBehind:
+    def __init__(self, db, interval=0.25, max_ops=200):
+        self.db = db
+        self.interval = interval
+        self.max_ops = max_ops
+        self.stats = {}        # (guild_id, user_id) -> [transfers, demands]
+        self.moves = {}        # (guild_id, team_role_id) -> moves
+        self.free_agents = {}  # (guild_id, user_id) -> row tuple, or None for delete
+        self.ledger = []       # transaction rows, in order
+        self.ops = 0
+        self.epoch = 0         # bumped when a flush starts and ends; odd = flushing
+        self._wake = None
+        self._task = None
+        self._lock = None
+
+        # Counters
+        self.flush_count = 0
+        self.ops_flushed = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def read(self, fetch, delta):
+        # (await fetch(), delta()) for a DB row and the queued increments for
+        # it. A flush moves increments from the queue into the DB; one landing
+        # between the two would count them twice or not at all. Reads don't
+        # block each other: only one that overlapped a flush is redone,
+        # holding the flush lock.
+        epoch = self.epoch
+        if not epoch % 2:
+            row = await fetch()
+            if self.epoch == epoch:
+                return row, delta()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await fetch(), delta()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"System: Write-behind flush failed. Error: {e}")
+
+    def _queued(self):
+        self.ops += 1
+        if self._wake and self.ops >= self.max_ops:
+            self._wake.set()
+
+    def add_stat(self, guild_id, user_id, transfers=0, demands=0):
+        entry = self.stats.setdefault((guild_id, user_id), [0, 0])
+        entry[0] += transfers
+        entry[1] += demands
+        self._queued()
+
+    def add_moves(self, guild_id, role_id, moves=1):
+        key = (guild_id, role_id)
+        self.moves[key] = self.moves.get(key, 0) + moves
+        self._queued()
+
+    def add_transaction(self, row):
+        self.ledger.append(row)
+        self._queued()
+
+    def set_free_agent(self, guild_id, user_id, row):
+        self.free_agents[(guild_id, user_id)] = row
+        self._queued()
+
+    def stat_delta(self, guild_id, user_id):
+        # Only consistent with a DB read when taken through read()
+        t, d = self.stats.get((guild_id, user_id), (0, 0))
+        return (t, d)
+
+    def moves_delta(self, guild_id, role_id):
+        return self.moves.get((guild_id, role_id), 0)
+
+    def snapshot(self):
+        avg = self.total_flush_ms / self.flush_count if self.flush_count else 0.0
+        return {
+            "pending_ops": self.ops,
+            "flush_count": self.flush_count,
+            "ops_flushed": self.ops_flushed,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(avg, 3),
+        }
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.ops:
+                return
+            stats, self.stats = self.stats, {}
+            moves, self.moves = self.moves, {}
+            agents, self.free_agents = self.free_agents, {}
+            ledger, self.ledger = self.ledger, []
+            batch_ops, self.ops = self.ops, 0
+            self.epoch += 1
+
+            statements = []
+            for (guild_id, user_id), (t, d) in stats.items():
+                statements.append((STAT_UPSERT, (guild_id, user_id, t, d)))
+            for (guild_id, role_id), n in moves.items():
+                statements.append((TEAM_MOVES_UPSERT, (guild_id, role_id, n)))
+            for (guild_id, user_id), row in agents.items():
+                if row is None:
+                    statements.append(("DELETE FROM free_agents WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)))
+                else:
+                    statements.append((FREE_AGENT_UPSERT, row))
+            for row in ledger:
+                statements.append((TRANSACTION_INSERT, row))
+
+            started = time.perf_counter()
+            try:
+                await self.db.execute_many(statements)
+            except Exception:
+                # Put the batch back so nothing is lost; newer writes win
+                for key, (t, d) in stats.items():
+                    entry = self.stats.setdefault(key, [0, 0])
+                    entry[0] += t
+                    entry[1] += d
+                for key, n in moves.items():
+                    self.moves[key] = self.moves.get(key, 0) + n
+                for key, row in agents.items():
+                    self.free_agents.setdefault(key, row)
+                self.ledger[:0] = ledger
+                self.ops += batch_ops
+                raise
+            finally:
+                self.epoch += 1
+
+            elapsed = (time.perf_counter() - started) * 1000
+            self.flush_count += 1
+            self.ops_flushed += batch_ops
+            self.last_batch_size = len(statements)
+            self.max_batch_size = max(self.max_batch_size, len(statements))
+            self.last_flush_ms = elapsed
+            self.total_flush_ms += elapsed
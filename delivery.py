@@ -0,0 +1,221 @@
+import asyncio
+import random
+import time
+from collections import Counter, deque
+
+# --- OUTBOUND DELIVERY QUEUE ---
+# Channel posts and DMs are queued per destination and sent by a background
+# worker, so commands don't wait on Discord rate limits. Each destination is
+# paced with a token bucket; DMs also share a concurrency limit so a fan-out
+# (e.g. /demand messaging every manager) can't flood the API.
+#
+# A queue past max_queue sheds its oldest message that has a merge key
+# (status posts a later one makes stale, like the window announcement).
+# Anything else, transaction posts in particular, is never dropped: the
+# contract channel is the league's record, so its queue grows instead.
+#
+# Nothing here imports discord: a target is anything with an async send(),
+# and errors are classified by their `status` attribute, so a fake client can
+# stand in for Discord.
+
+
+class _Job:
+    __slots__ = ("send", "file", "merge_key", "enqueued", "future")
+
+    def __init__(self, send, file, merge_key, future):
+        self.send = send
+        self.file = file
+        self.merge_key = merge_key
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class _Target:
+    def __init__(self, rate, per):
+        self.jobs = deque()
+        self.wake = asyncio.Event()
+        self.task = None
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+    def penalize(self, retry_after):
+        # A 429 tells us the real bucket is empty; stop sending for that long
+        self.tokens = min(self.tokens, 0) - retry_after * self.rate / self.per
+
+
+def _is_retryable(error):
+    status = getattr(error, "status", None)
+    if status is None:
+        return True  # network error / timeout
+    return status == 429 or status >= 500
+
+
+class Delivery:
+    def __init__(self, channel_rate=(5, 5.0), dm_rate=(5, 5.0), dm_concurrency=4,
+                 max_queue=50, max_retries=3, backoff=1.0, idle_timeout=60.0):
+        self.channel_rate = channel_rate
+        self.dm_rate = dm_rate
+        self.dm_concurrency = dm_concurrency
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self._targets = {}  # ("channel" | "user", id) -> _Target
+        self._dm_gate = None
+
+        # Counters
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.dropped_by = Counter()  # merge key -> messages dropped
+        self.merged = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    # --- PUBLIC API ---
+    def channel(self, channel, merge_key=None, **kwargs):
+        return self._enqueue(("channel", channel.id), self.channel_rate, lambda: channel.send(**kwargs), kwargs.get("file"), merge_key)
+
+    def dm(self, user, merge_key=None, **kwargs):
+        return self._enqueue(("user", user.id), self.dm_rate, lambda: user.send(**kwargs), kwargs.get("file"), merge_key)
+
+    def depth(self):
+        return sum(len(t.jobs) for t in self._targets.values())
+
+    def snapshot(self):
+        return {
+            "queue_depth": self.depth(),
+            "max_target_depth": max((len(t.jobs) for t in self._targets.values()), default=0),
+            "targets": len(self._targets),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            **{f"dropped_{kind}": count for kind, count in self.dropped_by.items()},
+            "merged": self.merged,
+            "retries": self.retries,
+            "avg_latency_ms": round(self.total_latency / self.sent * 1000, 3) if self.sent else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 3),
+        }
+
+    async def drain(self, timeout=10.0):
+        # Used on shutdown: give queued messages a chance to go out
+        deadline = time.monotonic() + timeout
+        while self.depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for target in list(self._targets.values()):
+            if target.task:
+                target.task.cancel()
+        self._targets.clear()
+
+    # --- QUEUEING ---
+    def _enqueue(self, key, rate, send, file, merge_key):
+        loop = asyncio.get_running_loop()
+        job = _Job(send, file, merge_key, loop.create_future())
+        target = self._targets.get(key)
+        if target is None:
+            target = self._targets[key] = _Target(*rate)
+
+        self.enqueued += 1
+        if merge_key is not None:
+            # Merge: a newer message replaces an unsent one with the same key
+            for i, pending in enumerate(target.jobs):
+                if pending.merge_key == merge_key:
+                    target.jobs[i] = job
+                    pending.future.set_result(False)
+                    self.merged += 1
+                    break
+            else:
+                target.jobs.append(job)
+        else:
+            target.jobs.append(job)
+
+        if len(target.jobs) > self.max_queue:
+            self._shed(key, target)
+
+        target.wake.set()
+        if target.task is None or target.task.done():
+            target.task = asyncio.create_task(self._worker(key, target))
+        return job.future
+
+    def _shed(self, key, target):
+        # Drop: only messages with a merge key, oldest first
+        for old in [job for job in target.jobs if job.merge_key is not None]:
+            if len(target.jobs) <= self.max_queue:
+                return
+            target.jobs.remove(old)
+            old.future.set_result(False)
+            self.dropped += 1
+            self.dropped_by[old.merge_key] += 1
+            print(f"System: Delivery queue for {key[0]} {key[1]} is full, dropped a '{old.merge_key}' message.")
+        if len(target.jobs) == self.max_queue + 1:
+            print(f"System: Delivery queue for {key[0]} {key[1]} is over {self.max_queue} messages, none of them droppable.")
+
+    async def _worker(self, key, target):
+        while True:
+            if not target.jobs:
+                target.wake.clear()
+                try:
+                    await asyncio.wait_for(target.wake.wait(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if not target.jobs:
+                        # Idle: forget this destination so per-user queues don't pile up
+                        if self._targets.get(key) is target:
+                            del self._targets[key]
+                        return
+                continue
+
+            job = target.jobs.popleft()
+            await target.acquire()
+            if key[0] == "user":
+                if self._dm_gate is None:
+                    self._dm_gate = asyncio.Semaphore(self.dm_concurrency)
+                async with self._dm_gate:
+                    ok = await self._deliver(job, target)
+            else:
+                ok = await self._deliver(job, target)
+            if not job.future.done():
+                job.future.set_result(ok)
+
+    async def _deliver(self, job, target):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if attempt and job.file is not None:
+                    job.file.reset()
+                await job.send()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self.failed += 1
+                    return False
+                self.retries += 1
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    target.penalize(retry_after)
+                    delay = retry_after
+                else:
+                    delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                await asyncio.sleep(delay)
+                continue
+
+            latency = time.monotonic() - job.enqueued
+            self.sent += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            return True
+        return False
@@ -0,0 +1,51 @@
+# --- EMBED PAGING ---
+# Packs (name, value) fields into pages that respect Discord's embed limits.
+# Pure data in, pure data out, so it works (and can be measured) without a
+# Discord connection; main.py turns each page into a discord.Embed.
+
+EMBED_MAX_FIELDS = 25
+EMBED_MAX_CHARS = 6000
+FIELD_NAME_MAX = 256
+FIELD_VALUE_MAX = 1024
+
+
+def chunk_lines(lines, limit=FIELD_VALUE_MAX):
+    # Joins lines with newlines into strings no longer than `limit`
+    chunk, size = [], 0
+    for line in lines:
+        line = line[:limit]
+        extra = len(line) + (1 if chunk else 0)
+        if chunk and size + extra > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+            extra = len(line)
+        chunk.append(line)
+        size += extra
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def split_field(name, lines, empty="*No players.*"):
+    # One logical field -> one or more real fields; long rosters continue
+    # under "(cont.)" instead of being cut off
+    name = name[:FIELD_NAME_MAX]
+    chunks = list(chunk_lines(lines)) or [empty]
+    yield name, chunks[0]
+    cont = f"{name} (cont.)"[:FIELD_NAME_MAX]
+    for chunk in chunks[1:]:
+        yield cont, chunk
+
+
+def pack_pages(fields, reserved=0, max_fields=EMBED_MAX_FIELDS, max_chars=EMBED_MAX_CHARS):
+    # Streams pages (lists of fields) from an iterable of fields. `reserved`
+    # is the per-page budget taken by title, footer and author text.
+    page, chars = [], reserved
+    for name, value in fields:
+        size = len(name) + len(value)
+        if page and (len(page) >= max_fields or chars + size > max_chars):
+            yield page
+            page, chars = [], reserved
+        page.append((name, value))
+        chars += size
+    if page:
+        yield page
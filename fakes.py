@@ -0,0 +1,227 @@
+import asyncio
+import io
+import time
+
+import discord
+from aiohttp import web
+from PIL import Image
+
+# --- FAKE DISCORD OBJECTS ---
+# Just enough of Guild / Member / Role / Interaction for the command paths in
+# main.py to run offline (see tests/ and bench.py). Network-facing calls
+# (member.edit, channel.send, interaction responses) take an optional
+# simulated latency and count what they were asked to do.
+
+
+class FakeRole:
+    def __init__(self, guild, role_id, name, color=0x3498DB):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.color = discord.Color(color)
+        self.mention = f"<@&{role_id}>"
+
+    @property
+    def members(self):
+        # Like discord.py: a scan of the guild's member cache
+        return [m for m in self.guild.members if self in m.roles]
+
+    def is_default(self):
+        return self.id == self.guild.id
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeAsset:
+    def __init__(self, base_url, user_id, size=None):
+        self.key = f"avatar{user_id}"
+        self._base_url = base_url
+        self._user_id = user_id
+        self.url = f"{base_url}/avatars/{user_id}.png" + (f"?size={size}" if size else "")
+
+    def with_size(self, size):
+        return FakeAsset(self._base_url, self._user_id, size)
+
+
+class FakeMember:
+    def __init__(self, guild, user_id, name, roles=(), admin=False, asset_url="http://127.0.0.1"):
+        self.guild = guild
+        self.id = user_id
+        self.name = name
+        self.mention = f"<@{user_id}>"
+        self.roles = [guild.default_role, *roles]
+        self.guild_permissions = discord.Permissions(administrator=admin)
+        self.display_avatar = FakeAsset(asset_url, user_id)
+        self.dms = []
+
+    async def edit(self, roles=None, reason=None):
+        await asyncio.sleep(self.guild.latency)
+        self.guild.edits += 1
+        if roles is not None:
+            self.roles = [self.guild.default_role, *roles]
+
+    async def send(self, **kwargs):
+        await asyncio.sleep(self.guild.latency)
+        self.dms.append(kwargs)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeMember) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeChannel:
+    def __init__(self, guild, channel_id):
+        self.guild = guild
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, **kwargs):
+        await asyncio.sleep(self.guild.latency)
+        self.sent.append(kwargs)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name="Bench League", latency=0.0):
+        self.id = guild_id
+        self.name = name
+        self.icon = None
+        self.latency = latency  # simulated REST round trip, seconds
+        self.edits = 0
+        self.members = []
+        self._roles = {}
+        self._members = {}
+        self._channels = {}
+        self.default_role = self.add_role(guild_id, "@everyone")
+
+    @property
+    def roles(self):
+        return list(self._roles.values())
+
+    def add_role(self, role_id, name, color=0x3498DB):
+        role = self._roles[role_id] = FakeRole(self, role_id, name, color)
+        return role
+
+    def add_member(self, user_id, name, roles=(), admin=False, asset_url="http://127.0.0.1"):
+        member = self._members[user_id] = FakeMember(self, user_id, name, roles, admin, asset_url)
+        self.members.append(member)
+        return member
+
+    def add_channel(self, channel_id):
+        channel = self._channels[channel_id] = FakeChannel(self, channel_id)
+        return channel
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    async def chunk(self, cache=True):
+        await asyncio.sleep(self.latency)
+        return list(self.members)
+
+    async def query_members(self, query=None, limit=5, user_ids=None, presences=False, cache=True):
+        await asyncio.sleep(self.latency)
+        return [self._members[i] for i in user_ids or () if i in self._members]
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self._interaction.record(content, kwargs)
+
+    async def edit_message(self, content=None, **kwargs):
+        self._done = True
+        self._interaction.record(content, kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.record(content, kwargs)
+
+
+class FakeInteraction:
+    type = discord.InteractionType.application_command
+    command = None
+    message = None
+
+    def __init__(self, guild, user):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.extras = {}
+        self.created = time.perf_counter()
+        self.replies = []  # (seconds since creation, content)
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    def record(self, content, kwargs):
+        self.replies.append((time.perf_counter() - self.created, content))
+
+
+# --- LOCAL ASSET SERVER ---
+# Stands in for the Discord CDN and custom background hosts.
+
+def _png(size, color):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class AssetServer:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.connections = set()  # client (host, port): one per TCP connection
+        self.url = None
+        self._runner = None
+        self._avatar = _png((256, 256), (200, 120, 40))
+        self._background = _png((1024, 512), (30, 60, 90))
+
+    async def _serve(self, request, data):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(self.latency)
+        return web.Response(body=data, content_type="image/png")
+
+    async def start(self):
+        async def avatar(request):
+            return await self._serve(request, self._avatar)
+
+        async def background(request):
+            return await self._serve(request, self._background)
+
+        app = web.Application()
+        app.router.add_get("/avatars/{name}", avatar)
+        app.router.add_get("/backgrounds/{name}", background)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        self.url = f"http://127.0.0.1:{self._runner.addresses[0][1]}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
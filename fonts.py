@@ -0,0 +1,87 @@
+import asyncio
+import os
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+# --- FONT MANAGER ---
+# Fonts are parsed once per process (the render pool has its own copy) and
+# the fixed card titles are rasterized once into alpha layers, so a card only
+# has to draw the player's name.
+
+FONT_FILE = "font.ttf"
+FONT_URL = "https://github.com/google/fonts/raw/main/apache/roboto/Roboto-Bold.ttf"
+CARD_TITLES = ("OFFICIAL SIGNING", "OFFICIAL TRANSFER", "OFFICIAL RELEASE", "TEST CARD")
+
+_lock = threading.Lock()
+_fonts = {}   # size -> FreeTypeFont
+_layers = {}  # (text, size, width) -> (alpha layer, x, y)
+
+
+def get_font(size):
+    font = _fonts.get(size)
+    if font is not None:
+        return font
+    with _lock:
+        if size not in _fonts:
+            try:
+                _fonts[size] = ImageFont.truetype(FONT_FILE, size)
+            except Exception:
+                # Emergency backup if download failed. Not cached, so the
+                # real font is picked up as soon as it lands on disk.
+                return ImageFont.load_default()
+        return _fonts[size]
+
+
+def text_layer(text, size, width):
+    # Alpha mask of `text` centred on a row `width` px wide, cropped to the ink.
+    # Returns (layer, x, y) where (x, y) is the offset from the centre point.
+    key = (text, size, width)
+    cached = _layers.get(key)
+    if cached is not None:
+        return cached
+
+    font = get_font(size)
+    band = Image.new("L", (width, size * 2), 0)
+    ImageDraw.Draw(band).text((width / 2, size), text, fill=255, font=font, anchor="mm")
+    box = band.getbbox() or (0, 0, 1, 1)
+    entry = (band.crop(box), box[0] - width // 2, box[1] - size)
+
+    if font is _fonts.get(size):
+        with _lock:
+            _layers[key] = entry
+    return entry
+
+
+def paste_text(img, center, text, size, fill="white"):
+    layer, dx, dy = text_layer(text, size, img.width)
+    img.paste(fill, (int(center[0]) + dx, int(center[1]) + dy), mask=layer)
+
+
+def warm_titles(size, width):
+    for title in CARD_TITLES:
+        text_layer(title, size, width)
+
+
+# --- FONT DOWNLOAD ---
+
+async def ensure_font(session):
+    # Runs in the background after startup; cards use the default font until it lands
+    if os.path.exists(FONT_FILE):
+        return
+    print("System: Font missing. Downloading Roboto-Bold...")
+    try:
+        async with session.get(FONT_URL) as resp:
+            resp.raise_for_status()
+            data = await resp.read()
+        await asyncio.to_thread(_write_font, data)
+        print("System: Font downloaded successfully!")
+    except Exception as e:
+        print(f"System: Could not download font. Text will be small. Error: {e}")
+
+
+def _write_font(data):
+    tmp = FONT_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, FONT_FILE)
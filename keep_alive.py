@@ -1,16 +1,67 @@
-from flask import Flask
-from threading import Thread
+import asyncio
+import math
+import os
 
-app = Flask('')
+from aiohttp import web
 
-@app.route('/')
-def home():
-    return "Proxima Bot is Online and Alive!"
+import metrics
+import sharding
+import tracing
 
-def run():
-    # Binds to port 8080, which Render requires for web services
-    app.run(host='0.0.0.0', port=8080)
+# --- HEALTH & METRICS SERVER ---
+# Runs on the bot's own event loop (aiohttp is already a dependency), so
+# there is no second web stack or extra thread. Binds to port 8080 (or
+# $PORT), which Render requires for web services.
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+PORT = int(os.environ.get("PORT", 8080))
+DB_PROBE_TIMEOUT = 2.0
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def build_app(bot, db):
+    async def home(request):
+        return web.Response(text="Proxima Bot is Online and Alive!")
+
+    async def healthz(request):
+        try:
+            await asyncio.wait_for(db.fetchone("SELECT 1"), timeout=DB_PROBE_TIMEOUT)
+            db_ok = True
+        except Exception:
+            db_ok = False
+        shards = sharding.report(bot)
+        gateway = bot.is_ready() and not bot.is_closed() and all(s["connected"] for s in shards.values())
+        latency = bot.latency
+        body = {
+            "gateway_connected": gateway,
+            "db_reachable": db_ok,
+            "latency_ms": round(latency * 1000, 1) if math.isfinite(latency) else None,
+            "shards": shards,
+        }
+        return web.json_response(body, status=200 if gateway and db_ok else 503)
+
+    async def readyz(request):
+        # Ready = caches loaded and the gateway has delivered READY
+        ready = bool(getattr(bot, "loaded", False)) and bot.is_ready()
+        return web.json_response({"ready": ready}, status=200 if ready else 503)
+
+    async def metrics_view(request):
+        return web.Response(body=metrics.render().encode(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    async def traces(request):
+        return web.json_response(tracing.report())
+
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    app.router.add_get("/metrics", metrics_view)
+    app.router.add_get("/traces", traces)
+    return app
+
+
+async def keep_alive(bot, db, host="0.0.0.0", port=PORT):
+    # Returns the runner; await runner.cleanup() on shutdown
+    runner = web.AppRunner(build_app(bot, db), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
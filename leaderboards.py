@@ -0,0 +1,175 @@
+import asyncio
+import bisect
+
+# --- LEADERBOARDS ---
+# The top TOP_K rows of every board are kept in memory per guild and updated
+# as stats change, so showing a leaderboard never sorts a stats table. A
+# board is (re)built from its covering index on first read, or after a change
+# the incremental rules can't handle (a score going down). Pages past the
+# cached rows continue down the same index with keyset queries.
+#
+# Scores only grow, so a bump can only move a row up: it either updates a
+# cached row or pushes the lowest cached row out.
+
+TOP_K = 100
+SCAN_BATCH = 200
+STAT_BOARDS = {"transfer": "transfers", "demand": "demands"}
+
+
+class _Board:
+    def __init__(self):
+        self.scores = {}        # id -> score, top-K only
+        self.ranked = None      # sorted [(-score, id)], rebuilt on demand
+        self.complete = False   # no rows with a score exist beyond `scores`
+        self.loaded = False
+        self.loading = False
+        self.stale = False      # changed while loading; load again
+        self.lock = asyncio.Lock()
+
+    def order(self):
+        if self.ranked is None:
+            self.ranked = sorted((-score, key_id) for key_id, score in self.scores.items())
+        return self.ranked
+
+    def offer(self, key_id, score, top_k):
+        if key_id in self.scores:
+            if score <= self.scores[key_id]:
+                return
+        elif len(self.scores) >= top_k:
+            # Full: whichever of the two ranks lower now lives past the cache
+            self.complete = False
+            low_score, low_id = self.order()[-1]
+            if (-score, key_id) >= (low_score, low_id):
+                return
+            del self.scores[low_id]
+        self.scores[key_id] = score
+        self.ranked = None
+
+
+async def _take(rows, batch, keep, limit):
+    # Appends the rows of batch that keep accepts; True once there are more
+    # than limit, i.e. another page exists
+    kept = await keep([key_id for key_id, _ in batch]) if keep and batch else None
+    for row in batch:
+        if kept is None or row[0] in kept:
+            rows.append(tuple(row))
+            if len(rows) > limit:
+                return True
+    return False
+
+
+class Leaderboards:
+    def __init__(self, db, top_k=TOP_K):
+        self.db = db
+        self.top_k = top_k
+        self._boards = {}  # (guild_id, board) -> _Board
+
+        # Counters
+        self.cached_reads = 0  # pages served from memory only
+        self.deep_reads = 0    # pages that had to scan past the top-K
+        self.rebuilds = 0
+        self.updates = 0
+
+    # --- WRITES ---
+    async def update_stat(self, guild_id, user_id, stat_type, amount=1):
+        await self.db.update_stat(guild_id, user_id, stat_type, amount)
+        await self._record(STAT_BOARDS[stat_type], guild_id, user_id, amount)
+
+    async def team_moved(self, guild_id, role_id, amount=1):
+        await self.db.update_team_moves(guild_id, role_id, amount)
+        await self._record("teams", guild_id, role_id, amount)
+
+    def invalidate(self, guild_id):
+        # Rows were moved around behind our back (legacy claim); rebuild lazily
+        for key in [k for k in self._boards if k[0] == guild_id]:
+            self._boards[key].loaded = False
+
+    async def _record(self, name, guild_id, key_id, amount):
+        board = self._boards.get((guild_id, name))
+        if board is None:
+            return  # never read; built from the index when it is
+        if board.loading:
+            board.stale = True
+            return
+        if not board.loaded:
+            return
+        if amount < 0:
+            board.loaded = False
+            return
+
+        self.updates += 1
+        if key_id in board.scores:
+            board.offer(key_id, board.scores[key_id] + amount, self.top_k)
+        elif board.complete:
+            # Every row with a score is cached, so this one started at 0
+            board.offer(key_id, amount, self.top_k)
+        else:
+            score = await self.db.score(name, guild_id, key_id)
+            if board.loading:
+                board.stale = True
+            elif board.loaded:
+                board.offer(key_id, score, self.top_k)
+
+    # --- READS ---
+    async def _board(self, guild_id, name):
+        board = self._boards.get((guild_id, name))
+        if board is None:
+            board = self._boards[(guild_id, name)] = _Board()
+        if board.loaded:
+            return board
+        async with board.lock:
+            while not board.loaded:
+                board.loading = True
+                board.stale = False
+                try:
+                    await self.db.pending.flush()
+                    rows = await self.db.ranked(name, guild_id, limit=self.top_k)
+                finally:
+                    board.loading = False
+                if board.stale:
+                    continue
+                board.scores = dict(rows)
+                board.ranked = None
+                board.complete = len(rows) < self.top_k
+                board.loaded = True
+                self.rebuilds += 1
+        return board
+
+    async def page(self, guild_id, name, keep=None, after=None, limit=15):
+        # Up to `limit` (id, score) rows ranked below `after` (the last row of
+        # the previous page), skipping rows `keep` rejects, e.g. members who
+        # left. keep is async and filters a batch: given a list of ids it
+        # returns the ones to show. Returns (rows, has_more).
+        board = await self._board(guild_id, name)
+        ranked = board.order()
+        start = bisect.bisect_right(ranked, (-after[1], after[0])) if after else 0
+        cached = [(key_id, -neg_score) for neg_score, key_id in ranked[start:]]
+        rows = []
+        # A page's worth at a time, so keep isn't asked about rows we won't show
+        for i in range(0, len(cached), limit + 1):
+            if await _take(rows, cached[i:i + limit + 1], keep, limit):
+                self.cached_reads += 1
+                return rows[:limit], True
+        if board.complete:
+            self.cached_reads += 1
+            return rows, False
+
+        self.deep_reads += 1
+        cursor = cached[-1] if cached else after
+        await self.db.pending.flush()
+        while True:
+            batch = await self.db.ranked(name, guild_id, cursor, SCAN_BATCH)
+            if await _take(rows, batch, keep, limit):
+                return rows[:limit], True
+            if len(batch) < SCAN_BATCH:
+                return rows, False
+            cursor = batch[-1]
+
+    def snapshot(self):
+        return {
+            "boards": sum(1 for b in self._boards.values() if b.loaded),
+            "cached_reads": self.cached_reads,
+            "deep_reads": self.deep_reads,
+            "rebuilds": self.rebuilds,
+            "updates": self.updates,
+        }
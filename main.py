@@ -1,260 +1,282 @@
 import discord
 from discord import app_commands
-import sqlite3
 import datetime
 import os
+import time
 import asyncio  # added for timeout handling
+import hashlib
+import json
 from keep_alive import keep_alive
+from database import Database, DB_FILE
+from delivery import Delivery
+from roles import edit_roles, stats as role_stats
+from embeds import split_field, pack_pages
+from leaderboards import Leaderboards
+from members import MemberCache, client_options
+import sharding
+import metrics
+import tracing
+from cache import GuildConfig, ConfigCache, TeamRegistry, BackgroundCache, LRUBytesCache
 
 # --- IMPORTS FOR IMAGE GENERATION ---
-from PIL import Image, ImageDraw, ImageFont
+# cards / fonts (and Pillow with them) are imported by load_cards(), off the
+# startup path
 import io
 import aiohttp
-import urllib.request  # To download font automatically
 
 # --- CONFIGURATION ---
 TOKEN = os.environ.get('TOKEN')
 DEFAULT_BG_FILE = "proxima_default.jpg"
-
-# --- AUTO-DOWNLOAD FONT (No upload needed!) ---
-def check_and_download_font():
-    if not os.path.exists("font.ttf"):
-        print("System: Font missing. Downloading Roboto-Bold...")
-        try:
-            url = "https://github.com/google/fonts/raw/main/apache/roboto/Roboto-Bold.ttf"
-            urllib.request.urlretrieve(url, "font.ttf")
-            print("System: Font downloaded successfully!")
-        except Exception as e:
-            print(f"System: Could not download font. Text will be small. Error: {e}")
-
-# Call this immediately
-check_and_download_font()
+COMMAND_HASH_FILE = os.environ.get("COMMAND_HASH_FILE", ".command_hash")
+FORCE_SYNC = os.environ.get("FORCE_SYNC") == "1"
 
 # --- DATABASE SETUP ---
-conn = sqlite3.connect('team_manager.db')
-c = conn.cursor()
-
-# 1. Global Settings
-c.execute("""CREATE TABLE IF NOT EXISTS global_config (
-             guild_id INTEGER PRIMARY KEY,
-             manager_role_id INTEGER,
-             asst_role_id INTEGER,
-             contract_channel_id INTEGER,
-             free_agent_role_id INTEGER,
-             window_open INTEGER DEFAULT 1,
-             demand_limit INTEGER DEFAULT 3
-             )""")
-
-# 2. Teams Table
-c.execute("""CREATE TABLE IF NOT EXISTS teams (
-             team_role_id INTEGER PRIMARY KEY,
-             logo TEXT,
-             roster_limit INTEGER,
-             transaction_image TEXT
-             )""")
-
-# 3. Free Agents
-c.execute("""CREATE TABLE IF NOT EXISTS free_agents (
-             user_id INTEGER PRIMARY KEY,
-             region TEXT,
-             position TEXT,
-             description TEXT,
-             timestamp TEXT
-             )""")
-
-# 4. Player Stats
-c.execute("""CREATE TABLE IF NOT EXISTS player_stats (
-             user_id INTEGER PRIMARY KEY,
-             transfers INTEGER DEFAULT 0,
-             demands INTEGER DEFAULT 0
-             )""")
-
-# --- DATABASE MIGRATIONS ---
-try:
-    c.execute("ALTER TABLE global_config ADD COLUMN free_agent_role_id INTEGER")
-except sqlite3.OperationalError:
-    pass
-try:
-    c.execute("ALTER TABLE global_config ADD COLUMN window_open INTEGER DEFAULT 1")
-except sqlite3.OperationalError:
-    pass
-try:
-    c.execute("ALTER TABLE teams ADD COLUMN transaction_image TEXT")
-except sqlite3.OperationalError:
-    pass
-try:
-    c.execute("ALTER TABLE global_config ADD COLUMN demand_limit INTEGER DEFAULT 3")
-except sqlite3.OperationalError:
-    pass
-conn.commit()
+# Nothing below touches the disk or network at import time: the database is
+# opened (and migrated) in setup_hook, so bench.py can import this module.
+db = Database(os.environ.get("DB_FILE", DB_FILE))
+configs = ConfigCache(db)
+teams = TeamRegistry(db)
+boards = Leaderboards(db)
+member_cache = MemberCache(configs, teams)
+
+# --- OUTBOUND MESSAGES ---
+delivery = Delivery()
+
+# --- CARD RENDER POOL ---
+# Importing Pillow and forking the render workers is the slowest part of a
+# cold start, so it happens in a thread once the bot is up, or on the first
+# card if that comes sooner. Both names stay None until then.
+cards = None
+renderer = None
+backgrounds = BackgroundCache("card_cache")
+avatars = LRUBytesCache(32 * 1024 * 1024)  # ~200 masked 200x200 crops
+_cards_loading = None
+
+def _load_cards():
+    global cards, renderer
+    import cards as module
+    pool = module.CardRenderer()
+    pool.start()
+    backgrounds.item_size = module.BACKGROUND_SIZE
+    cards, renderer = module, pool
+
+async def load_cards():
+    global _cards_loading
+    if cards is not None:
+        return
+    if _cards_loading is None:
+        _cards_loading = asyncio.ensure_future(asyncio.to_thread(_load_cards))
+    try:
+        await asyncio.shield(_cards_loading)
+    except Exception:
+        _cards_loading = None  # let the next card try again
+        raise
+
+# --- METRICS ---
+CARD_RENDER_SECONDS = metrics.histogram("card_render_seconds", "Transaction card render time")
+metrics.collect("delivery", delivery.snapshot)
+metrics.collect("write_behind", db.pending.snapshot)
+metrics.collect("config_cache", configs.snapshot)
+metrics.collect("avatar_cache", avatars.snapshot)
+metrics.collect("background_cache", backgrounds.snapshot)
+metrics.collect("leaderboards", boards.snapshot)
+metrics.collect("role_edits", role_stats.snapshot)
+metrics.collect("member_cache", member_cache.snapshot)
+metrics.collect("shard", lambda: {shard_id: {key: int(value) if isinstance(value, bool) else value for key, value in info.items()}
+                                  for shard_id, info in sharding.report(client).items()}, label="shard")
 
 # --- HELPER FUNCTIONS ---
 
-def get_global_config(guild_id):
-    c.execute("SELECT * FROM global_config WHERE guild_id = ?", (guild_id,))
-    return c.fetchone()
-
-def get_team_data(role_id):
-    c.execute("SELECT * FROM teams WHERE team_role_id = ?", (role_id,))
-    return c.fetchone()
-
-def get_all_teams():
-    c.execute("SELECT * FROM teams")
-    return c.fetchall()
-
-def get_player_stats(user_id):
-    c.execute("SELECT * FROM player_stats WHERE user_id = ?", (user_id,))
-    data = c.fetchone()
-    if not data:
-        c.execute("INSERT INTO player_stats (user_id, transfers, demands) VALUES (?, 0, 0)", (user_id,))
-        conn.commit()
-        return (user_id, 0, 0)
-    return data
-
-def update_stat(user_id, stat_type, amount=1):
-    get_player_stats(user_id)  # Ensure exists
-    if stat_type == "transfer":
-        c.execute("UPDATE player_stats SET transfers = transfers + ? WHERE user_id = ?", (amount, user_id))
-    elif stat_type == "demand":
-        c.execute("UPDATE player_stats SET demands = demands + ? WHERE user_id = ?", (amount, user_id))
-    conn.commit()
-
 def find_user_team(member):
-    for role in member.roles:
-        data = get_team_data(role.id)
-        if data:
-            trans_img = data[3] if len(data) > 3 else None
-            return (role, data[1], data[2], trans_img)
-    return None
+    found = teams.find(member)
+    if not found:
+        return None
+    role, data = found
+    return (role, data[1], data[2], data[3])
+
+ROSTER_WAIT = 2.0  # seconds an undeferred command waits for its guild's members
+
+async def roster_ready(interaction):
+    # For commands that read role.members: the guild's league members are
+    # cached by a background load after startup or a join, which in a big
+    # guild can outlast the interaction deadline. Deferred commands wait for
+    # it; others wait briefly, then ask the user to retry.
+    load = member_cache.load(interaction.guild)
+    if interaction.response.is_done():
+        await load
+        return True
+    try:
+        await asyncio.wait_for(load, ROSTER_WAIT)
+        return True
+    except asyncio.TimeoutError:
+        await interaction.response.send_message("⏳ Still loading this server's teams, try again in a few seconds.", ephemeral=True)
+        return False
 
 def is_staff(interaction: discord.Interaction):
     return interaction.user.guild_permissions.administrator
 
-def is_window_open(guild_id):
-    config = get_global_config(guild_id)
+async def is_window_open(guild_id):
+    config = await configs.get(guild_id)
     if not config:
         return True
-    try:
-        return config[5] == 1
-    except IndexError:
-        return True
+    return config.window_open == 1
+
+def staff_ids(guild, config):
+    # Member ids holding the manager / assistant roles, built once per command
+    # so classifying each roster member is a set lookup
+    def ids(role_id):
+        role = guild.get_role(role_id) if role_id else None
+        return {m.id for m in role.members} if role else set()
+    if not config:
+        return (set(), set())
+    return (ids(config.manager_role_id), ids(config.asst_role_id))
 
-def get_managers_of_team(guild, team_role):
-    config = get_global_config(guild.id)
+async def get_managers_of_team(guild, team_role):
+    config = await configs.get(guild.id)
     if not config:
         return ([], [])
-    mgr_id, asst_id = config[1], config[2]
-    head_managers, assistants = [], []
+    managers, assistants = staff_ids(guild, config)
+    head_managers, assistants_list = [], []
     for member in team_role.members:
-        r_ids = [r.id for r in member.roles]
-        if mgr_id in r_ids:
+        if member.id in managers:
             head_managers.append(member)
-        elif asst_id in r_ids:
-            assistants.append(member)
-    return (head_managers, assistants)
+        elif member.id in assistants:
+            assistants_list.append(member)
+    return (head_managers, assistants_list)
+
+async def free_agent_role(guild, member):
+    # The free agent role if the member holds it, to strip in a role edit
+    config = await configs.get(guild.id)
+    if config and config.free_agent_role_id:
+        role = guild.get_role(config.free_agent_role_id)
+        if role and role in member.roles:
+            return role
+    return None
 
 async def cleanup_free_agent(guild, member):
-    c.execute("DELETE FROM free_agents WHERE user_id = ?", (member.id,))
-    conn.commit()
-    config = get_global_config(guild.id)
-    if config and config[4]:
-        role = guild.get_role(config[4])
-        if role and role in member.roles:
-            try:
-                await member.remove_roles(role)
-            except:
-                pass
+    # Drops the listing and returns the free agent role to strip (if held),
+    # so the caller can fold it into its own role edit
+    await db.delete_free_agent(guild.id, member.id)
+    return await free_agent_role(guild, member)
 
-def format_roster_list(members, mgr_id, asst_id):
+def format_roster_list(members, managers, assistants):
     formatted_list = []
     for m in members:
-        r_ids = [r.id for r in m.roles]
         name = m.mention
-        if mgr_id in r_ids:
+        if m.id in managers:
             name += " **(TM)**"
-        elif asst_id in r_ids:
+        elif m.id in assistants:
             name += " **(AM)**"
         formatted_list.append(name)
     return formatted_list
 
-# --- MASTER CARD GENERATOR (with timeouts!) ---
-async def generate_transaction_card(player, team_name, team_color, title_text="OFFICIAL SIGNING", custom_bg_url=None):
-    W, H = 800, 400
-    img = None
+# --- SHARED HTTP SESSION ---
+def make_http_session():
+    connector = aiohttp.TCPConnector(
+        limit=100,              # total open connections
+        limit_per_host=10,      # per CDN host
+        ttl_dns_cache=300,      # seconds
+        keepalive_timeout=60,   # seconds an idle connection stays open
+    )
+    timeout = aiohttp.ClientTimeout(total=10)  # 10 second timeout
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
 
-    # 1. Try Custom URL (from /decorate_transactions)
-    if custom_bg_url:
-        try:
-            timeout = aiohttp.ClientTimeout(total=10)  # 10 second timeout
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(custom_bg_url) as resp:
-                    if resp.status == 200:
-                        data = await resp.read()
-                        bg_img = Image.open(io.BytesIO(data)).convert("RGB")
-                        img = bg_img.resize((W, H))
-                        # Dark Overlay so text pops
-                        overlay = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-                        draw_overlay = ImageDraw.Draw(overlay)
-                        draw_overlay.rectangle([(0, 240), (W, H)], fill=(0, 0, 0, 160))
-                        img.paste(overlay, (0, 0), mask=overlay)
-        except (asyncio.TimeoutError, aiohttp.ClientError, Exception):
-            img = None  # fall through to next option
-
-    # 2. Try Local File (If you ever upload one)
-    if img is None and os.path.exists(DEFAULT_BG_FILE):
-        try:
-            bg_img = Image.open(DEFAULT_BG_FILE).convert("RGB")
-            img = bg_img.resize((W, H))
-        except:
-            pass
-
-    # 3. FALLBACK: Paint the background with the Team Color
-    if img is None:
-        bg_color = team_color.to_rgb()
-        # If color is default (black/transparent), make it Dark Grey
-        if bg_color == (0, 0, 0):
-            bg_color = (44, 47, 51)
-        img = Image.new("RGB", (W, H), color=bg_color)
-
-    draw = ImageDraw.Draw(img)
-
-    # 4. Avatar (with timeout)
+# --- MASTER CARD GENERATOR (with timeouts!) ---
+async def fetch_image_bytes(url):
     try:
-        timeout = aiohttp.ClientTimeout(total=10)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(player.display_avatar.url) as resp:
+        # Bot-wide session: connections to the CDN are kept alive and reused
+        with tracing.span("fetch"):
+            async with client.http_session.get(url) as resp:
                 if resp.status == 200:
-                    data = await resp.read()
-                    avatar = Image.open(io.BytesIO(data)).convert("RGBA")
-                    avatar = avatar.resize((200, 200))
-                    # Circular Mask
-                    mask = Image.new("L", (200, 200), 0)
-                    draw_mask = ImageDraw.Draw(mask)
-                    draw_mask.ellipse((0, 0, 200, 200), fill=255)
-                    img.paste(avatar, (300, 50), mask=mask)
-                    # Border
-                    draw.ellipse((300, 50, 500, 250), outline="white", width=3)
+                    return await resp.read()
     except (asyncio.TimeoutError, aiohttp.ClientError, Exception):
-        pass  # If avatar fails, just skip it
+        pass
+    return None
 
-    # 5. Text (Auto-downloads font so it looks good)
-    try:
-        font_large = ImageFont.truetype("font.ttf", 60)
-        font_small = ImageFont.truetype("font.ttf", 40)
-    except:
-        # Emergency backup if download failed
-        font_large = ImageFont.load_default()
-        font_small = ImageFont.load_default()
+_preparing = {}  # cache key -> future of the fetch + prepare in progress
 
-    # Draw Text
-    draw.text((W / 2, 290), title_text, fill="white", font=font_small, anchor="mm")
-    draw.text((W / 2, 350), player.name.upper(), fill="white", font=font_large, anchor="mm")
+async def prepare_once(key, prepare):
+    # Concurrent misses on one key (a burst of signings for the same team)
+    # share a single fetch and prepare; same pattern as load_cards
+    future = _preparing.get(key)
+    if future is None:
+        future = _preparing[key] = asyncio.ensure_future(prepare())
+        future.add_done_callback(lambda _: _preparing.pop(key, None))
+    return await asyncio.shield(future)
 
-    # Save to Buffer
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return discord.File(buffer, filename="transaction.png")
+async def get_card_background(team_id, team_color, custom_bg_url):
+    # 1. Custom URL (from /decorate_transactions), prepared once per team + URL
+    if custom_bg_url:
+        key = backgrounds.team_key(team_id, custom_bg_url)
+
+        async def prepare():
+            base = await backgrounds.get(key)
+            if base is None:
+                bg_bytes = await fetch_image_bytes(custom_bg_url)
+                if bg_bytes:
+                    base = await renderer.run(cards.prepare_custom_background, bg_bytes)
+                    if base:
+                        await backgrounds.put(key, base)
+            return base
+
+        base = await backgrounds.get(key)
+        if base is None:
+            base = await prepare_once(("background", key), prepare)
+        if base:
+            return base
+
+    # 2. Local File (If you ever upload one)
+    if os.path.exists(DEFAULT_BG_FILE):
+        base = await backgrounds.get("default", persist=False)
+        if base is None:
+            base = await renderer.run(cards.prepare_file_background, DEFAULT_BG_FILE)
+            if base:
+                await backgrounds.put("default", base, persist=False)
+        if base:
+            return base
+
+    # 3. FALLBACK: Team Color
+    rgb = team_color.to_rgb()
+    key = "color-%d-%d-%d" % rgb
+    base = await backgrounds.get(key, persist=False)
+    if base is None:
+        base = cards.prepare_color_background(rgb)
+        await backgrounds.put(key, base, persist=False)
+    return base
+
+async def get_card_avatar(player):
+    # Keyed by the avatar hash, so a new avatar is a new entry
+    asset = player.display_avatar
+
+    async def prepare():
+        avatar = avatars.get(asset.key)
+        if avatar is None:
+            # 256px is plenty for a 200px crop and much smaller than the original
+            data = await fetch_image_bytes(asset.with_size(256).url)
+            if data:
+                avatar = await renderer.run(cards.prepare_avatar, data)
+                if avatar:
+                    avatars.put(asset.key, avatar)
+        return avatar
+
+    avatar = avatars.get(asset.key)
+    if avatar is None:
+        avatar = await prepare_once(("avatar", asset.key), prepare)
+    return avatar
+
+async def generate_transaction_card(player, team_name, team_color, title_text="OFFICIAL SIGNING", custom_bg_url=None, team_id=None, guild_id=None):
+    # Network stays on the event loop; PIL work runs in the render pool
+    await load_cards()
+    config = await configs.get(guild_id) if guild_id else None
+    card_format = config.card_format if config else "png"
+    card_quality = config.card_quality if config else 85
+
+    background = await get_card_background(team_id, team_color, custom_bg_url)
+    avatar = await get_card_avatar(player)
+    with CARD_RENDER_SECONDS.time():
+        data, ext = await renderer.render(background, avatar, title_text, player.name, card_format, card_quality)
+    # Embeds must point at file.filename: the extension follows the format
+    return discord.File(io.BytesIO(data), filename=f"transaction.{ext}")
 
 # --- EMBED GENERATOR ---
 def create_transaction_embed(guild, title, description, color, team_role, logo, coach, roster_count, limit):
@@ -271,80 +293,172 @@ def create_transaction_embed(guild, title, description, color, team_role, logo,
     return embed
 
 async def send_to_channel(guild, embed, file=None):
-    config = get_global_config(guild.id)
-    if config and config[3]:
-        channel = guild.get_channel(config[3])
+    # Queued: returns once the post is scheduled, not once Discord accepts it
+    config = await configs.get(guild.id)
+    if config and config.contract_channel_id:
+        channel = guild.get_channel(config.contract_channel_id)
         if channel:
-            await channel.send(embed=embed, file=file)
+            with tracing.span("send"):
+                delivery.channel(channel, embed=embed, file=file)
             return True
     return False
 
-async def send_dm(user, content=None, embed=None, view=None):
-    try:
-        await user.send(content=content, embed=embed, view=view)
-        return True
-    except:
-        return False
+async def send_dm(user, content=None, embed=None, view=None, wait=False):
+    # wait=True blocks until the DM is actually delivered (or gives up)
+    with tracing.span("send"):
+        result = delivery.dm(user, content=content, embed=embed, view=view)
+        if wait:
+            return await result
+    return True
 
 # --- VIEWS ---
 
-class TransferView(discord.ui.View):
-    def __init__(self, guild, player, from_team, to_team, to_manager, logo):
-        super().__init__(timeout=86400)
-        self.guild = guild
-        self.player = player
-        self.from_team = from_team
-        self.to_team = to_team
-        self.to_manager = to_manager
-        self.logo = logo
-
-    @discord.ui.button(label="Accept Transfer", style=discord.ButtonStyle.green, emoji="✅")
-    async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not is_window_open(self.guild.id):
-            return await interaction.response.send_message("❌ **Transfer Window is CLOSED.**", ephemeral=True)
-
+OFFER_TTL = 86400            # seconds a /transfer offer stays open
+OFFER_SWEEP_INTERVAL = 600
+MEMBER_TRIM_INTERVAL = 600
+OFFER_RELAY_INTERVAL = 1.0   # seconds between checks for clicks other shards received
+OFFER_RELAY_TTL = 900        # interaction tokens die after 15 minutes
+
+class OfferButton(discord.ui.DynamicItem[discord.ui.Button], template=r"offer:(?P<action>accept|decline):(?P<offer_id>[0-9]+)"):
+    # Accept / Decline on a transfer offer DM. The offer id lives in the
+    # custom_id and everything else in transfer_offers, so nothing is held in
+    # memory while an offer is pending and buttons keep working after a restart.
+    def __init__(self, action, offer_id, disabled=False):
+        if action == "accept":
+            button = discord.ui.Button(label="Accept Transfer", style=discord.ButtonStyle.green, emoji="✅", disabled=disabled, custom_id=f"offer:accept:{offer_id}")
+        else:
+            button = discord.ui.Button(label="Decline", style=discord.ButtonStyle.red, emoji="❌", disabled=disabled, custom_id=f"offer:decline:{offer_id}")
+        super().__init__(button)
+        self.action = action
+        self.offer_id = offer_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["action"], int(match["offer_id"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        if client.shard_ids is not None:
+            offer = await db.get_offer(self.offer_id, time.time())
+            if offer and not client.owns(offer[1]):
+                # DMs arrive on shard 0; the process owning the guild applies it
+                await interaction.response.defer()
+                await db.queue_offer_action(self.offer_id, offer[1], self.action, interaction.user.id, interaction.channel_id,
+                                            interaction.message.id, interaction.token, time.time())
+                return
+        if self.action == "accept":
+            await accept_offer(interaction, self.offer_id)
+        else:
+            await decline_offer(interaction, self.offer_id)
+
+class RelayedInteraction:
+    # An offer click another process received for one of our guilds. Stands
+    # in for the interaction in accept_offer / decline_offer: replies go
+    # through the interaction's webhook, the offer DM is edited over REST.
+    def __init__(self, row):
+        _, _, _, user_id, channel_id, message_id, token, _ = row
+        self.user = discord.Object(user_id)
+        self.followup = discord.Webhook.from_state(data={"id": client.application_id, "type": 3, "token": token}, state=client._connection)
+        self.message = client.get_partial_messageable(channel_id).get_partial_message(message_id)
+        self.response = self
+
+    async def defer(self):
+        pass  # the receiving process already did
+
+    async def send_message(self, content=None, **kwargs):
+        await self.followup.send(content, **kwargs)
+
+def offer_view(offer_id, disabled=False):
+    view = discord.ui.View(timeout=None)
+    view.add_item(OfferButton("accept", offer_id, disabled))
+    view.add_item(OfferButton("decline", offer_id, disabled))
+    # Clicks are routed by OfferButton's custom_id pattern, so discord.py
+    # doesn't need to keep this view around after it is sent
+    view.stop()
+    return view
+
+async def close_offer(interaction, offer_id, content):
+    await interaction.message.edit(content=content, view=offer_view(offer_id, disabled=True))
+
+@tracing.traced("offer accept")
+async def accept_offer(interaction: discord.Interaction, offer_id):
+    offer = await db.get_offer(offer_id, time.time())
+    if not offer:
         await interaction.response.defer()
+        return await close_offer(interaction, offer_id, "⌛ **Offer expired.**")
+    guild_id = offer[1]
+    if not await is_window_open(guild_id):
+        return await interaction.response.send_message("❌ **Transfer Window is CLOSED.**", ephemeral=True)
 
-        try:
-            member = self.guild.get_member(self.player.id)
-            if not member:
-                return await interaction.followup.send("❌ Player missing.", ephemeral=True)
-
-            await member.remove_roles(self.from_team)
-            await member.add_roles(self.to_team)
-            await cleanup_free_agent(self.guild, member)
-            update_stat(member.id, "transfer")
-
-            desc = f"🚨 **TRANSFER NEWS** 🚨\n\n{member.mention} has been transferred\nFrom: {self.from_team.mention}\nTo: {self.to_team.mention}"
-
-            data = get_team_data(self.to_team.id)
-            limit = data[2] if data else 0
-            custom_bg = data[3] if data and len(data) > 3 else None
-
-            embed = create_transaction_embed(self.guild, "Official Transfer", desc, discord.Color.purple(), self.to_team, self.logo, self.to_manager, len(self.to_team.members), limit)
-
-            file = await generate_transaction_card(member, self.to_team.name, self.to_team.color, "OFFICIAL TRANSFER", custom_bg)
-            embed.set_image(url="attachment://transaction.png")
-
-            await send_to_channel(self.guild, embed, file)
-            await send_dm(self.to_manager, f"✅ Transfer for **{member.name}** ACCEPTED!")
+    await interaction.response.defer()
 
-            self.stop()
-            for child in self.children:
-                child.disabled = True
-            await interaction.message.edit(content="✅ **Transfer Approved.**", view=self)
+    offer = await db.take_offer(offer_id, time.time())
+    if not offer:
+        return await interaction.followup.send("⚠️ This offer was already answered.", ephemeral=True)
+    _, guild_id, player_id, from_team_id, to_team_id, manager_id, logo, _ = offer
 
-        except Exception as e:
-            await interaction.followup.send(f"❌ Error: {e}", ephemeral=True)
+    moved = False
+    try:
+        guild = client.get_guild(guild_id)
+        member = await member_cache.get(guild, player_id) if guild else None
+        if not member:
+            return await close_offer(interaction, offer_id, "❌ **Player missing.** Offer closed.")
+        from_team = guild.get_role(from_team_id)
+        to_team = guild.get_role(to_team_id)
+        if not from_team or not to_team:
+            return await close_offer(interaction, offer_id, "❌ **Team no longer exists.** Offer closed.")
+        to_manager = await member_cache.get(guild, manager_id)
+
+        # The listing goes only once the roles have actually changed
+        fa_role = await free_agent_role(guild, member)
+        await edit_roles(member, add=[to_team], remove=[from_team, fa_role])
+        moved = True  # from here a failure leaves the move half done
+        await db.delete_free_agent(guild.id, member.id)
+        await boards.update_stat(guild.id, member.id, "transfer")
+        await boards.team_moved(guild.id, to_team.id)
+        await boards.team_moved(guild.id, from_team.id)
+        await db.record_transaction(guild.id, "transfer", member.id, from_team.id, to_team.id, interaction.user.id)
+
+        desc = f"🚨 **TRANSFER NEWS** 🚨\n\n{member.mention} has been transferred\nFrom: {from_team.mention}\nTo: {to_team.mention}"
+
+        data = teams.get(to_team.id)
+        limit = data[2] if data else 0
+        custom_bg = data[3] if data and len(data) > 3 else None
+
+        embed = create_transaction_embed(guild, "Official Transfer", desc, discord.Color.purple(), to_team, logo, to_manager, len(to_team.members), limit)
+
+        file = await generate_transaction_card(member, to_team.name, to_team.color, "OFFICIAL TRANSFER", custom_bg, to_team.id, guild.id)
+        embed.set_image(url=f"attachment://{file.filename}")
+
+        await send_to_channel(guild, embed, file)
+        if to_manager:
+            await send_dm(to_manager, f"✅ Transfer for **{member.name}** ACCEPTED!")
+
+        await close_offer(interaction, offer_id, "✅ **Transfer Approved.**")
 
-    @discord.ui.button(label="Decline", style=discord.ButtonStyle.red, emoji="❌")
-    async def decline(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer()
-        await send_dm(self.to_manager, f"❌ Transfer for **{self.player.name}** DECLINED.")
-        self.stop()
-        for child in self.children:
-            child.disabled = True
-        await interaction.message.edit(content="❌ **Transfer Declined.**", view=self)
+    except Exception as e:
+        if not moved:
+            # Nothing changed yet: put the offer back so it can be accepted again
+            await db.restore_offer(offer)
+            return await interaction.followup.send(f"❌ Error: {e}", ephemeral=True)
+        # Accepting again would repeat whatever did go through (stats, ledger)
+        print(f"System: Transfer offer {offer_id} failed part way, not reopening it. Error: {e}")
+        await interaction.followup.send(f"❌ Error: {e}\nThe player has moved but the rest may be missing, so this offer is closed.", ephemeral=True)
+        await close_offer(interaction, offer_id, "⚠️ **Transfer Approved** (with errors).")
+
+@tracing.traced("offer decline")
+async def decline_offer(interaction: discord.Interaction, offer_id):
+    await interaction.response.defer()
+    offer = await db.take_offer(offer_id, time.time())
+    if not offer:
+        return await close_offer(interaction, offer_id, "⌛ **Offer expired.**")
+    _, guild_id, player_id, _, _, manager_id, _, _ = offer
+    guild = client.get_guild(guild_id)
+    found = await member_cache.resolve(guild, [manager_id, player_id]) if guild else {}
+    to_manager = found.get(manager_id)
+    player = found.get(player_id)
+    if to_manager:
+        await send_dm(to_manager, f"❌ Transfer for **{player.name if player else player_id}** DECLINED.")
+    await close_offer(interaction, offer_id, "❌ **Transfer Declined.**")
 
 class HelpView(discord.ui.View):
     def __init__(self, embeds):
@@ -369,6 +483,226 @@ class HelpView(discord.ui.View):
         self.update_buttons()
         await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
 
+class PagedEmbedView(discord.ui.View):
+    # HelpView for embeds produced lazily by a generator: pages are pulled one
+    # ahead of the one on screen, so Next knows whether there is more
+    def __init__(self, pages):
+        super().__init__(timeout=120)
+        self.source = iter(pages)
+        self.embeds = []
+        self.current_page = 0
+        self.fill(1)
+        self.update_buttons()
+
+    def fill(self, index):
+        while len(self.embeds) <= index:
+            embed = next(self.source, None)
+            if embed is None:
+                break
+            self.embeds.append(embed)
+
+    def update_buttons(self):
+        self.previous.disabled = self.current_page == 0
+        self.next.disabled = self.current_page >= len(self.embeds) - 1
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.primary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page -= 1
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page += 1
+        self.fill(self.current_page + 1)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
+
+FREE_AGENT_PAGE_SIZE = 10
+
+class FreeAgentView(discord.ui.View):
+    # Like HelpView, but pages are fetched one at a time with keyset
+    # pagination instead of being built up front
+    def __init__(self, guild, region=None, position=None, newest=True):
+        super().__init__(timeout=120)
+        self.guild = guild
+        self.region = region
+        self.position = position
+        self.newest = newest
+        self.cursors = [None]  # start cursor of every page visited so far
+        self.current_page = 0
+        self.next_cursor = None
+
+    def update_buttons(self):
+        self.previous.disabled = self.current_page == 0
+        self.next.disabled = self.next_cursor is None
+
+    async def load_page(self):
+        rows = await db.free_agent_page(self.guild.id, self.region, self.position, self.newest,
+                                        self.cursors[self.current_page], FREE_AGENT_PAGE_SIZE + 1)
+        has_next = len(rows) > FREE_AGENT_PAGE_SIZE
+        rows = rows[:FREE_AGENT_PAGE_SIZE]
+        self.next_cursor = (rows[-1][4], rows[-1][0]) if has_next else None
+        self.update_buttons()
+        if not rows and self.current_page == 0:
+            return None
+
+        embed = discord.Embed(title="📄 Free Agency Market", color=discord.Color.teal())
+        found = await member_cache.resolve(self.guild, [row[0] for row in rows])
+        for uid, reg, pos, desc, _ in rows:
+            member = found.get(uid)
+            if member:
+                embed.add_field(name=f"{pos} | {member.name} ({reg})", value=f"📝 {desc}", inline=False)
+            else:
+                # Player left the server; drop the stale listing
+                await db.delete_free_agent(self.guild.id, uid)
+        filters = " · ".join(f for f in (self.region, self.position) if f)
+        embed.set_footer(text=f"Page {self.current_page + 1}" + (f" · {filters}" if filters else ""))
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.primary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page -= 1
+        embed = await self.load_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page += 1
+        if len(self.cursors) <= self.current_page:
+            self.cursors.append(self.next_cursor)
+        embed = await self.load_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+LEADERBOARD_PAGE_SIZE = 15
+LEADERBOARDS = {
+    "transfers": ("📊 Most Transfers", "Transfers"),
+    "demands": ("📤 Most Demands", "Demands"),
+    "teams": ("🔥 Most Active Teams", "Moves"),
+}
+
+class LeaderboardView(discord.ui.View):
+    # Keyset pages like FreeAgentView; a cursor is the (id, score) of the
+    # last row on the previous page
+    def __init__(self, guild, board):
+        super().__init__(timeout=120)
+        self.guild = guild
+        self.board = board
+        self.cursors = [None]
+        self.current_page = 0
+        self.next_cursor = None
+        self.found = {}  # players resolved by keep(), for their names
+
+    def update_buttons(self):
+        self.previous.disabled = self.current_page == 0
+        self.next.disabled = self.next_cursor is None
+
+    async def keep(self, ids):
+        # Only players still in the server / teams still registered
+        if self.board == "teams":
+            return {i for i in ids if teams.get(i) is not None and self.guild.get_role(i) is not None}
+        found = await member_cache.resolve(self.guild, ids)
+        self.found.update(found)
+        return found
+
+    async def load_page(self):
+        rows, has_next = await boards.page(self.guild.id, self.board, self.keep,
+                                           self.cursors[self.current_page], LEADERBOARD_PAGE_SIZE)
+        self.next_cursor = rows[-1] if has_next else None
+        self.update_buttons()
+        if not rows and self.current_page == 0:
+            return None
+
+        title, unit = LEADERBOARDS[self.board]
+        embed = discord.Embed(title=title, color=discord.Color.gold())
+        desc = ""
+        first = self.current_page * LEADERBOARD_PAGE_SIZE + 1
+        for idx, (key_id, count) in enumerate(rows, first):
+            target = self.guild.get_role(key_id) if self.board == "teams" else self.found.get(key_id)
+            if not target:
+                name = f"Unknown ({key_id})"
+            else:
+                name = target.mention if self.board == "teams" else target.name
+            desc += f"**{idx}.** {name} — {count} {unit}\n"
+        embed.description = desc
+        embed.set_footer(text=f"Page {self.current_page + 1}")
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.primary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page -= 1
+        embed = await self.load_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page += 1
+        if len(self.cursors) <= self.current_page:
+            self.cursors.append(self.next_cursor)
+        embed = await self.load_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+HISTORY_PAGE_SIZE = 10
+
+def format_transaction(row):
+    _, _, tx_type, player_id, from_id, to_id, actor_id, created_at = row
+    when = f"<t:{int(created_at)}:d>"
+    if tx_type == "sign":
+        return f"{when} ✍️ <@{player_id}> signed by <@&{to_id}>"
+    if tx_type == "transfer":
+        return f"{when} 🔁 <@{player_id}> <@&{from_id}> → <@&{to_id}>"
+    if tx_type == "release":
+        return f"{when} 🚪 <@{player_id}> released by <@&{from_id}>"
+    return f"{when} 📤 <@{player_id}> demanded out of <@&{from_id}>"
+
+class HistoryView(discord.ui.View):
+    # Keyset pages like FreeAgentView; a cursor is the last tx_id shown
+    def __init__(self, guild, title, player_id=None, team_id=None):
+        super().__init__(timeout=120)
+        self.guild = guild
+        self.title = title
+        self.player_id = player_id
+        self.team_id = team_id
+        self.cursors = [None]
+        self.current_page = 0
+        self.next_cursor = None
+
+    def update_buttons(self):
+        self.previous.disabled = self.current_page == 0
+        self.next.disabled = self.next_cursor is None
+
+    async def load_page(self):
+        before = self.cursors[self.current_page]
+        if self.player_id:
+            rows = await db.player_history(self.guild.id, self.player_id, before, HISTORY_PAGE_SIZE + 1)
+        else:
+            rows = await db.team_history(self.guild.id, self.team_id, before, HISTORY_PAGE_SIZE + 1)
+        has_next = len(rows) > HISTORY_PAGE_SIZE
+        rows = rows[:HISTORY_PAGE_SIZE]
+        self.next_cursor = rows[-1][0] if has_next else None
+        self.update_buttons()
+        if not rows and self.current_page == 0:
+            return None
+
+        embed = discord.Embed(title=self.title, color=discord.Color.blurple())
+        embed.description = "\n".join(format_transaction(row) for row in rows)
+        embed.set_footer(text=f"Page {self.current_page + 1}")
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.primary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page -= 1
+        embed = await self.load_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page += 1
+        if len(self.cursors) <= self.current_page:
+            self.cursors.append(self.next_cursor)
+        embed = await self.load_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
 class ResetView(discord.ui.View):
     def __init__(self, guild_id):
         super().__init__(timeout=30)
@@ -377,27 +711,205 @@ class ResetView(discord.ui.View):
     @discord.ui.button(label="⚠️ CONFIRM WIPE", style=discord.ButtonStyle.danger)
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
         # Delete Config
-        c.execute("DELETE FROM global_config WHERE guild_id = ?", (self.guild_id,))
-        conn.commit()
+        await configs.delete(self.guild_id)
         await interaction.response.edit_message(content="✅ **Configuration Wiped.** Please run `/setup_global` again.", view=None, embed=None)
 
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
     async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.edit_message(content="❌ **Reset Cancelled.**", view=None, embed=None)
 
+class RecomputeView(discord.ui.View):
+    def __init__(self, guild_id):
+        super().__init__(timeout=30)
+        self.guild_id = guild_id
+
+    @discord.ui.button(label="⚠️ CONFIRM REBUILD", style=discord.ButtonStyle.danger)
+    async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        players, team_count = await db.recompute_stats(self.guild_id)
+        boards.invalidate(self.guild_id)
+        await interaction.edit_original_response(content=f"✅ **Stats Rebuilt** for {players} players and {team_count} teams.", view=None, embed=None)
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.edit_message(content="❌ **Rebuild Cancelled.**", view=None, embed=None)
+
 # --- BOT CLASS ---
-class LeagueBot(discord.Client):
+class LeagueTree(app_commands.CommandTree):
+    # Every slash command runs inside a trace (see tracing.py). It starts
+    # here, in the command's own task, and ends in on_app_command_completion
+    # or the tree error handler.
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.type is discord.InteractionType.application_command:
+            name = interaction.command.qualified_name if interaction.command else "unknown"
+            interaction.extras["trace"] = tracing.start(name)
+            if interaction.guild:
+                member_cache.start(interaction.guild)  # no-op once started
+        return True
+
+class LeagueBot(discord.AutoShardedClient):
     def __init__(self):
-        super().__init__(intents=discord.Intents.all())
-        self.tree = app_commands.CommandTree(self)
+        # Intents and member caching follow MEMORY_MODE (see members.py),
+        # shards SHARD_COUNT / SHARD_IDS (see sharding.py)
+        super().__init__(**client_options(), **sharding.client_options())
+        self.tree = LeagueTree(self)
+        self.http_session = None
+        self.offer_sweeper = None
+        self.member_trimmer = None
+        self.offer_relay = None
+        self.web = None
+        self.loaded = False
+
+    async def setup_hook(self):
+        self.http_session = make_http_session()
+        # Health server comes up while the database opens (and migrates)
+        self.web, _ = await asyncio.gather(keep_alive(self, db), asyncio.to_thread(db.open))
+        await db.start()
+        await asyncio.gather(configs.load_all(), teams.load_all(), self.sync_commands())
+        self.add_dynamic_items(OfferButton)
+        self.offer_sweeper = self.loop.create_task(self.sweep_offers())
+        self.member_trimmer = self.loop.create_task(self.trim_members())
+        if self.shard_ids is not None:
+            # Other processes run the remaining shards
+            self.offer_relay = self.loop.create_task(self.relay_offer_actions())
+        # Font download, Pillow and the render pool load in the background
+        self.loop.create_task(self.warm_cards())
+        self.loaded = True
+
+    async def warm_cards(self):
+        try:
+            await load_cards()
+            from fonts import ensure_font
+            await ensure_font(self.http_session)
+        except Exception as e:
+            print(f"System: Card renderer warm-up failed. Error: {e}")
+
+    def command_hash(self):
+        # Everything Discord gets from a sync, so an unchanged hash means
+        # there is nothing to send
+        payload = [cmd.to_dict(self.tree) for cmd in self.tree.get_commands()]
+        payload.append(self.application_id)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def sync_commands(self):
+        # tree.sync() is slow and heavily rate limited: only call it when the
+        # command definitions changed since the last successful sync
+        digest = self.command_hash()
+        try:
+            with open(COMMAND_HASH_FILE) as f:
+                if f.read().strip() == digest and not FORCE_SYNC:
+                    print("System: Slash commands unchanged, skipping sync.")
+                    return
+        except OSError:
+            pass
+        try:
+            await self.tree.sync()
+        except Exception as e:
+            print(f"System: Command sync failed. Error: {e}")
+            return
+        print("System: Slash commands synced.")
+        try:
+            with open(COMMAND_HASH_FILE, "w") as f:
+                f.write(digest)
+        except OSError as e:
+            print(f"System: Could not save command hash. Error: {e}")
+
+    async def sweep_offers(self):
+        while True:
+            try:
+                expired = await db.delete_expired_offers(time.time())
+                if expired:
+                    print(f"System: Expired {expired} transfer offers.")
+                await db.delete_stale_offer_actions(time.time() - OFFER_RELAY_TTL)
+            except Exception as e:
+                print(f"System: Offer sweep failed. Error: {e}")
+            await asyncio.sleep(OFFER_SWEEP_INTERVAL)
+
+    def owns(self, guild_id):
+        return sharding.owns(guild_id, self.shard_count, self.shard_ids)
+
+    async def relay_offer_actions(self):
+        while True:
+            try:
+                rows = await db.take_offer_actions(self.shard_count, self.shard_ids)
+                await asyncio.gather(*(
+                    (accept_offer if row[2] == "accept" else decline_offer)(RelayedInteraction(row), row[0])
+                    for row in rows))
+            except Exception as e:
+                print(f"System: Offer relay failed. Error: {e}")
+            await asyncio.sleep(OFFER_RELAY_INTERVAL)
+
+    async def trim_members(self):
+        while True:
+            await asyncio.sleep(MEMBER_TRIM_INTERVAL)
+            try:
+                dropped = 0
+                for guild in self.guilds:
+                    dropped += await member_cache.prune(guild)
+                if dropped:
+                    print(f"System: Dropped {dropped} non-league members from the cache.")
+            except Exception as e:
+                print(f"System: Member cache trim failed. Error: {e}")
+
+    async def on_guild_join(self, guild):
+        member_cache.start(guild)
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        tracing.finish(interaction.extras.get("trace"), "ok")
 
     async def on_ready(self):
-        await self.tree.sync()
         print(f"✅ LOGGED IN AS: {self.user}")
+        # Rosters load in the background, every guild at once; a command
+        # only waits for its own guild's first load
+        for guild in self.guilds:
+            member_cache.start(guild)
+        self.loop.create_task(self.claim_legacy())
+
+    async def claim_legacy(self):
+        try:
+            await claim_legacy_rows(self.guilds)
+        except Exception as e:
+            print(f"System: Claiming legacy rows failed. Error: {e}")
+
+    async def close(self):
+        await delivery.drain()
+        await super().close()
+        if self.http_session:
+            await self.http_session.close()
+        if self.offer_sweeper:
+            self.offer_sweeper.cancel()
+        if self.member_trimmer:
+            self.member_trimmer.cancel()
+        if self.offer_relay:
+            self.offer_relay.cancel()
+        if self.web:
+            await self.web.cleanup()
+        await db.stop()  # flushes queued stat / free agent writes
+        if renderer:
+            renderer.close()
+
+async def claim_legacy_rows(guilds):
+    # Rows the multi-guild migration couldn't assign (guild_id 0) go to the
+    # guild that has the role / member. Each guild is checked once: listing
+    # its members is a full chunk in lean mode.
+    if not await db.has_legacy_rows():
+        return
+    claimed = 0
+    unclaimed = set(await db.unclaimed_guilds([guild.id for guild in guilds]))
+    for guild in guilds:
+        if guild.id in unclaimed:
+            claimed += await db.claim_legacy_rows(guild.id, [r.id for r in guild.roles], await member_cache.all_ids(guild))
+            boards.invalidate(guild.id)
+    if claimed:
+        await teams.load_all()
+        print(f"System: Assigned {claimed} legacy teams / players to their guilds.")
 
 client = LeagueBot()
 
 # --- COMMANDS ---
+REGION_CHOICES = [app_commands.Choice(name="Asia", value="ASIA"), app_commands.Choice(name="Europe", value="EU"), app_commands.Choice(name="NA", value="NA"), app_commands.Choice(name="SA", value="SA")]
+POSITION_CHOICES = [app_commands.Choice(name="ST", value="ST"), app_commands.Choice(name="MF", value="MF"), app_commands.Choice(name="DF", value="DF"), app_commands.Choice(name="GK", value="GK")]
+
 @client.tree.command(name="leave_other_servers", description="[OWNER ONLY] Makes the bot leave all other servers.")
 async def leave_other_servers(interaction: discord.Interaction):
     # SECURITY: Replace this number with your actual Discord User ID!
@@ -431,7 +943,8 @@ async def help_command(interaction: discord.Interaction):
     embed1.add_field(name="/looking_for_team", value="Post yourself as a Free Agent", inline=False)
     embed1.add_field(name="/demand", value="Leave your current team (Uses Demand Limit)", inline=False)
     embed1.add_field(name="/team_view [role]", value="View a team's roster", inline=False)
-    embed1.add_field(name="/free_agents", value="View available players", inline=False)
+    embed1.add_field(name="/free_agents [region] [position]", value="View available players", inline=False)
+    embed1.add_field(name="/history player|team", value="Browse past signings, transfers, releases and demands", inline=False)
 
     embed2 = discord.Embed(title="Help - Manager Commands (Page 2/3)", color=discord.Color.green())
     embed2.add_field(name="/sign [player]", value="Sign a player to your team", inline=False)
@@ -446,19 +959,22 @@ async def help_command(interaction: discord.Interaction):
     embed3.add_field(name="/setup_team", value="Register a new team", inline=False)
     embed3.add_field(name="/team_delete", value="Delete a team", inline=False)
     embed3.add_field(name="/window", value="Open/Close transfer window", inline=False)
+    embed3.add_field(name="/card_format", value="Set transaction card image format", inline=False)
     embed3.add_field(name="/reset_config", value="Wipe server configuration", inline=False)
     embed3.add_field(name="/transfer_list", value="View top transfers leaderboard", inline=False)
+    embed3.add_field(name="/leaderboard [board]", value="Transfers, demands or most active teams", inline=False)
+    embed3.add_field(name="/recompute_stats", value="Rebuild counts from the transaction history", inline=False)
 
     view = HelpView([embed1, embed2, embed3])
     await interaction.response.send_message(embed=embed1, view=view, ephemeral=True)
 
 @client.tree.command(name="tm_transfer", description="Transfer Team Ownership to another player")
 async def tm_transfer(interaction: discord.Interaction, player: discord.Member):
-    g_config = get_global_config(interaction.guild.id)
+    g_config = await configs.get(interaction.guild.id)
     if not g_config:
         return await interaction.response.send_message("❌ Config not set.", ephemeral=True)
 
-    mgr_role_id = g_config[1]
+    mgr_role_id = g_config.manager_role_id
     mgr_role = interaction.guild.get_role(mgr_role_id)
 
     if not mgr_role:
@@ -476,8 +992,8 @@ async def tm_transfer(interaction: discord.Interaction, player: discord.Member):
         return await interaction.response.send_message("❌ That player is not on your team.", ephemeral=True)
 
     try:
-        await interaction.user.remove_roles(mgr_role)
-        await player.add_roles(mgr_role)
+        await edit_roles(interaction.user, remove=[mgr_role])
+        await edit_roles(player, add=[mgr_role])
         await interaction.response.send_message(f"✅ **Ownership Transferred!**\n{interaction.user.mention} ➝ {player.mention}\n{player.mention} is now the Manager of **{team_role.name}**.")
     except Exception as e:
         await interaction.response.send_message(f"❌ Role Error: {e}", ephemeral=True)
@@ -495,32 +1011,34 @@ async def reset_config(interaction: discord.Interaction):
 async def setup_global(interaction: discord.Interaction, manager_role: discord.Role, asst_role: discord.Role, free_agent_role: discord.Role, channel: discord.TextChannel, demand_limit: int = 3):
     if not is_staff(interaction):
         return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
-    current_config = get_global_config(interaction.guild.id)
-    window_state = 1
-    if current_config and len(current_config) > 5:
-        window_state = current_config[5]
-
-    c.execute("INSERT OR REPLACE INTO global_config VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (interaction.guild.id, manager_role.id, asst_role.id, channel.id, free_agent_role.id, window_state, demand_limit))
-    conn.commit()
+    current_config = await configs.get(interaction.guild.id)
+    new_config = GuildConfig(interaction.guild.id, manager_role.id, asst_role.id, channel.id, free_agent_role.id, 1, demand_limit)
+    if current_config:
+        new_config.window_open = current_config.window_open
+        new_config.card_format = current_config.card_format
+        new_config.card_quality = current_config.card_quality
+
+    await configs.save(new_config)
+    member_cache.reload(interaction.guild)
     await interaction.response.send_message(f"✅ **Config Saved!** (Demand Limit: {demand_limit})", ephemeral=True)
 
 @client.tree.command(name="setup_team", description="Register a Team Role")
 async def setup_team(interaction: discord.Interaction, team_role: discord.Role, logo: str, roster_limit: int = 20):
     if not is_staff(interaction):
         return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
-    existing = get_team_data(team_role.id)
+    existing = teams.get(team_role.id)
     trans_img = existing[3] if existing and len(existing) > 3 else None
-    c.execute("INSERT OR REPLACE INTO teams VALUES (?, ?, ?, ?)", (team_role.id, logo, roster_limit, trans_img))
-    conn.commit()
+    await teams.save(interaction.guild.id, team_role.id, logo, roster_limit, trans_img)
+    if not existing:
+        member_cache.reload(interaction.guild)
     await interaction.response.send_message(f"✅ **{team_role.name}** registered!", ephemeral=True)
 
 @client.tree.command(name="team_delete", description="Unregister a team")
 async def team_delete(interaction: discord.Interaction, team_role: discord.Role):
     if not is_staff(interaction):
         return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
-    c.execute("DELETE FROM teams WHERE team_role_id = ?", (team_role.id,))
-    conn.commit()
+    await teams.delete(team_role.id)
+    await backgrounds.invalidate_team(team_role.id)
     await interaction.response.send_message(f"🗑️ **{team_role.name}** removed.", ephemeral=True)
 
 @client.tree.command(name="window", description="Open/Close Window")
@@ -528,21 +1046,32 @@ async def team_delete(interaction: discord.Interaction, team_role: discord.Role)
 async def window(interaction: discord.Interaction, status: int):
     if not is_staff(interaction):
         return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
-    c.execute("UPDATE global_config SET window_open = ? WHERE guild_id = ?", (status, interaction.guild.id))
-    conn.commit()
+    await configs.set_window(interaction.guild.id, status)
     msg = "✅ **Transfer Window OPEN!**" if status == 1 else "❌ **Transfer Window CLOSED!**"
     await interaction.response.send_message(msg)
-    conf = get_global_config(interaction.guild.id)
-    if conf and conf[3]:
-        chan = interaction.guild.get_channel(conf[3])
+    conf = await configs.get(interaction.guild.id)
+    if conf and conf.contract_channel_id:
+        chan = interaction.guild.get_channel(conf.contract_channel_id)
         if chan:
-            await chan.send(msg)
+            delivery.channel(chan, merge_key="window", content=msg)
+
+@client.tree.command(name="card_format", description="Set transaction card image format (Admin)")
+@app_commands.choices(card_format=[app_commands.Choice(name="PNG (default)", value="png"), app_commands.Choice(name="Optimized PNG", value="png_optimized"),
+                                   app_commands.Choice(name="WebP", value="webp"), app_commands.Choice(name="JPEG", value="jpeg"),
+                                   app_commands.Choice(name="Auto (smallest that fits)", value="auto")])
+async def card_format(interaction: discord.Interaction, card_format: str, quality: app_commands.Range[int, 1, 100] = 85):
+    if not is_staff(interaction):
+        return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
+    if not await configs.get(interaction.guild.id):
+        return await interaction.response.send_message("❌ Config not set. Run `/setup_global` first.", ephemeral=True)
+    await configs.set_card_format(interaction.guild.id, card_format, quality)
+    await interaction.response.send_message(f"✅ **Card Format:** {card_format} (Quality: {quality})", ephemeral=True)
 
 @client.tree.command(name="decorate_transactions", description="Set custom contract background (Upload Image OR Link)")
 async def decorate_transactions(interaction: discord.Interaction, image_file: discord.Attachment = None, url: str = None):
-    g_config = get_global_config(interaction.guild.id)
+    g_config = await configs.get(interaction.guild.id)
     user_roles = [r.id for r in interaction.user.roles]
-    if (g_config[1] not in user_roles) and (g_config[2] not in user_roles) and not interaction.user.guild_permissions.administrator:
+    if (g_config.manager_role_id not in user_roles) and (g_config.asst_role_id not in user_roles) and not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Managers or Admins only.", ephemeral=True)
 
     team_info = find_user_team(interaction.user)
@@ -552,8 +1081,8 @@ async def decorate_transactions(interaction: discord.Interaction, image_file: di
 
     final_url = None
     if url and url.lower() in ["reset", "none", "remove"]:
-        c.execute("UPDATE teams SET transaction_image = NULL WHERE team_role_id = ?", (team_role.id,))
-        conn.commit()
+        await teams.set_image(team_role.id, None)
+        await backgrounds.invalidate_team(team_role.id)
         return await interaction.response.send_message(f"✅ **{team_role.name}** reverted to Proxima Default.")
 
     if image_file:
@@ -567,8 +1096,8 @@ async def decorate_transactions(interaction: discord.Interaction, image_file: di
     else:
         return await interaction.response.send_message("❌ Provide an **Image File** OR a **URL**.", ephemeral=True)
 
-    c.execute("UPDATE teams SET transaction_image = ? WHERE team_role_id = ?", (final_url, team_role.id))
-    conn.commit()
+    await teams.set_image(team_role.id, final_url)
+    await backgrounds.invalidate_team(team_role.id)
     embed = discord.Embed(title="Background Updated", description="Your future signings will look like this:", color=discord.Color.green())
     embed.set_image(url=final_url)
     await interaction.response.send_message(f"✅ **{team_role.name}** custom background set!", embed=embed, ephemeral=True)
@@ -576,13 +1105,14 @@ async def decorate_transactions(interaction: discord.Interaction, image_file: di
 @client.tree.command(name="sign", description="Sign a player to YOUR team")
 async def sign(interaction: discord.Interaction, player: discord.Member):
     await interaction.response.defer()
+    await roster_ready(interaction)
 
-    if not is_window_open(interaction.guild.id):
+    if not await is_window_open(interaction.guild.id):
         return await interaction.followup.send("❌ **Window Closed.**")
 
-    g_config = get_global_config(interaction.guild.id)
+    g_config = await configs.get(interaction.guild.id)
     user_roles = [r.id for r in interaction.user.roles]
-    if (g_config[1] not in user_roles) and (g_config[2] not in user_roles):
+    if (g_config.manager_role_id not in user_roles) and (g_config.asst_role_id not in user_roles):
         return await interaction.followup.send("❌ Not Authorized.")
 
     team_info = find_user_team(interaction.user)
@@ -597,16 +1127,18 @@ async def sign(interaction: discord.Interaction, player: discord.Member):
     if len(team_role.members) >= limit:
         return await interaction.followup.send("❌ Roster Full!")
 
-    await player.add_roles(team_role)
-    await cleanup_free_agent(interaction.guild, player)
-    update_stat(player.id, "transfer")
+    fa_role = await cleanup_free_agent(interaction.guild, player)
+    await edit_roles(player, add=[team_role], remove=[fa_role])
+    await boards.update_stat(interaction.guild.id, player.id, "transfer")
+    await boards.team_moved(interaction.guild.id, team_role.id)
+    await db.record_transaction(interaction.guild.id, "sign", player.id, None, team_role.id, interaction.user.id)
 
     desc = f"The {team_role.mention} have **signed** {player.mention}"
     embed = create_transaction_embed(interaction.guild, f"{team_role.name} Transaction", desc, discord.Color.blue(), team_role, logo, interaction.user, len(team_role.members), limit)
 
     try:
-        file = await generate_transaction_card(player, team_role.name, team_role.color, "OFFICIAL SIGNING", custom_bg)
-        embed.set_image(url="attachment://transaction.png")
+        file = await generate_transaction_card(player, team_role.name, team_role.color, "OFFICIAL SIGNING", custom_bg, team_role.id, interaction.guild.id)
+        embed.set_image(url=f"attachment://{file.filename}")
         await send_to_channel(interaction.guild, embed, file)
     except Exception as e:
         await interaction.followup.send(f"⚠️ Signed, but image error: {e}")
@@ -617,30 +1149,36 @@ async def sign(interaction: discord.Interaction, player: discord.Member):
 
 @client.tree.command(name="release", description="Release a player")
 async def release(interaction: discord.Interaction, player: discord.Member):
-    if not is_window_open(interaction.guild.id):
-        return await interaction.response.send_message("❌ Window Closed.", ephemeral=True)
+    # Replies as soon as the player is released; the card (a cold render
+    # pool on the first one) and the posts follow
+    await interaction.response.defer(ephemeral=True)
+    if not await is_window_open(interaction.guild.id):
+        return await interaction.followup.send("❌ Window Closed.", ephemeral=True)
 
     team_info = find_user_team(interaction.user)
     if not team_info:
-        return await interaction.response.send_message("❌ No team.", ephemeral=True)
+        return await interaction.followup.send("❌ No team.", ephemeral=True)
     team_role, logo, limit, custom_bg = team_info
 
     if team_role not in player.roles:
-        return await interaction.response.send_message("⚠️ Player not on team.", ephemeral=True)
-    await player.remove_roles(team_role)
+        return await interaction.followup.send("⚠️ Player not on team.", ephemeral=True)
+    await roster_ready(interaction)
+    await edit_roles(player, remove=[team_role])
+    await boards.team_moved(interaction.guild.id, team_role.id)
+    await db.record_transaction(interaction.guild.id, "release", player.id, team_role.id, None, interaction.user.id)
 
     desc = f"The **{team_role.name}** have **released** {player.mention}"
     embed = create_transaction_embed(interaction.guild, f"{team_role.name} Transaction", desc, discord.Color.red(), team_role, logo, interaction.user, len(team_role.members), limit)
+    await interaction.followup.send("✅ Released!", ephemeral=True)
 
     try:
-        file = await generate_transaction_card(player, team_role.name, team_role.color, "OFFICIAL RELEASE", custom_bg)
-        embed.set_image(url="attachment://transaction.png")
+        file = await generate_transaction_card(player, team_role.name, team_role.color, "OFFICIAL RELEASE", custom_bg, team_role.id, interaction.guild.id)
+        embed.set_image(url=f"attachment://{file.filename}")
         await send_to_channel(interaction.guild, embed, file)
     except:
         await send_to_channel(interaction.guild, embed)
 
     await send_dm(player, content=f"⚠️ Released from **{team_role.name}**.", embed=embed)
-    await interaction.response.send_message("✅ Released!", ephemeral=True)
 
 @client.tree.command(name="demand", description="Leave your current team (Uses Demand Limit)")
 async def demand(interaction: discord.Interaction):
@@ -649,38 +1187,37 @@ async def demand(interaction: discord.Interaction):
         return await interaction.response.send_message("❌ Not in a team.", ephemeral=True)
     team_role, logo, limit, _ = team_info
 
-    g_conf = get_global_config(interaction.guild.id)
-    demand_limit = g_conf[6] if g_conf and len(g_conf) > 6 else 3
-    stats = get_player_stats(interaction.user.id)
+    g_conf = await configs.get(interaction.guild.id)
+    demand_limit = g_conf.demand_limit if g_conf else 3
+    stats = await db.get_player_stats(interaction.guild.id, interaction.user.id)
     demands_used = stats[2]
 
     if demands_used >= demand_limit:
         return await interaction.response.send_message(f"🚫 **Demand Limit Reached!** ({demands_used}/{demand_limit})\nYou cannot leave your team.", ephemeral=True)
+    if not await roster_ready(interaction):
+        return
 
-    await interaction.user.remove_roles(team_role)
-    update_stat(interaction.user.id, "demand")
+    fa_role = interaction.guild.get_role(g_conf.free_agent_role_id) if g_conf and g_conf.free_agent_role_id else None
+    await edit_roles(interaction.user, add=[fa_role], remove=[team_role])
+    await boards.update_stat(interaction.guild.id, interaction.user.id, "demand")
+    await boards.team_moved(interaction.guild.id, team_role.id)
+    await db.record_transaction(interaction.guild.id, "demand", interaction.user.id, team_role.id, None, interaction.user.id)
     demands_left = demand_limit - (demands_used + 1)
 
-    config = get_global_config(interaction.guild.id)
-    if config and config[4]:
-        fa_role = interaction.guild.get_role(config[4])
-        if fa_role:
-            await interaction.user.add_roles(fa_role)
-
     desc = f"{interaction.user.mention} has **Demanded Release** from the team.\n\n⚠️ **Demands Left:** {demands_left}"
     embed = create_transaction_embed(interaction.guild, "Transfer Demand", desc, discord.Color.dark_grey(), team_role, logo, None, len(team_role.members), limit)
     await send_to_channel(interaction.guild, embed)
 
-    heads, assts = get_managers_of_team(interaction.guild, team_role)
+    heads, assts = await get_managers_of_team(interaction.guild, team_role)
     for mgr in heads + assts:
         await send_dm(mgr, content=f"📢 {interaction.user.name} has left your team.")
     await interaction.response.send_message(f"👋 Left **{team_role.name}**.\nDemands remaining: {demands_left}", ephemeral=True)
 
 @client.tree.command(name="promote", description="Promote a player to Assistant Manager")
 async def promote(interaction: discord.Interaction, player: discord.Member):
-    g_config = get_global_config(interaction.guild.id)
+    g_config = await configs.get(interaction.guild.id)
     user_roles = [r.id for r in interaction.user.roles]
-    if g_config[1] not in user_roles and not interaction.user.guild_permissions.administrator:
+    if g_config.manager_role_id not in user_roles and not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Head Managers only.", ephemeral=True)
 
     team_info = find_user_team(interaction.user)
@@ -691,143 +1228,180 @@ async def promote(interaction: discord.Interaction, player: discord.Member):
     if team_role not in player.roles:
         return await interaction.response.send_message("❌ Player is not on your team.", ephemeral=True)
 
-    asst_role_id = g_config[2]
+    asst_role_id = g_config.asst_role_id
     asst_role = interaction.guild.get_role(asst_role_id)
     if not asst_role:
         return await interaction.response.send_message("❌ Assistant Role not configured.", ephemeral=True)
 
-    await player.add_roles(asst_role)
+    await edit_roles(player, add=[asst_role])
     await interaction.response.send_message(f"✅ Promoted {player.mention} to **Assistant Manager** of {team_role.name}!")
 
-@client.tree.command(name="transfer_list", description="Show top players by transfer count")
-async def transfer_list(interaction: discord.Interaction):
+async def show_leaderboard(interaction: discord.Interaction, board: str):
     if not is_staff(interaction):
         return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
 
-    c.execute("SELECT user_id, transfers FROM player_stats ORDER BY transfers DESC LIMIT 15")
-    data = c.fetchall()
+    view = LeaderboardView(interaction.guild, board)
+    embed = await view.load_page()
+    if not embed:
+        return await interaction.response.send_message("No history found.", ephemeral=True)
+    await interaction.response.send_message(embed=embed, view=view)
 
-    if not data:
-        return await interaction.response.send_message("No transfer history found.", ephemeral=True)
+@client.tree.command(name="transfer_list", description="Show top players by transfer count")
+async def transfer_list(interaction: discord.Interaction):
+    await show_leaderboard(interaction, "transfers")
+
+@client.tree.command(name="leaderboard", description="Show a leaderboard (Admin)")
+@app_commands.choices(board=[app_commands.Choice(name="Most transfers", value="transfers"),
+                             app_commands.Choice(name="Most demands", value="demands"),
+                             app_commands.Choice(name="Most active teams", value="teams")])
+async def leaderboard(interaction: discord.Interaction, board: str = "transfers"):
+    await show_leaderboard(interaction, board)
+
+history = app_commands.Group(name="history", description="Transaction history")
 
-    embed = discord.Embed(title="📊 Most Transfers", color=discord.Color.gold())
-    desc = ""
-    for idx, (uid, count) in enumerate(data, 1):
-        user = interaction.guild.get_member(uid)
-        name = user.name if user else f"Unknown ({uid})"
-        desc += f"**{idx}.** {name} — {count} Transfers\n"
+async def show_history(interaction: discord.Interaction, view):
+    embed = await view.load_page()
+    if not embed:
+        return await interaction.response.send_message("No transactions recorded.", ephemeral=True)
+    await interaction.response.send_message(embed=embed, view=view)
+
+@history.command(name="player", description="A player's signings, transfers, releases and demands")
+async def history_player(interaction: discord.Interaction, player: discord.Member):
+    await show_history(interaction, HistoryView(interaction.guild, f"📜 {player.name}", player_id=player.id))
+
+@history.command(name="team", description="Every move in or out of a team")
+async def history_team(interaction: discord.Interaction, team: discord.Role):
+    await show_history(interaction, HistoryView(interaction.guild, f"📜 {team.name}", team_id=team.id))
+
+client.tree.add_command(history)
+
+@client.tree.command(name="recompute_stats", description="Rebuild transfer/demand counts from the transaction history (Admin)")
+async def recompute_stats(interaction: discord.Interaction):
+    if not is_staff(interaction):
+        return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
 
-    embed.description = desc
-    await interaction.response.send_message(embed=embed)
+    view = RecomputeView(interaction.guild.id)
+    embed = discord.Embed(title="⚠️ Rebuild Stats", description="Transfer, demand and team activity counts will be **recalculated from the transaction history**.\n\nMoves made before the history was recorded will no longer be counted (this also resets demand limits).", color=discord.Color.dark_red())
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
 @client.tree.command(name="looking_for_team", description="Post yourself as a Free Agent")
-@app_commands.choices(region=[app_commands.Choice(name="Asia", value="ASIA"), app_commands.Choice(name="Europe", value="EU"), app_commands.Choice(name="NA", value="NA"), app_commands.Choice(name="SA", value="SA")],
-                      position=[app_commands.Choice(name="ST", value="ST"), app_commands.Choice(name="MF", value="MF"), app_commands.Choice(name="DF", value="DF"), app_commands.Choice(name="GK", value="GK")])
+@app_commands.choices(region=REGION_CHOICES, position=POSITION_CHOICES)
 async def looking_for_team(interaction: discord.Interaction, region: str, position: str, description: str):
-    c.execute("INSERT OR REPLACE INTO free_agents VALUES (?, ?, ?, ?, ?)", (interaction.user.id, region, position, description, str(datetime.datetime.now())))
-    conn.commit()
-    config = get_global_config(interaction.guild.id)
-    if config and config[4]:
-        role = interaction.guild.get_role(config[4])
+    await db.save_free_agent(interaction.guild.id, interaction.user.id, region, position, description, str(datetime.datetime.now()))
+    config = await configs.get(interaction.guild.id)
+    if config and config.free_agent_role_id:
+        role = interaction.guild.get_role(config.free_agent_role_id)
         if role:
-            await interaction.user.add_roles(role)
+            await edit_roles(interaction.user, add=[role])
     await interaction.response.send_message(f"✅ Listed as **Free Agent** ({region} - {position})!", ephemeral=True)
 
 @client.tree.command(name="free_agents", description="View available players")
-async def free_agents(interaction: discord.Interaction):
+@app_commands.choices(region=REGION_CHOICES, position=POSITION_CHOICES,
+                      sort=[app_commands.Choice(name="Newest first", value="newest"), app_commands.Choice(name="Oldest first", value="oldest")])
+async def free_agents(interaction: discord.Interaction, region: str = None, position: str = None, sort: str = "newest"):
     await interaction.response.defer()
-    c.execute("SELECT * FROM free_agents")
-    agents = c.fetchall()
-    if not agents:
+    view = FreeAgentView(interaction.guild, region, position, sort != "oldest")
+    embed = await view.load_page()
+    if not embed:
         return await interaction.followup.send("🤷‍♂️ No Free Agents currently listed.")
-    embed = discord.Embed(title="📄 Free Agency Market", color=discord.Color.teal())
-    count = 0
-    for agent in agents:
-        uid, reg, pos, desc, _ = agent
-        member = interaction.guild.get_member(uid)
-        if member:
-            embed.add_field(name=f"{pos} | {member.name} ({reg})", value=f"📝 {desc}", inline=False)
-            count += 1
-            if count >= 20:
-                embed.set_footer(text="Showing first 20 agents...")
-                break
-    await interaction.followup.send(embed=embed)
+    await interaction.followup.send(embed=embed, view=view)
 
 @client.tree.command(name="team_list", description="List teams (Admin)")
 async def team_list(interaction: discord.Interaction):
     if not is_staff(interaction):
         return await interaction.response.send_message("❌ Admin Only", ephemeral=True)
     await interaction.response.defer()
-
-    g_conf = get_global_config(interaction.guild.id)
-    mgr_id = g_conf[1] if g_conf else 0
-    asst_id = g_conf[2] if g_conf else 0
-
-    all_teams = get_all_teams()
-    if not all_teams:
+    await roster_ready(interaction)
+
+    guild = interaction.guild
+    g_conf = await configs.get(guild.id)
+    managers, assistants = staff_ids(guild, g_conf)
+
+    all_teams = teams.all(guild.id)
+    title = "🏆 Registered Teams List"
+
+    def team_fields():
+        for t_data in all_teams:
+            role_id = t_data[0]
+            logo = t_data[1]
+            team_role = guild.get_role(role_id)
+            if not team_role:
+                continue
+            header_emoji = logo if (logo and "http" not in logo) else "🛡️"
+            members = team_role.members
+            yield from split_field(f"{header_emoji} {team_role.name} ({len(members)})", format_roster_list(members, managers, assistants))
+
+    def team_pages():
+        # Built lazily: a page is only packed when someone pages to it
+        for number, page in enumerate(pack_pages(team_fields(), reserved=len(title) + 32), 1):
+            embed = discord.Embed(title=title, color=discord.Color.gold())
+            for name, value in page:
+                embed.add_field(name=name, value=value, inline=False)
+            embed.set_footer(text=f"Page {number}")
+            yield embed
+
+    view = PagedEmbedView(team_pages())
+    if not view.embeds:
         return await interaction.followup.send("❌ No teams.")
-    embed = discord.Embed(title="🏆 Registered Teams List", color=discord.Color.gold())
-    for t_data in all_teams:
-        role_id = t_data[0]
-        logo = t_data[1]
-        team_role = interaction.guild.get_role(role_id)
-        if not team_role:
-            continue
-        header_emoji = logo if (logo and "http" not in logo) else "🛡️"
-        members_formatted = format_roster_list(team_role.members, mgr_id, asst_id)
-        player_str = "\n".join(members_formatted) if members_formatted else "*No players.*"
-        embed.add_field(name=f"{header_emoji} {team_role.name} ({len(team_role.members)})", value=player_str, inline=False)
-    await interaction.followup.send(embed=embed)
+    await interaction.followup.send(embed=view.embeds[0], view=view)
 
 @client.tree.command(name="team_view", description="View a specific team's roster")
 async def team_view(interaction: discord.Interaction, team: discord.Role):
-    data = get_team_data(team.id)
+    data = teams.get(team.id)
     if not data:
         return await interaction.response.send_message("❌ Not a registered team.", ephemeral=True)
-    g_conf = get_global_config(interaction.guild.id)
-    mgr_id = g_conf[1] if g_conf else 0
-    asst_id = g_conf[2] if g_conf else 0
+    if not await roster_ready(interaction):
+        return
+    g_conf = await configs.get(interaction.guild.id)
+    managers, assistants = staff_ids(interaction.guild, g_conf)
     logo = data[1]
     header_emoji = logo if (logo and "http" not in logo) else "🛡️"
-    members_formatted = format_roster_list(team.members, mgr_id, asst_id)
+    members = team.members
+    members_formatted = format_roster_list(members, managers, assistants)
     player_str = "\n".join(members_formatted) if members_formatted else "*No players.*"
     embed = discord.Embed(title=f"{header_emoji} {team.name} Roster", color=team.color)
     if logo and "http" in logo:
         embed.set_thumbnail(url=logo)
     embed.description = player_str
-    embed.set_footer(text=f"Total: {len(team.members)}")
+    embed.set_footer(text=f"Total: {len(members)}")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @client.tree.command(name="transfer", description="Request to sign a player")
 async def transfer(interaction: discord.Interaction, player: discord.Member):
-    if not is_window_open(interaction.guild.id):
-        return await interaction.response.send_message("❌ **Window CLOSED.**", ephemeral=True)
+    # The offer DM is awaited until delivered, which can outlast the 3s
+    # interaction deadline when DMs are queued
+    await interaction.response.defer(ephemeral=True)
+    if not await is_window_open(interaction.guild.id):
+        return await interaction.followup.send("❌ **Window CLOSED.**", ephemeral=True)
     my_team_info = find_user_team(interaction.user)
     if not my_team_info:
-        return await interaction.response.send_message("❌ Not a manager.", ephemeral=True)
+        return await interaction.followup.send("❌ Not a manager.", ephemeral=True)
     my_team_role, my_logo, _, _ = my_team_info
 
     target_team_info = find_user_team(player)
     if not target_team_info:
-        return await interaction.response.send_message("⚠️ Player not on a team.", ephemeral=True)
+        return await interaction.followup.send("⚠️ Player not on a team.", ephemeral=True)
     target_team_role, _, _, _ = target_team_info
 
     if my_team_role.id == target_team_role.id:
-        return await interaction.response.send_message("⚠️ Already on your team!", ephemeral=True)
+        return await interaction.followup.send("⚠️ Already on your team!", ephemeral=True)
+    await roster_ready(interaction)
 
-    heads, assts = get_managers_of_team(interaction.guild, target_team_role)
+    heads, assts = await get_managers_of_team(interaction.guild, target_team_role)
     target_manager = heads[0] if heads else (assts[0] if assts else None)
     if not target_manager:
-        return await interaction.response.send_message(f"❌ **{target_team_role.name}** has no active Manager.", ephemeral=True)
+        return await interaction.followup.send(f"❌ **{target_team_role.name}** has no active Manager.", ephemeral=True)
 
-    view = TransferView(interaction.guild, player, target_team_role, my_team_role, interaction.user, my_logo)
+    offer_id = await db.create_offer(interaction.guild.id, player.id, target_team_role.id, my_team_role.id, interaction.user.id, my_logo, time.time() + OFFER_TTL)
+    view = offer_view(offer_id)
     dm_embed = discord.Embed(title="Transfer Offer 📝", color=discord.Color.gold())
     dm_embed.description = f"**{interaction.user.mention}** wants to buy **{player.name}**.\nDo you accept?"
 
-    if await send_dm(target_manager, embed=dm_embed, view=view):
-        await interaction.response.send_message(f"✅ **Offer Sent!** Waiting for {target_manager.mention}.", ephemeral=True)
+    if await send_dm(target_manager, embed=dm_embed, view=view, wait=True):
+        await interaction.followup.send(f"✅ **Offer Sent!** Waiting for {target_manager.mention}.", ephemeral=True)
     else:
-        await interaction.response.send_message(f"❌ Could not DM manager.", ephemeral=True)
+        await db.delete_offer(offer_id)
+        await interaction.followup.send(f"❌ Could not DM manager.", ephemeral=True)
 
 @client.tree.command(name="test_card", description="TEST: Generates a sample signing card")
 async def test_card(interaction: discord.Interaction):
@@ -836,7 +1410,7 @@ async def test_card(interaction: discord.Interaction):
         color = interaction.user.top_role.color
         if color == discord.Color.default():
             color = discord.Color.dark_grey()
-        file = await generate_transaction_card(interaction.user, "Test Team", color, "TEST CARD")
+        file = await generate_transaction_card(interaction.user, "Test Team", color, "TEST CARD", guild_id=interaction.guild.id)
         await interaction.followup.send("🖼️ **Test Image Generation:**", file=file)
     except Exception as e:
         await interaction.followup.send(f"❌ Error: {e}")
@@ -844,6 +1418,7 @@ async def test_card(interaction: discord.Interaction):
 # --- ERROR HANDLER ---
 @client.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    tracing.finish(interaction.extras.get("trace"), "error", error)
     if isinstance(error, app_commands.CommandOnCooldown):
         await interaction.response.send_message(f"⏳ **Take a breather!** Try again in {int(error.retry_after)}s.", ephemeral=True)
     elif isinstance(error, app_commands.BotMissingPermissions):
@@ -857,10 +1432,11 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
             pass
 
 # --- STARTUP ---
-print("System: Loading Proxima V17 (Auto-Font Download)...")
-if TOKEN:
-    try:
-        keep_alive()
-        client.run(TOKEN)
-    except Exception as e:
-        print(f"❌ Error: {e}")
+# Guarded so card render worker processes can import this module safely
+if __name__ == "__main__":
+    print("System: Loading Proxima V17...")
+    if TOKEN:
+        try:
+            client.run(TOKEN)
+        except Exception as e:
+            print(f"❌ Error: {e}")
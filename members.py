@@ -0,0 +1,185 @@
+import asyncio
+import os
+
+import discord
+
+# --- MEMBER CACHE ---
+# MEMORY_MODE=lean (default) asks the gateway for the guilds and members
+# intents only, skips startup chunking and keeps just the league's members
+# in the cache: holders of a team, manager, assistant or free agent role.
+# That is everything role.members is used for; anyone else is looked up
+# with a gateway member query when a command needs them, and not kept.
+#
+# MEMORY_MODE=full is the old behaviour: every intent, every member of
+# every guild chunked at startup.
+#
+# discord.py has no role-based cache policy, so the roster is filtered here
+# with Guild._add_member / _remove_member. Members the gateway tells us
+# about later (role grants, joins) are cached by the library and trimmed
+# periodically by prune().
+
+MEMORY_MODE = os.environ.get("MEMORY_MODE", "lean")
+QUERY_BATCH = 100  # user ids per gateway member query (Discord's maximum)
+
+
+def client_options(mode=MEMORY_MODE):
+    # Keyword arguments for discord.Client
+    if mode == "full":
+        return {"intents": discord.Intents.all()}
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.members = True  # member updates keep role.members current
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.from_intents(intents),
+        "chunk_guilds_at_startup": False,
+        "max_messages": None,
+    }
+
+
+def keep(member, league_roles):
+    return any(role.id in league_roles for role in member.roles)
+
+
+class MemberCache:
+    def __init__(self, configs, teams, mode=MEMORY_MODE):
+        self.configs = configs
+        self.teams = teams
+        self.lean = mode != "full"
+        self._loads = {}  # guild_id -> (guild, task); a reconnect brings new guild objects
+        self._reloads = {}  # guild_id -> task
+        self._stale = set()  # guild ids whose league roles changed since their last load
+
+        # Counters
+        self.loads = 0
+        self.adopted = 0   # league members kept from chunks
+        self.pruned = 0
+        self.queried = 0   # ids looked up on demand
+        self.missing = 0   # ... that turned out not to be in the guild
+
+    async def league_roles(self, guild_id):
+        config = await self.configs.get(guild_id)
+        roles = {team[0] for team in self.teams.all(guild_id)}
+        if config:
+            roles.update(r for r in (config.manager_role_id, config.asst_role_id, config.free_agent_role_id) if r)
+        return roles
+
+    # --- ROSTER ---
+    def start(self, guild):
+        # Begins the guild's first load in the background
+        if not self.lean:
+            return None
+        entry = self._loads.get(guild.id)
+        if entry is None or entry[0] is not guild:
+            entry = self._loads[guild.id] = (guild, asyncio.ensure_future(self._load(guild)))
+        return entry
+
+    async def load(self, guild):
+        # Caches the guild's league members once; later calls wait for that
+        # first load only, never for a reload
+        entry = self.start(guild)
+        if entry is None:
+            return
+        try:
+            await asyncio.shield(entry[1])
+        except Exception as e:
+            if self._loads.get(guild.id) is entry:
+                del self._loads[guild.id]  # try again on the next command
+            print(f"System: Could not load members of '{guild.name}'. Error: {e}")
+
+    def reload(self, guild):
+        # The set of league roles changed (team registered, /setup_global).
+        # The new roster loads in the background; commands keep using the
+        # one already cached, which only ever gains members here.
+        if not self.lean:
+            return
+        entry = self._loads.get(guild.id)
+        if entry is None or entry[0] is not guild:
+            self.start(guild)  # nothing loaded yet: the first load sees the new roles
+            return
+        self._stale.add(guild.id)
+        task = self._reloads.get(guild.id)
+        if task is None or task.done():
+            self._reloads[guild.id] = asyncio.ensure_future(self._reload(guild, entry[1]))
+
+    async def _reload(self, guild, first_load):
+        # A first load still running may have read the old roles
+        await asyncio.wait([first_load])
+        # Role changes during a reload are picked up by one more pass
+        while guild.id in self._stale:
+            self._stale.discard(guild.id)
+            try:
+                await self._load(guild)
+            except Exception as e:
+                print(f"System: Could not reload members of '{guild.name}'. Error: {e}")
+                return
+
+    async def _load(self, guild):
+        league_roles = await self.league_roles(guild.id)
+        if not league_roles:
+            return
+        # One gateway chunk request; nothing is cached until filtered below
+        self.adopt(guild, await guild.chunk(cache=False), league_roles)
+        self.loads += 1
+
+    def adopt(self, guild, members, league_roles):
+        for member in members:
+            if keep(member, league_roles) and guild.get_member(member.id) is None:
+                guild._add_member(member)
+                self.adopted += 1
+
+    async def prune(self, guild):
+        # Drops cached members the library picked up from events (joins,
+        # nickname changes) who hold no league role
+        if not self.lean:
+            return 0
+        league_roles = await self.league_roles(guild.id)
+        me = guild.me
+        drop = [m for m in guild.members if m != me and not keep(m, league_roles)]
+        for member in drop:
+            guild._remove_member(member)
+        self.pruned += len(drop)
+        return len(drop)
+
+    # --- LOOKUPS ---
+    async def resolve(self, guild, user_ids):
+        # {user_id: Member} for the ids still in the guild
+        found = {}
+        missing = []
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if member is not None:
+                found[user_id] = member
+            else:
+                missing.append(user_id)
+        if not self.lean or not missing:
+            return found
+        # Not a league member, so not cached: ask the gateway
+        fetched = 0
+        for i in range(0, len(missing), QUERY_BATCH):
+            for member in await guild.query_members(user_ids=missing[i:i + QUERY_BATCH], limit=QUERY_BATCH, cache=False):
+                found[member.id] = member
+                fetched += 1
+        self.queried += len(missing)
+        self.missing += len(missing) - fetched
+        return found
+
+    async def get(self, guild, user_id):
+        return (await self.resolve(guild, [user_id])).get(user_id)
+
+    async def all_ids(self, guild):
+        # Every member id, cached or not
+        if not self.lean:
+            return [m.id for m in guild.members]
+        return [m.id for m in await guild.chunk(cache=False)]
+
+    def snapshot(self):
+        return {
+            "lean": self.lean,
+            "guilds_loaded": len(self._loads),
+            "loads": self.loads,
+            "adopted": self.adopted,
+            "pruned": self.pruned,
+            "queried": self.queried,
+            "missing": self.missing,
+        }
@@ -0,0 +1,116 @@
+import bisect
+import time
+
+# --- METRICS ---
+# Just enough of the Prometheus text format for /metrics: labelled
+# histograms for timings, plus gauges read from the snapshot() counters the
+# other modules already keep. No client library, nothing runs until scraped.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "proxima"
+
+_histograms = []
+_collectors = []  # (name, snapshot fn, label name or None)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts, sum, count]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def snapshot(self):
+        # {label values: (count, sum)} for reports
+        return {values: (series[2], series[1]) for values, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self._series.items()):
+            labels = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_braces(labels + [_le(bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_braces(labels + [_le('+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_braces(labels)} {total}")
+            lines.append(f"{self.name}_count{_braces(labels)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _le(bound):
+    return 'le="%s"' % bound
+
+
+def _braces(labels):
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+# --- REGISTRY ---
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    h = Histogram(name, help_text, labels, buckets)
+    _histograms.append(h)
+    return h
+
+
+def collect(name, snapshot, label=None):
+    # Every numeric value in snapshot() becomes a gauge <prefix>_<name>_<key>.
+    # With a label, snapshot() returns {label value: {key: value}} instead,
+    # and each key is one gauge with a series per label value.
+    _collectors.append((name, snapshot, label))
+
+
+def render():
+    lines = []
+    for h in _histograms:
+        lines.extend(h.render())
+    for name, snapshot, label in _collectors:
+        try:
+            values = snapshot()
+        except Exception:
+            continue  # a broken collector shouldn't take the endpoint down
+        gauges = {}  # metric -> sample lines, so each gets one TYPE line
+        for label_value, group in (values.items() if label else [(None, values)]):
+            labels = _braces([f'{label}="{_escape(label_value)}"']) if label else ""
+            for key, value in group.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"{PREFIX}_{name}_{key}"
+                gauges.setdefault(metric, []).append(f"{metric}{labels} {value}")
+        for metric, samples in gauges.items():
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
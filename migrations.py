@@ -0,0 +1,251 @@
+import time
+
+# --- SCHEMA MIGRATIONS ---
+# The schema version lives in PRAGMA user_version. On startup only the
+# migrations newer than that run, all inside ONE transaction, so a crash
+# mid-upgrade leaves the old schema intact. An up-to-date database costs a
+# single PRAGMA read.
+#
+# To change the schema, append a function to MIGRATIONS. Never edit one that
+# has shipped; its number is already recorded in people's databases.
+
+CHUNK_ROWS = 20000
+
+
+# --- HELPERS ---
+
+def table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_column(conn, table, column, definition):
+    if column not in columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_index(conn, name, table, spec, progress):
+    progress(f"creating index {name}")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({spec})")
+
+
+def rebuild_table(conn, table, create_sql, select_sql, params, progress):
+    # For changes ALTER TABLE can't do (primary keys, column order). Rows are
+    # copied in rowid order in chunks so progress can be reported on big tables.
+    # `select_sql` is the column list selected from the old table.
+    old = f"{table}_old"
+    conn.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    conn.execute(create_sql)
+    total = conn.execute(f"SELECT COUNT(*) FROM {old}").fetchone()[0]
+    done, last = 0, None
+    while done < total:
+        where, args = ("WHERE rowid > ?", (last,)) if last is not None else ("", ())
+        last_row = conn.execute(f"SELECT MAX(rowid) FROM (SELECT rowid FROM {old} {where} ORDER BY rowid LIMIT ?)",
+                                args + (CHUNK_ROWS,)).fetchone()[0]
+        if last_row is None:
+            break
+        bound = f"{where + ' AND' if where else 'WHERE'} rowid <= ?"
+        cur = conn.execute(f"INSERT INTO {table} SELECT {select_sql} FROM {old} {bound}", tuple(params) + args + (last_row,))
+        done += cur.rowcount
+        last = last_row
+        progress(f"{table}: {done}/{total} rows")
+    conn.execute(f"DROP TABLE {old}")
+
+
+# --- MIGRATIONS ---
+
+def m001_guild_scoped_schema(conn, progress):
+    # Brings any older layout (including the pre-versioning ALTER TABLE era)
+    # up to the multi-guild schema.
+    conn.execute("""CREATE TABLE IF NOT EXISTS global_config (
+                    guild_id INTEGER PRIMARY KEY,
+                    manager_role_id INTEGER,
+                    asst_role_id INTEGER,
+                    contract_channel_id INTEGER
+                    )""")
+    add_column(conn, "global_config", "free_agent_role_id", "INTEGER")
+    add_column(conn, "global_config", "window_open", "INTEGER DEFAULT 1")
+    add_column(conn, "global_config", "demand_limit", "INTEGER DEFAULT 3")
+    add_column(conn, "global_config", "card_format", "TEXT DEFAULT 'png'")
+    add_column(conn, "global_config", "card_quality", "INTEGER DEFAULT 85")
+
+    # Backfill owner for old single-guild rows. With several guilds it can't
+    # be known offline: rows get guild_id 0 and are claimed at startup.
+    guilds = conn.execute("SELECT guild_id FROM global_config").fetchall()
+    owner = guilds[0][0] if len(guilds) == 1 else 0
+
+    teams_sql = """CREATE TABLE teams (
+                   team_role_id INTEGER NOT NULL,
+                   logo TEXT,
+                   roster_limit INTEGER,
+                   transaction_image TEXT,
+                   guild_id INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (guild_id, team_role_id)
+                   )"""
+    if not table_exists(conn, "teams"):
+        conn.execute(teams_sql)
+    elif "guild_id" not in columns(conn, "teams"):
+        add_column(conn, "teams", "transaction_image", "TEXT")
+        rebuild_table(conn, "teams", teams_sql, "team_role_id, logo, roster_limit, transaction_image, ?", (owner,), progress)
+
+    free_agents_sql = """CREATE TABLE free_agents (
+                         user_id INTEGER NOT NULL,
+                         region TEXT,
+                         position TEXT,
+                         description TEXT,
+                         timestamp TEXT,
+                         guild_id INTEGER NOT NULL DEFAULT 0,
+                         PRIMARY KEY (guild_id, user_id)
+                         )"""
+    if not table_exists(conn, "free_agents"):
+        conn.execute(free_agents_sql)
+    elif "guild_id" not in columns(conn, "free_agents"):
+        rebuild_table(conn, "free_agents", free_agents_sql, "user_id, region, position, description, timestamp, ?", (owner,), progress)
+
+    player_stats_sql = """CREATE TABLE player_stats (
+                          user_id INTEGER NOT NULL,
+                          transfers INTEGER DEFAULT 0,
+                          demands INTEGER DEFAULT 0,
+                          guild_id INTEGER NOT NULL DEFAULT 0,
+                          PRIMARY KEY (guild_id, user_id)
+                          )"""
+    if not table_exists(conn, "player_stats"):
+        conn.execute(player_stats_sql)
+    elif "guild_id" not in columns(conn, "player_stats"):
+        rebuild_table(conn, "player_stats", player_stats_sql, "user_id, transfers, demands, ?", (owner,), progress)
+
+    # Role ids are globally unique, so team lookups by role stay cheap
+    create_index(conn, "idx_teams_role", "teams", "team_role_id", progress)
+    # Covering indexes for the leaderboards
+    create_index(conn, "idx_stats_transfers", "player_stats", "guild_id, transfers DESC, user_id", progress)
+    create_index(conn, "idx_stats_demands", "player_stats", "guild_id, demands DESC, user_id", progress)
+
+    # Guilds whose legacy (guild_id 0) rows have been claimed, so startup
+    # checks a guild's roles and members for that only once
+    conn.execute("""CREATE TABLE IF NOT EXISTS legacy_claims (
+                    guild_id INTEGER PRIMARY KEY,
+                    claimed_at REAL NOT NULL
+                    )""")
+
+
+def m002_free_agent_indexes(conn, progress):
+    # Keyset pagination for /free_agents: filtered by region/position, or
+    # unfiltered, both ordered by listing time
+    create_index(conn, "idx_fa_filter", "free_agents", "guild_id, region, position, timestamp, user_id", progress)
+    create_index(conn, "idx_fa_recent", "free_agents", "guild_id, timestamp, user_id", progress)
+
+
+def m003_team_stats(conn, progress):
+    # Per-team transaction counter behind the "most active teams" board
+    conn.execute("""CREATE TABLE IF NOT EXISTS team_stats (
+                    team_role_id INTEGER NOT NULL,
+                    moves INTEGER DEFAULT 0,
+                    guild_id INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (guild_id, team_role_id)
+                    )""")
+    create_index(conn, "idx_team_moves", "team_stats", "guild_id, moves DESC, team_role_id", progress)
+
+
+def m004_transfer_offers(conn, progress):
+    # Pending /transfer offers live here instead of in 24h in-memory views
+    conn.execute("""CREATE TABLE IF NOT EXISTS transfer_offers (
+                    offer_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    player_id INTEGER NOT NULL,
+                    from_team_id INTEGER NOT NULL,
+                    to_team_id INTEGER NOT NULL,
+                    manager_id INTEGER NOT NULL,
+                    logo TEXT,
+                    expires_at REAL NOT NULL
+                    )""")
+    create_index(conn, "idx_offers_expiry", "transfer_offers", "expires_at", progress)
+
+
+def m005_transactions(conn, progress):
+    # Append-only ledger of signings, releases, transfers and demands
+    conn.execute("""CREATE TABLE IF NOT EXISTS transactions (
+                    tx_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    player_id INTEGER NOT NULL,
+                    from_team_id INTEGER,
+                    to_team_id INTEGER,
+                    actor_id INTEGER,
+                    created_at REAL NOT NULL
+                    )""")
+    # Newest-first history per player and per team (either side of a move)
+    create_index(conn, "idx_tx_player", "transactions", "guild_id, player_id, tx_id", progress)
+    create_index(conn, "idx_tx_from_team", "transactions", "guild_id, from_team_id, tx_id", progress)
+    create_index(conn, "idx_tx_to_team", "transactions", "guild_id, to_team_id, tx_id", progress)
+
+
+def m006_offer_actions(conn, progress):
+    # Offer button clicks handed from the process that got them (DMs land
+    # on shard 0) to the one that owns the offer's guild
+    conn.execute("""CREATE TABLE IF NOT EXISTS offer_actions (
+                    offer_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    action TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    token TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                    )""")
+
+
+MIGRATIONS = [
+    (1, m001_guild_scoped_schema),
+    (2, m002_free_agent_indexes),
+    (3, m003_team_stats),
+    (4, m004_transfer_offers),
+    (5, m005_transactions),
+    (6, m006_offer_actions),
+]
+
+
+# --- RUNNER ---
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS, progress=None):
+    current = schema_version(conn)
+    pending = [(v, fn) for v, fn in migrations if v > current]
+    if not pending:
+        return current
+
+    def report(message):
+        if progress:
+            progress(f"  {message}")
+
+    isolation = conn.isolation_level
+    conn.isolation_level = None  # manage the transaction ourselves
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # Another process (shard) may have migrated while we waited for the lock
+        current = schema_version(conn)
+        pending = [(v, fn) for v, fn in pending if v > current]
+        if not pending:
+            conn.execute("COMMIT")
+            return current
+        try:
+            for version, fn in pending:
+                started = time.perf_counter()
+                if progress:
+                    progress(f"System: Migrating database to v{version} ({fn.__name__})...")
+                fn(conn, report)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                if progress:
+                    progress(f"System: v{version} done in {time.perf_counter() - started:.2f}s")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = isolation
+    return pending[-1][0]
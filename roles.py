@@ -0,0 +1,52 @@
+import tracing
+
+# --- ROLE EDITS ---
+# One member.edit(roles=...) instead of a chain of add_roles/remove_roles:
+# every one of those is a separate REST call on the same member route and
+# rate limit bucket.
+
+
+class RoleEditStats:
+    def __init__(self):
+        self.edits = 0        # REST calls actually made
+        self.skipped = 0      # edits that turned out to be no-ops
+        self.calls_saved = 0  # vs. one add/remove call per changed role
+
+    def snapshot(self):
+        return {"edits": self.edits, "skipped": self.skipped, "calls_saved": self.calls_saved}
+
+
+stats = RoleEditStats()
+
+
+def final_roles(current, add=(), remove=()):
+    # Returns (roles to send, number of roles that actually change)
+    remove_ids = {r.id for r in remove if r}
+    roles = []
+    changed = 0
+    for role in current:
+        if role.is_default():
+            continue  # @everyone is implicit and can't be sent
+        if role.id in remove_ids:
+            changed += 1
+            continue
+        roles.append(role)
+    have = {r.id for r in roles}
+    for role in add:
+        if role and role.id not in have and role.id not in remove_ids:
+            roles.append(role)
+            have.add(role.id)
+            changed += 1
+    return roles, changed
+
+
+async def edit_roles(member, add=(), remove=(), reason=None):
+    roles, changed = final_roles(member.roles, add, remove)
+    if not changed:
+        stats.skipped += 1
+        return False
+    with tracing.span("roles"):
+        await member.edit(roles=roles, reason=reason)
+    stats.edits += 1
+    stats.calls_saved += changed - 1
+    return True
@@ -0,0 +1,70 @@
+import math
+import os
+from collections import Counter
+
+# --- SHARDING ---
+# Discord sends a guild's events to shard (guild_id >> 22) % shard_count.
+# One process can run every shard (the default), or several processes can
+# each take a range with SHARD_COUNT / SHARD_IDS, e.g.
+#
+#   SHARD_COUNT=4 SHARD_IDS=0-1 python main.py
+#   SHARD_COUNT=4 SHARD_IDS=2-3 python main.py
+#
+# Processes share the database, but all writes for a guild happen in the
+# process that owns it, so the per-guild caches (configs, teams,
+# leaderboards) stay correct. The one exception is DMs: their interactions
+# always arrive on shard 0. Offer buttons there get handed to the owning
+# process through the offer_actions table.
+
+
+def parse_ids(text):
+    # "0-3,6" -> [0, 1, 2, 3, 6]
+    ids = []
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        first, _, last = part.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(ids))
+
+
+SHARD_COUNT = int(os.environ["SHARD_COUNT"]) if os.environ.get("SHARD_COUNT") else None
+SHARD_IDS = parse_ids(os.environ.get("SHARD_IDS", "")) or None
+
+
+def client_options(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS):
+    # Keyword arguments for discord.AutoShardedClient; empty = Discord's
+    # recommended count, all shards in this process
+    if shard_ids is not None:
+        if shard_count is None:
+            raise ValueError("SHARD_IDS needs SHARD_COUNT")
+        if shard_ids[-1] >= shard_count:
+            raise ValueError(f"SHARD_IDS {shard_ids} out of range for SHARD_COUNT={shard_count}")
+        return {"shard_count": shard_count, "shard_ids": shard_ids}
+    if shard_count is not None:
+        return {"shard_count": shard_count}
+    return {}
+
+
+def shard_for(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count
+
+
+def owns(guild_id, shard_count, shard_ids):
+    # shard_ids None = this process runs every shard
+    if shard_ids is None or not shard_count:
+        return True
+    return shard_for(guild_id, shard_count) in shard_ids
+
+
+def report(bot):
+    # Per shard: gateway latency, whether it's connected and how many guilds
+    # it carries
+    shards = getattr(bot, "shards", None) or {}
+    guilds = Counter(guild.shard_id for guild in bot.guilds) if shards else Counter()
+    return {
+        shard_id: {
+            "connected": not info.is_closed(),
+            "latency_ms": round(info.latency * 1000, 1) if math.isfinite(info.latency) else None,
+            "guilds": guilds.get(shard_id, 0),
+        }
+        for shard_id, info in sorted(shards.items())
+    }
@@ -0,0 +1,62 @@
+import asyncio
+import itertools
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Tests import the bot's flat modules straight from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def loop():
+    # main.py's singletons (database, delivery, caches) live for the whole
+    # session, so tests that use them share one event loop
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory, loop):
+    # main.py builds its singletons at import; point the database somewhere
+    # disposable first
+    directory = tmp_path_factory.mktemp("bot")
+    os.environ["DB_FILE"] = str(directory / "bot.db")
+    import main as module
+    module.db.open(progress=None)
+    loop.run_until_complete(module.db.start())
+    module.backgrounds.directory = str(directory / "card_cache")
+    yield module
+    loop.run_until_complete(module.delivery.drain(timeout=0))
+    loop.run_until_complete(module.db.stop())
+    if module.renderer:
+        module.renderer.close()
+
+
+_guild_ids = itertools.count(1)
+
+
+@pytest.fixture
+def league(main, loop):
+    # A configured guild with a contract channel and two teams, each with a
+    # manager and a player. Ids are unique per test: main's caches persist.
+    from fakes import FakeGuild
+
+    guild = FakeGuild(next(_guild_ids))
+    base = guild.id * 1000
+    manager, assistant, free_agent = (guild.add_role(base + i, name) for i, name in enumerate(("Manager", "Assistant", "Free Agent"), 1))
+    channel = guild.add_channel(base + 4)
+    teams = [guild.add_role(base + 10 + t, f"Team {t}") for t in range(2)]
+    managers = [guild.add_member(base + 100 + t, f"manager{t}", [team, manager]) for t, team in enumerate(teams)]
+    players = [guild.add_member(base + 200 + t, f"player{t}", [team]) for t, team in enumerate(teams)]
+
+    async def setup():
+        await main.configs.save(main.GuildConfig(guild.id, manager.id, assistant.id, channel.id, free_agent.id, 1, 3))
+        for team in teams:
+            await main.teams.save(guild.id, team.id, "🛡️", 25, None)
+
+    loop.run_until_complete(setup())
+    return SimpleNamespace(guild=guild, channel=channel, teams=teams, managers=managers, players=players, free_agent=free_agent)
@@ -0,0 +1,72 @@
+import asyncio
+
+from cache import ConfigCache, GuildConfig
+
+
+class SlowConfigDB:
+    # get_global_config() hands back the row as it was when the read began,
+    # and only returns once `release` is set
+    def __init__(self):
+        self.rows = {}
+        self.release = asyncio.Event()
+        self.reads = 0
+
+    async def get_global_config(self, guild_id):
+        self.reads += 1
+        row = self.rows.get(guild_id)
+        await self.release.wait()
+        return row
+
+    async def save_global_config(self, *row):
+        self.rows[row[0]] = row
+
+    async def set_window(self, guild_id, status):
+        row = list(self.rows[guild_id])
+        row[5] = status
+        self.rows[guild_id] = tuple(row)
+
+
+def test_setup_during_a_miss_is_not_overwritten():
+    async def scenario():
+        db = SlowConfigDB()
+        configs = ConfigCache(db)
+        read = asyncio.create_task(configs.get(1))
+        await asyncio.sleep(0)
+        await configs.save(GuildConfig(1, 2, 3, 4, 5))  # /setup_global
+        db.release.set()
+        return await read, await configs.get(1), db.reads
+
+    during, after, reads = asyncio.run(scenario())
+    assert after == GuildConfig(1, 2, 3, 4, 5)
+    assert during == after
+    assert reads == 1
+
+
+def test_uncached_window_change_during_a_miss_is_not_lost():
+    async def scenario():
+        db = SlowConfigDB()
+        db.rows[1] = GuildConfig(1, 2, 3, 4, 5).to_row()
+        configs = ConfigCache(db)
+        read = asyncio.create_task(configs.get(1))
+        await asyncio.sleep(0)
+        await configs.set_window(1, 0)  # /window while the row is being read
+        db.release.set()
+        await read
+        return await configs.get(1), configs.misses
+
+    config, misses = asyncio.run(scenario())
+    assert config.window_open == 0
+    assert misses == 2  # the raced read wasn't cached
+
+
+def test_repeat_gets_hit_the_cache():
+    async def scenario():
+        db = SlowConfigDB()
+        db.release.set()
+        configs = ConfigCache(db)
+        results = [await configs.get(1) for _ in range(3)]
+        return results, configs.snapshot()
+
+    results, snapshot = asyncio.run(scenario())
+    assert results == [None, None, None]  # unconfigured guilds are cached too
+    assert (snapshot["hits"], snapshot["misses"]) == (2, 1)
@@ -0,0 +1,34 @@
+import asyncio
+
+import discord
+
+from fakes import AssetServer, FakeGuild
+
+
+def test_concurrent_misses_share_one_fetch(main, loop):
+    async def scenario():
+        assets = AssetServer(latency=0.05)
+        base_url = await assets.start()
+        main.client.http_session = main.make_http_session()
+        try:
+            await main.load_cards()
+            player = FakeGuild(1).add_member(10, "player", asset_url=base_url)
+            custom_bg = f"{base_url}/backgrounds/1.png"
+            # A burst of signings for one team and one player, all cold
+            backgrounds = [main.get_card_background(1, discord.Colour(0x3366), custom_bg) for _ in range(10)]
+            avatars = [main.get_card_avatar(player) for _ in range(10)]
+            results = await asyncio.gather(*backgrounds, *avatars)
+            cold = assets.requests
+            await main.get_card_background(1, discord.Colour(0x3366), custom_bg)
+            await main.get_card_avatar(player)
+            return results, cold, assets.requests
+        finally:
+            await main.client.http_session.close()
+            await assets.stop()
+
+    results, cold, total = loop.run_until_complete(scenario())
+    assert cold == 2  # one background, one avatar
+    assert total == 2  # and then served from the caches
+    assert results[0] is not None and all(r is results[0] for r in results[:10])
+    assert results[10] is not None and all(r is results[10] for r in results[10:])
+    assert not main._preparing
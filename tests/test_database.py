@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+from database import Database
+
+
+def run(tmp_path, scenario):
+    async def main():
+        db = Database(str(tmp_path / "test.db"))
+        db.open(progress=None)
+        await db.start()
+        try:
+            return await scenario(db)
+        finally:
+            await db.stop()
+    return asyncio.run(main())
+
+
+def test_event_loop_stays_responsive_during_a_write_burst(tmp_path):
+    async def scenario(db):
+        lag = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag.append(time.perf_counter() - started - 0.005)
+
+        # One big transaction plus hundreds of small committed writes
+        bulk = [("INSERT INTO free_agents (guild_id, user_id, region, position, description, timestamp) VALUES (1, ?, 'EU', 'MID', '', 0)", (i,)) for i in range(50_000)]
+        tick = asyncio.create_task(ticker())
+        await asyncio.sleep(0.02)
+        started = time.perf_counter()
+        await asyncio.gather(
+            db.execute_many(bulk),
+            *(db.save_team(1, 1000 + i, "L", 25, None) for i in range(300)),
+            *(db.update_stat(1, i, "transfer") for i in range(300)),
+        )
+        await db.pending.flush()
+        busy = time.perf_counter() - started
+        stop.set()
+        await tick
+        agents = (await db.fetchone("SELECT COUNT(*) FROM free_agents"))[0]
+        teams = (await db.fetchone("SELECT COUNT(*) FROM teams"))[0]
+        stats = (await db.fetchone("SELECT SUM(transfers) FROM player_stats"))[0]
+        return busy, max(lag), agents, teams, stats
+
+    busy, max_lag, agents, teams, stats = run(tmp_path, scenario)
+    assert (agents, teams, stats) == (50_000, 300, 300)
+    assert busy > 0.1  # the writes really did keep the writer thread busy
+    assert max_lag < 0.05
+
+
+def test_stats_read_overlapping_a_flush_counts_increments_once(tmp_path):
+    async def scenario(db):
+        for _ in range(5):
+            await db.update_stat(1, 42, "demand")
+        fetched, flushed = asyncio.Event(), asyncio.Event()
+        fetchone, execute_many = db.fetchone, db.execute_many
+
+        # Worst case: the read gets its row before the flush commits and
+        # looks at the queue after the flush has emptied it
+        async def slow_fetchone(*args):
+            row = await fetchone(*args)
+            if not fetched.is_set():
+                fetched.set()
+                await flushed.wait()
+            return row
+
+        async def gated_execute_many(statements):
+            await fetched.wait()
+            await execute_many(statements)
+
+        db.fetchone, db.execute_many = slow_fetchone, gated_execute_many
+
+        async def flush():
+            await db.pending.flush()
+            flushed.set()
+
+        stats, _ = await asyncio.gather(db.get_player_stats(1, 42), flush())
+        return stats
+
+    assert run(tmp_path, scenario) == (42, 0, 5)
+
+
+def test_team_moves_read_during_flush(tmp_path):
+    async def scenario(db):
+        await db.update_team_moves(1, 7, 3)
+        reads = [db.get_team_moves(1, 7) for _ in range(20)]
+        *moves, _ = await asyncio.gather(*reads, db.pending.flush())
+        return moves, await db.get_team_moves(1, 7)
+
+    moves, settled = run(tmp_path, scenario)
+    assert set(moves) == {3}
+    assert settled == 3
+
+
+def test_stats_read_sees_queued_and_flushed_increments(tmp_path):
+    async def scenario(db):
+        await db.update_stat(1, 42, "transfer")
+        await db.pending.flush()
+        await db.update_stat(1, 42, "transfer", 2)
+        return await db.get_player_stats(1, 42)
+
+    assert run(tmp_path, scenario) == (42, 3, 0)
+
+
+def test_legacy_claim_merges_conflicts_and_runs_once_per_guild(tmp_path):
+    async def scenario(db):
+        await db.execute_many([
+            ("INSERT INTO player_stats (user_id, transfers, demands, guild_id) VALUES (10, 2, 1, 0), (10, 3, 0, 1), (11, 1, 1, 0)", ()),
+            ("INSERT INTO free_agents (user_id, region, position, description, timestamp, guild_id) VALUES (10, 'EU', 'ST', 'old', 't0', 0), (10, 'NA', 'GK', 'new', 't1', 1)", ()),
+            ("INSERT INTO teams (team_role_id, logo, roster_limit, transaction_image, guild_id) VALUES (500, 'L', 25, NULL, 0), (501, 'L', 25, NULL, 0)", ()),
+            ("INSERT INTO teams (team_role_id, logo, roster_limit, transaction_image, guild_id) VALUES (500, 'mine', 30, NULL, 1)", ()),
+        ])
+        claimed = await db.claim_legacy_rows(1, [500, 501], [10, 11])
+        return (claimed,
+                await db.fetchall("SELECT user_id, transfers, demands, guild_id FROM player_stats ORDER BY user_id"),
+                await db.fetchall("SELECT user_id, description, guild_id FROM free_agents"),
+                await db.fetchall("SELECT team_role_id, logo, guild_id FROM teams ORDER BY team_role_id"),
+                await db.has_legacy_rows(),
+                await db.unclaimed_guilds([1, 2]))
+
+    claimed, stats, agents, teams, legacy_left, unclaimed = run(tmp_path, scenario)
+    assert claimed == 4  # two teams, two players
+    assert stats == [(10, 5, 1, 1), (11, 1, 1, 1)]
+    assert agents == [(10, "new", 1)]
+    assert teams == [(500, "mine", 1), (501, "L", 1)]
+    assert not legacy_left
+    assert unclaimed == [2]
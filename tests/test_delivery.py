@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from delivery import Delivery
+
+
+def http_error(status, reason="Error"):
+    # The exception discord.py raises for a failed request
+    return discord.HTTPException(SimpleNamespace(status=status, reason=reason), {"code": 0, "message": reason})
+
+
+class FakeEndpoint:
+    # Stands in for a channel / user: each send() takes the next scripted
+    # outcome (an exception to raise, or None for success)
+    def __init__(self, target_id, outcomes=()):
+        self.id = target_id
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.delivered = []
+
+    async def send(self, **kwargs):
+        self.calls += 1
+        if self.outcomes:
+            outcome = self.outcomes.pop(0)
+            if outcome is not None:
+                raise outcome
+        self.delivered.append(kwargs.get("content"))
+
+
+def fast_delivery(**kwargs):
+    options = {"channel_rate": (1000, 1.0), "dm_rate": (1000, 1.0), "backoff": 0.001, "idle_timeout": 0.1}
+    options.update(kwargs)
+    return Delivery(**options)
+
+
+def test_retries_server_errors_then_delivers():
+    async def scenario():
+        delivery = fast_delivery()
+        channel = FakeEndpoint(1, [http_error(503), asyncio.TimeoutError()])
+        ok = await delivery.channel(channel, content="signed")
+        return ok, channel, delivery
+
+    ok, channel, delivery = asyncio.run(scenario())
+    assert ok is True
+    assert channel.calls == 3
+    assert channel.delivered == ["signed"]
+    assert (delivery.sent, delivery.retries, delivery.failed) == (1, 2, 0)
+
+
+def test_gives_up_on_client_errors_and_after_max_retries():
+    async def scenario():
+        delivery = fast_delivery(max_retries=2)
+        forbidden = FakeEndpoint(1, [http_error(403, "Forbidden")])
+        down = FakeEndpoint(2, [http_error(500)] * 5)
+        results = await asyncio.gather(delivery.dm(forbidden, content="hi"), delivery.channel(down, content="post"))
+        return results, forbidden, down, delivery
+
+    results, forbidden, down, delivery = asyncio.run(scenario())
+    assert results == [False, False]
+    assert forbidden.calls == 1  # a 403 won't change on retry
+    assert down.calls == 3
+    assert (delivery.failed, delivery.retries) == (2, 2)
+
+
+def test_merges_unsent_messages_with_the_same_key():
+    async def scenario():
+        delivery = fast_delivery()
+        channel = FakeEndpoint(1)
+        first = delivery.channel(channel, merge_key="window", content="OPEN")
+        second = delivery.channel(channel, merge_key="window", content="CLOSED")
+        return await first, await second, channel, delivery
+
+    first, second, channel, delivery = asyncio.run(scenario())
+    assert (first, second) == (False, True)
+    assert channel.delivered == ["CLOSED"]
+    assert delivery.merged == 1
+
+
+def test_full_queue_drops_only_merge_keyed_messages():
+    async def scenario():
+        delivery = fast_delivery(max_queue=3)
+        channel = FakeEndpoint(1)
+        window = delivery.channel(channel, merge_key="window", content="OPEN")
+        posts = [delivery.channel(channel, content=f"transaction {i}") for i in range(10)]
+        results = await asyncio.gather(window, *posts)
+        return results, channel, delivery
+
+    results, channel, delivery = asyncio.run(scenario())
+    assert results == [False] + [True] * 10
+    assert channel.delivered == [f"transaction {i}" for i in range(10)]
+    snapshot = delivery.snapshot()
+    assert snapshot["dropped"] == 1
+    assert snapshot["dropped_window"] == 1
@@ -0,0 +1,62 @@
+import time
+
+import discord
+
+from embeds import EMBED_MAX_CHARS, EMBED_MAX_FIELDS, FIELD_NAME_MAX, FIELD_VALUE_MAX, pack_pages, split_field
+
+TITLE = "🏆 Registered Teams List"
+
+
+def team_pages(rosters):
+    # The same packing /team_list does, minus the guild lookups
+    fields = (f for name, lines in rosters for f in split_field(name, lines))
+    for number, page in enumerate(pack_pages(fields, reserved=len(TITLE) + 32), 1):
+        embed = discord.Embed(title=TITLE, color=discord.Color.gold())
+        for name, value in page:
+            embed.add_field(name=name, value=value, inline=False)
+        embed.set_footer(text=f"Page {number}")
+        yield embed
+
+
+def league(teams, members, name_len=40):
+    # Snowflake mentions with the manager tag, and long team names
+    return [(f"🛡️ {'Team ' + str(t):<{name_len}} ({members})",
+             [f"<@{10**17 + t * 1000 + m}>" + (" **(TM)**" if m == 0 else "") for m in range(members)])
+            for t in range(teams)]
+
+
+def assert_within_limits(pages):
+    for embed in pages:
+        assert len(embed.fields) <= EMBED_MAX_FIELDS
+        assert len(embed) <= EMBED_MAX_CHARS  # title + fields + footer, as Discord counts it
+        for field in embed.fields:
+            assert 0 < len(field.name) <= FIELD_NAME_MAX
+            assert 0 < len(field.value) <= FIELD_VALUE_MAX
+
+
+def test_hundred_teams_of_twenty_five_fit_every_page():
+    rosters = league(100, 25)
+    started = time.perf_counter()
+    pages = list(team_pages(rosters))
+    elapsed = time.perf_counter() - started
+
+    assert_within_limits(pages)
+    lines = [line for embed in pages for field in embed.fields for line in field.value.split("\n")]
+    assert lines == [line for _, roster in rosters for line in roster]  # nothing cut off or reordered
+    assert [embed.footer.text for embed in pages] == [f"Page {n}" for n in range(1, len(pages) + 1)]
+    assert elapsed < 0.5
+
+
+def test_oversized_rosters_continue_across_fields_and_pages():
+    # Name lengths sweep where the character budget, not the field count,
+    # closes each page
+    for name_len in range(0, 240, 9):
+        rosters = league(3, 400, name_len=name_len)
+        pages = list(team_pages(rosters))
+
+        assert_within_limits(pages)
+        assert len(pages) > 1
+        names = [field.name for embed in pages for field in embed.fields]
+        assert sum(not name.endswith("(cont.)") for name in names) == 3
+        lines = [line for embed in pages for field in embed.fields for line in field.value.split("\n")]
+        assert lines == [line for _, roster in rosters for line in roster]
@@ -0,0 +1,59 @@
+import asyncio
+import random
+import time
+
+from database import Database
+
+REGIONS = ("EU", "NA", "SA", "ASIA")
+POSITIONS = ("GK", "DEF", "MID", "ATT")
+FILTERS = [(None, None), ("EU", None), (None, "MID"), ("NA", "GK")]
+
+
+def test_keyset_pages_over_fifty_thousand_listings(tmp_path):
+    rng = random.Random(3)
+    # Three listings per timestamp, so pages have to break ties on user_id
+    listings = [(user_id, rng.choice(REGIONS), rng.choice(POSITIONS), f"listing {user_id}", 1_700_000_000 + user_id // 3)
+                for user_id in rng.sample(range(10**17, 10**17 + 10**6), 50_000)]
+
+    async def scenario():
+        db = Database(str(tmp_path / "fa.db"))
+        db.open(progress=None)
+        await db.start()
+        try:
+            for user_id, region, position, description, timestamp in listings:
+                await db.save_free_agent(1, user_id, region, position, description, timestamp)
+                await db.save_free_agent(2, user_id, region, position, description, timestamp)  # another league
+            await db.pending.flush()
+
+            results = {}
+            for region, position in FILTERS:
+                for newest in (True, False):
+                    seen, after, times = [], None, []
+                    while True:
+                        started = time.perf_counter()
+                        rows = await db.free_agent_page(1, region, position, newest, after, limit=100)
+                        times.append(time.perf_counter() - started)
+                        if not rows:
+                            break
+                        seen.extend(rows)
+                        after = (rows[-1][4], rows[-1][0])
+                    results[region, position, newest] = seen, sorted(times)
+            plans = [await db.fetchall("EXPLAIN QUERY PLAN SELECT user_id FROM free_agents WHERE guild_id = ? " + where +
+                                       " AND (timestamp, user_id) < (?, ?) ORDER BY timestamp DESC, user_id DESC LIMIT 10",
+                                       (1, *params, 0, 0))
+                     for where, params in (("", ()), ("AND region = ? AND position = ?", ("EU", "MID")))]
+            return results, plans
+        finally:
+            await db.stop()
+
+    results, plans = asyncio.run(scenario())
+    for (region, position, newest), (seen, times) in results.items():
+        expected = sorted((row for row in listings if region in (None, row[1]) and position in (None, row[2])),
+                          key=lambda row: (row[4], row[0]), reverse=newest)
+        assert [row[0] for row in seen] == [row[0] for row in expected]  # no duplicates, gaps or reordering
+        # Deep pages cost what the first does (about 1 ms); the max allows
+        # for the odd GC or checkpoint pause
+        assert times[int(len(times) * 0.95)] < 0.01 and times[-1] < 0.25, (region, position, newest)
+    for plan in plans:
+        detail = " ".join(row[-1] for row in plan)
+        assert "INDEX idx_fa_" in detail and "TEMP B-TREE" not in detail  # index range scan, no sort
@@ -0,0 +1,126 @@
+import asyncio
+import re
+import sqlite3
+from types import SimpleNamespace
+
+import aiohttp
+
+import keep_alive
+import metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"(?:,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? (-?[0-9.]+(?:e[+-]?[0-9]+)?|[+-]Inf|NaN)$')
+TYPE = re.compile(r"^# TYPE ([a-zA-Z_:][a-zA-Z0-9_:]*) (gauge|counter|histogram|summary|untyped)$")
+
+
+class FakeShard:
+    def __init__(self, latency=0.04, closed=False):
+        self.latency = latency
+        self.closed = closed
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeBot:
+    def __init__(self, shards=None, ready=True, loaded=True):
+        self.shards = shards if shards is not None else {0: FakeShard()}
+        self.guilds = [SimpleNamespace(shard_id=shard_id) for shard_id in self.shards]
+        self.ready = ready
+        self.loaded = loaded
+        self.latency = 0.04
+
+    def is_ready(self):
+        return self.ready
+
+    def is_closed(self):
+        return False
+
+
+class ProbeDB:
+    def __init__(self, up=True):
+        self.up = up
+
+    async def fetchone(self, sql, params=()):
+        if not self.up:
+            raise sqlite3.OperationalError("database is locked")
+        return (1,)
+
+
+def serve(bot, db, requests):
+    # Runs the server on an ephemeral port and fetches each path from it
+    async def scenario():
+        runner = await keep_alive.keep_alive(bot, db, host="127.0.0.1", port=0)
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        try:
+            results = {}
+            async with aiohttp.ClientSession() as session:
+                for path in requests:
+                    async with session.get(url + path) as resp:
+                        results[path] = (resp.status, resp.headers["Content-Type"], await resp.text())
+            return results
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(scenario())
+
+
+def test_probes_report_healthy_and_ready():
+    results = serve(FakeBot(), ProbeDB(), ["/", "/healthz", "/readyz"])
+    assert results["/"][0] == 200
+    assert results["/healthz"][0] == 200
+    assert '"gateway_connected": true' in results["/healthz"][2] and '"db_reachable": true' in results["/healthz"][2]
+    assert results["/readyz"][0] == 200
+
+
+def test_probes_fail_when_the_db_or_gateway_is_down():
+    assert serve(FakeBot(), ProbeDB(up=False), ["/healthz"])["/healthz"][0] == 503
+    assert serve(FakeBot(shards={0: FakeShard(), 1: FakeShard(closed=True)}), ProbeDB(), ["/healthz"])["/healthz"][0] == 503
+    results = serve(FakeBot(loaded=False), ProbeDB(), ["/readyz"])
+    assert results["/readyz"][0] == 503
+
+
+def test_metrics_use_the_prometheus_text_format(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", [])
+    monkeypatch.setattr(metrics, "_collectors", [])
+    probe = metrics.histogram("probe_seconds", "Test histogram", ("command", "stage"))
+    probe.observe(0.02, "sign", 'say "hi"\n')
+    metrics.collect("probe", lambda: {"queued": 3, "name": "skipped", "up": True})
+
+    status, content_type, body = serve(FakeBot(), ProbeDB(), ["/metrics"])["/metrics"]
+    assert status == 200
+    assert content_type == "text/plain; version=0.0.4; charset=utf-8"
+    assert body.endswith("\n")
+    typed = {}
+    for line in body.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        match = TYPE.match(line)
+        if match:
+            assert match.group(1) not in typed  # one TYPE line per metric
+            typed[match.group(1)] = match.group(2)
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name = match.group(1)
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in typed else name
+        assert family in typed, line  # samples follow their TYPE line
+    assert typed["proxima_probe_seconds"] == "histogram"
+    assert 'proxima_probe_seconds_count{command="sign",stage="say \\"hi\\"\\n"} 1' in body
+    assert "proxima_probe_queued 3" in body and "proxima_probe_name" not in body and "proxima_probe_up" not in body
+
+
+def test_metrics_export_one_labelled_gauge_per_shard_stat(main, monkeypatch):
+    bot = FakeBot(shards={0: FakeShard(0.0415), 1: FakeShard(float("inf"), closed=True), 2: FakeShard(0.05)})
+    bot.guilds += [SimpleNamespace(shard_id=2)] * 2
+    monkeypatch.setattr(main, "client", bot)  # what main's shard collector reads
+
+    body = serve(bot, ProbeDB(), ["/metrics"])["/metrics"][2]
+    lines = body.splitlines()
+    for stat, samples in {
+        "connected": ['{shard="0"} 1', '{shard="1"} 0', '{shard="2"} 1'],
+        "latency_ms": ['{shard="0"} 41.5', '{shard="2"} 50.0'],  # no sample while the latency is unknown
+        "guilds": ['{shard="0"} 1', '{shard="1"} 1', '{shard="2"} 3'],
+    }.items():
+        metric = f"proxima_shard_{stat}"
+        assert lines.count(f"# TYPE {metric} gauge") == 1
+        assert [line for line in lines if line.startswith(metric + "{")] == [metric + sample for sample in samples]
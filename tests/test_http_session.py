@@ -0,0 +1,36 @@
+import asyncio
+
+import aiohttp
+
+from fakes import AssetServer
+
+
+def test_fetches_reuse_pooled_connections(main, loop):
+    async def scenario():
+        assets = AssetServer(latency=0.01)
+        base_url = await assets.start()
+        main.client.http_session = main.make_http_session()
+        try:
+            urls = [f"{base_url}/avatars/{i}.png" for i in range(60)]
+            for url in urls[:20]:
+                assert await main.fetch_image_bytes(url)
+            sequential = len(assets.connections)
+            # A burst: more requests at once than the per-host limit
+            assert all(await asyncio.gather(*(main.fetch_image_bytes(url) for url in urls[20:])))
+            pooled = len(assets.connections)
+
+            # For contrast, a new session per fetch (the old behaviour)
+            before = len(assets.connections)
+            for url in urls[:5]:
+                async with aiohttp.ClientSession() as session, session.get(url) as resp:
+                    await resp.read()
+            return sequential, pooled, len(assets.connections) - before, assets.requests
+        finally:
+            await main.client.http_session.close()
+            await assets.stop()
+
+    sequential, pooled, unpooled, requests = loop.run_until_complete(scenario())
+    assert requests == 65
+    assert sequential == 1
+    assert pooled <= 10  # limit_per_host
+    assert unpooled == 5
@@ -0,0 +1,81 @@
+import asyncio
+
+from fakes import FakeInteraction
+from members import MemberCache
+
+
+def counting_chunks(guild):
+    chunks = []
+    chunk = guild.chunk
+
+    async def counted(cache=True):
+        chunks.append(cache)
+        return await chunk(cache)
+
+    guild.chunk = counted
+    return chunks
+
+
+def test_reload_keeps_serving_the_current_roster(main, loop, league):
+    cache = MemberCache(main.configs, main.teams, mode="lean")
+    guild = league.guild
+    guild.latency = 0.2  # gateway chunk round trip
+    chunks = counting_chunks(guild)
+
+    async def scenario():
+        await cache.load(guild)
+        # Two role changes in a row (e.g. two teams registered)
+        cache.reload(guild)
+        cache.reload(guild)
+        started = loop.time()
+        await cache.load(guild)  # what every command does
+        waited = loop.time() - started
+        await cache._reloads[guild.id]
+        return waited
+
+    waited = loop.run_until_complete(scenario())
+    assert waited < 0.05
+    assert chunks == [False, False]  # first load, then one reload for both changes
+    assert cache.loads == 2
+
+
+def test_role_change_during_a_reload_gets_another_pass(main, loop, league):
+    cache = MemberCache(main.configs, main.teams, mode="lean")
+    guild = league.guild
+    guild.latency = 0.1
+    chunks = counting_chunks(guild)
+
+    async def scenario():
+        cache.start(guild)
+        cache.reload(guild)  # while the first load is still running
+        await asyncio.sleep(0.15)
+        cache.reload(guild)  # while the reload's chunk is in flight
+        await cache._reloads[guild.id]
+
+    loop.run_until_complete(scenario())
+    assert len(chunks) == 3
+
+
+def test_commands_are_not_held_behind_the_first_roster_load(main, loop, league, monkeypatch):
+    monkeypatch.setattr(main, "ROSTER_WAIT", 0.05)
+    guild = league.guild
+    guild.latency = 0.5  # a big guild's first chunk
+    chunks = counting_chunks(guild)
+    team = league.teams[0]
+
+    async def scenario():
+        early = FakeInteraction(guild, league.managers[0])
+        started = loop.time()
+        assert await main.client.tree.interaction_check(early)
+        await main.team_view.callback(early, team)
+        early_s = loop.time() - started
+        await main.member_cache.load(guild)
+        later = FakeInteraction(guild, league.managers[0])
+        await main.team_view.callback(later, team)
+        return early_s, early.replies, later
+
+    early_s, early_replies, later = loop.run_until_complete(scenario())
+    assert early_s < 0.2
+    assert [content for _, content in early_replies] == ["⏳ Still loading this server's teams, try again in a few seconds."]
+    assert later.response.is_done() and later.replies[0][1] is None  # the roster embed
+    assert len(chunks) == 1
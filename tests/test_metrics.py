@@ -0,0 +1,34 @@
+import metrics
+
+
+def test_labelled_collector_renders_one_gauge_per_key(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", [])
+    monkeypatch.setattr(metrics, "_collectors", [])
+    metrics.collect("cache", lambda: {"hits": 3, "lean": True, "mode": "full"})
+    metrics.collect("shard", lambda: {0: {"latency_ms": 41.5, "connected": 1}, 1: {"latency_ms": None, "connected": 0}}, label="shard")
+
+    assert metrics.render().splitlines() == [
+        "# TYPE proxima_cache_hits gauge",
+        "proxima_cache_hits 3",
+        "# TYPE proxima_shard_latency_ms gauge",
+        'proxima_shard_latency_ms{shard="0"} 41.5',
+        "# TYPE proxima_shard_connected gauge",
+        'proxima_shard_connected{shard="0"} 1',
+        'proxima_shard_connected{shard="1"} 0',
+    ]
+
+
+def test_histogram_series_per_label(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", [])
+    monkeypatch.setattr(metrics, "_collectors", [])
+    h = metrics.histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, "db")
+    h.observe(0.5, "db")
+    h.observe(2.0, "render")
+
+    body = metrics.render()
+    assert 'proxima_stage_seconds_bucket{stage="db",le="0.1"} 1' in body
+    assert 'proxima_stage_seconds_bucket{stage="db",le="1.0"} 2' in body
+    assert 'proxima_stage_seconds_bucket{stage="render",le="+Inf"} 1' in body
+    assert 'proxima_stage_seconds_count{stage="render"} 1' in body
+    assert h.snapshot() == {("db",): (2, 0.55), ("render",): (1, 2.0)}
@@ -0,0 +1,141 @@
+import asyncio
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import discord
+
+from database import Database
+from fakes import FakeInteraction
+
+
+def test_ten_thousand_pending_offers(tmp_path):
+    async def scenario():
+        db = Database(str(tmp_path / "offers.db"))
+        db.open(progress=None)
+        await db.start()
+        try:
+            now = time.time()
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            # Every other offer already expired
+            ids = [await db.create_offer(1, i, 10, 11, 100, "🛡️", now + (60 if i % 2 else -60)) for i in range(10_000)]
+            create_s = time.perf_counter() - started
+            held = tracemalloc.get_traced_memory()[0] - base - sys.getsizeof(ids) - sum(sys.getsizeof(i) for i in ids)
+            tracemalloc.stop()
+
+            live, expired = ids[1::2], ids[::2]
+            started = time.perf_counter()
+            found = [await db.get_offer(i, now) for i in live[:500]]
+            gone = [await db.get_offer(i, now) for i in expired[:500]]
+            get_s = (time.perf_counter() - started) / 1000
+
+            started = time.perf_counter()
+            taken = [await db.take_offer(i, now) for i in live[:500]]
+            take_s = (time.perf_counter() - started) / 500
+            taken_twice = [await db.take_offer(i, now) for i in live[:500]]
+            await db.restore_offer(taken[0])
+            restored = await db.take_offer(live[0], now)
+
+            started = time.perf_counter()
+            swept = await db.delete_expired_offers(now)
+            sweep_s = time.perf_counter() - started
+            left = (await db.fetchone("SELECT COUNT(*) FROM transfer_offers"))[0]
+            return locals()
+        finally:
+            await db.stop()
+
+    r = asyncio.run(scenario())
+    assert all(r["found"]) and not any(r["gone"])
+    assert all(r["taken"]) and not any(r["taken_twice"])  # each offer answered once
+    assert r["restored"] == r["taken"][0]
+    assert r["swept"] == 5000
+    assert r["left"] == 5000 - 500
+    # Nothing is held in memory per pending offer; the rows live in SQLite
+    assert r["held"] / 10_000 < 64
+    assert r["create_s"] < 20
+    assert r["get_s"] < 0.005 and r["take_s"] < 0.01 and r["sweep_s"] < 1
+
+
+class OfferMessage:
+    # The DM holding the offer buttons
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, content=None, view=None):
+        self.edits.append(content)
+
+
+def make_offer(main, loop, league, monkeypatch):
+    # The second team's player, offered to the first team, answered by the
+    # second team's manager; the player is also listed as a free agent
+    monkeypatch.setattr(main.client, "get_guild", lambda guild_id: league.guild)
+    buyer, seller = league.managers
+    player = league.players[1]
+    player.roles.append(league.free_agent)
+
+    async def setup():
+        await main.db.save_free_agent(league.guild.id, player.id, "EU", "ST", "", "2024-01-01 00:00:00")
+        return await main.db.create_offer(league.guild.id, player.id, league.teams[1].id, league.teams[0].id, buyer.id, "🛡️", time.time() + 60)
+
+    offer_id = loop.run_until_complete(setup())
+    interaction = FakeInteraction(league.guild, seller)
+    interaction.message = OfferMessage()
+    return offer_id, interaction, player
+
+
+def outcome(main, loop, league, offer_id):
+    async def read():
+        offer = await main.db.get_offer(offer_id, time.time())
+        listing = await main.db.free_agent_page(league.guild.id)
+        return offer is not None, bool(listing)
+    return loop.run_until_complete(read())
+
+
+def test_rejected_role_edit_reopens_the_offer(main, loop, league, monkeypatch):
+    offer_id, interaction, player = make_offer(main, loop, league, monkeypatch)
+    roles_before = list(player.roles)
+
+    async def rejected(roles=None, reason=None):
+        raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "Missing Permissions")
+
+    player.edit = rejected
+    loop.run_until_complete(main.accept_offer(interaction, offer_id))
+
+    reopened, listed = outcome(main, loop, league, offer_id)
+    assert reopened and listed  # nothing moved, nothing lost
+    assert player.roles == roles_before
+    assert interaction.message.edits == []  # buttons stay usable
+    (_, reply), = interaction.replies
+    assert reply.startswith("❌ Error: 403 Forbidden")
+
+
+def test_failure_after_the_role_edit_closes_the_offer(main, loop, league, monkeypatch):
+    offer_id, interaction, player = make_offer(main, loop, league, monkeypatch)
+
+    async def broken(*args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(main.boards, "update_stat", broken)
+    loop.run_until_complete(main.accept_offer(interaction, offer_id))
+
+    reopened, listed = outcome(main, loop, league, offer_id)
+    assert not reopened and not listed
+    assert league.teams[0] in player.roles and league.free_agent not in player.roles
+    assert interaction.message.edits == ["⚠️ **Transfer Approved** (with errors)."]
+    (_, reply), = interaction.replies
+    assert "offer is closed" in reply
+
+
+def test_missing_player_closes_the_offer(main, loop, league, monkeypatch):
+    offer_id, interaction, player = make_offer(main, loop, league, monkeypatch)
+    league.guild.members.remove(player)
+    del league.guild._members[player.id]
+
+    loop.run_until_complete(main.accept_offer(interaction, offer_id))
+
+    reopened, _ = outcome(main, loop, league, offer_id)
+    assert not reopened
+    assert interaction.message.edits == ["❌ **Player missing.** Offer closed."]
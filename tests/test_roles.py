@@ -0,0 +1,52 @@
+import asyncio
+
+import roles
+from fakes import FakeGuild
+
+
+def setup(monkeypatch):
+    monkeypatch.setattr(roles, "stats", roles.RoleEditStats())
+    guild = FakeGuild(1)
+    team_a, team_b, free_agent, manager = (guild.add_role(10 + i, name) for i, name in enumerate(("Team A", "Team B", "Free Agent", "Manager")))
+    member = guild.add_member(100, "player", [team_a, free_agent])
+    sent = []
+    edit = member.edit
+
+    async def recording_edit(roles=None, reason=None):
+        sent.append(list(roles))
+        await edit(roles=roles, reason=reason)
+
+    member.edit = recording_edit
+    return guild, member, sent, (team_a, team_b, free_agent, manager)
+
+
+def test_transfer_is_one_edit_with_the_final_role_set(monkeypatch):
+    guild, member, sent, (team_a, team_b, free_agent, manager) = setup(monkeypatch)
+
+    changed = asyncio.run(roles.edit_roles(member, add=[team_b], remove=[team_a, free_agent]))
+
+    assert changed is True
+    assert guild.edits == 1
+    assert sent == [[team_b]]  # @everyone is never sent
+    assert member.roles == [guild.default_role, team_b]
+    assert roles.stats.snapshot() == {"edits": 1, "skipped": 0, "calls_saved": 2}
+
+
+def test_no_op_changes_make_no_call(monkeypatch):
+    guild, member, sent, (team_a, team_b, free_agent, manager) = setup(monkeypatch)
+
+    # Adding a held role, removing one not held, and an absent free agent role
+    changed = asyncio.run(roles.edit_roles(member, add=[team_a, None], remove=[manager, None]))
+
+    assert changed is False
+    assert guild.edits == 0 and sent == []
+    assert roles.stats.snapshot() == {"edits": 0, "skipped": 1, "calls_saved": 0}
+
+
+def test_final_roles_keeps_order_and_lets_remove_win(monkeypatch):
+    guild, member, _, (team_a, team_b, free_agent, manager) = setup(monkeypatch)
+
+    final, changed = roles.final_roles(member.roles, add=[manager, team_b, manager], remove=[team_b, free_agent])
+
+    assert final == [team_a, manager]
+    assert changed == 2  # free agent off, manager on; team B both added and removed
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import sharding
+from database import Database
+
+
+def snowflake(shard_id, shard_count, rng):
+    # A guild id Discord would route to shard_id
+    high = rng.randrange(1 << 30, 1 << 40)
+    high += (shard_id - high) % shard_count
+    return (high << 22) | rng.randrange(1 << 22)
+
+
+def test_parse_ids_and_client_options():
+    assert sharding.parse_ids("0-3, 6,6") == [0, 1, 2, 3, 6]
+    assert sharding.parse_ids("") == []
+    assert sharding.client_options(None, None) == {}
+    assert sharding.client_options(4, None) == {"shard_count": 4}
+    assert sharding.client_options(4, [2, 3]) == {"shard_count": 4, "shard_ids": [2, 3]}
+    with pytest.raises(ValueError):
+        sharding.client_options(None, [0])
+    with pytest.raises(ValueError):
+        sharding.client_options(4, [3, 4])
+
+
+def test_shard_for_and_owns():
+    rng = random.Random(1)
+    assert sharding.shard_for(41771983423143937, 1) == 0
+    assert sharding.shard_for(41771983423143937, 4) == 9959216934 % 4  # the id without its low 22 bits
+    for shard_id in range(8):
+        guild_id = snowflake(shard_id, 8, rng)
+        assert sharding.shard_for(guild_id, 8) == shard_id
+        assert sharding.owns(guild_id, 8, [shard_id])
+        assert not sharding.owns(guild_id, 8, [(shard_id + 1) % 8])
+        assert sharding.owns(guild_id, 8, None)  # one process runs every shard
+        assert sharding.owns(guild_id, None, None)
+
+
+def test_offer_actions_are_taken_once_and_only_by_their_owner(tmp_path):
+    # Two processes (two Database instances on one file) split four shards
+    # and relay offer clicks while a third keeps queueing them
+    shard_count = 4
+    owners = {"a": [0, 1], "b": [2, 3]}
+    rng = random.Random(2)
+    guilds = {offer_id: snowflake(offer_id % shard_count, shard_count, rng) for offer_id in range(1, 601)}
+    path = str(tmp_path / "shared.db")
+
+    async def scenario():
+        dbs = {name: Database(path) for name in ("a", "b", "queue")}
+        for db in dbs.values():
+            db.open(progress=None)
+            await db.start()
+        taken = {"a": [], "b": []}
+        queued = asyncio.Event()
+
+        async def produce():
+            for offer_id, guild_id in guilds.items():
+                await dbs["queue"].queue_offer_action(offer_id, guild_id, "accept", 1, 2, 3, "token", time.time())
+                if offer_id % 50 == 0:
+                    await asyncio.sleep(0)
+            queued.set()
+
+        async def relay(name):
+            while True:
+                done = queued.is_set()
+                taken[name].extend(await dbs[name].take_offer_actions(shard_count, owners[name]))
+                if done:
+                    return
+                await asyncio.sleep(0.001)
+
+        try:
+            await asyncio.gather(produce(), relay("a"), relay("b"))
+            leftover = await dbs["queue"].fetchall("SELECT offer_id FROM offer_actions")
+        finally:
+            for db in dbs.values():
+                await db.stop()
+        return taken, leftover
+
+    taken, leftover = asyncio.run(scenario())
+    ids = {name: [row[0] for row in rows] for name, rows in taken.items()}
+    assert leftover == []
+    assert sorted(ids["a"] + ids["b"]) == sorted(guilds)  # every action taken, none twice
+    for name, rows in taken.items():
+        assert len(set(ids[name])) == len(ids[name])
+        assert all(sharding.shard_for(row[1], shard_count) in owners[name] for row in rows)
+
+
+def test_offer_clicks_for_other_shards_are_relayed(main, loop, league, monkeypatch):
+    # The DM click arrives in a process running one of two shards: once
+    # the one that doesn't own the guild, once the one that does
+    from fakes import FakeInteraction
+
+    guild_id = league.guild.id
+    mine, theirs = sharding.shard_for(guild_id, 2), 1 - sharding.shard_for(guild_id, 2)
+    applied = []
+
+    async def accept_offer(interaction, offer_id):
+        applied.append(offer_id)
+    monkeypatch.setattr(main, "accept_offer", accept_offer)
+    monkeypatch.setattr(main.client, "shard_count", 2)
+
+    async def click(shard_ids):
+        monkeypatch.setattr(main.client, "shard_ids", shard_ids)
+        offer_id = await main.db.create_offer(guild_id, league.players[0].id, league.teams[0].id, league.teams[1].id,
+                                              league.managers[1].id, "🛡️", time.time() + 60)
+        interaction = FakeInteraction(league.guild, league.managers[0])
+        interaction.channel_id = 5
+        interaction.token = "token"
+        interaction.message = SimpleNamespace(id=6)
+        await main.OfferButton("accept", offer_id).callback(interaction)
+        return offer_id
+
+    async def scenario():
+        relayed = await click([theirs])
+        local = await click([mine])
+        elsewhere = await main.db.take_offer_actions(2, [theirs])
+        owner = await main.db.take_offer_actions(2, [mine])
+        return relayed, local, elsewhere, owner
+
+    relayed, local, elsewhere, owner = loop.run_until_complete(scenario())
+    assert applied == [local]  # the owned guild's click applied in place
+    assert elsewhere == []
+    assert [row[0] for row in owner] == [relayed]  # only the owner picks up the relayed one
@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+
+import tracing
+
+
+def test_trace_log_is_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    if "TRACE_LOG" not in os.environ:
+        assert tracing.TRACE_LOG == ""
+    monkeypatch.setattr(tracing, "TRACE_LOG", "")
+    trace = tracing.start("sign")
+    tracing.finish(trace)
+    tracing._current.reset(trace.token)
+    tracing.flush_log()
+    assert os.listdir(tmp_path) == []
+
+
+def test_trace_lines_are_written_off_the_calling_thread(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_LOG", str(path))
+    writers = []
+    write = tracing._write_log
+
+    def spy(path, line):
+        writers.append(threading.current_thread())
+        write(path, line)
+    monkeypatch.setattr(tracing, "_write_log", spy)
+
+    for i in range(50):
+        trace = tracing.start("sign")
+        with tracing.span("db"):
+            pass
+        tracing.finish(trace)
+        tracing._current.reset(trace.token)
+    tracing.flush_log()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 50
+    assert all(line["command"] == "sign" and "db" in line["stages"] for line in lines)
+    assert writers and threading.current_thread() not in writers
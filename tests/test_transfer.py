@@ -0,0 +1,41 @@
+import asyncio
+
+from fakes import FakeInteraction
+
+
+def test_transfer_defers_before_waiting_on_the_offer_dm(main, loop, league):
+    buyer, seller = league.managers
+    player = league.players[1]
+    league.guild.latency = 0.05  # DM delivery
+    interaction = FakeInteraction(league.guild, buyer)
+
+    deferred_at_send = []
+    send = seller.send
+
+    async def watched_send(**kwargs):
+        deferred_at_send.append(interaction.response.is_done())
+        await send(**kwargs)
+
+    seller.send = watched_send
+    loop.run_until_complete(main.transfer.callback(interaction, player))
+
+    assert deferred_at_send == [True]
+    assert [content for _, content in interaction.replies] == [f"✅ **Offer Sent!** Waiting for {seller.mention}."]
+
+
+def test_release_replies_before_rendering_the_card(main, loop, league, monkeypatch):
+    manager, player = league.managers[0], league.players[0]
+    interaction = FakeInteraction(league.guild, manager)
+    events = []
+
+    async def slow_card(*args, **kwargs):
+        events.append(("render", interaction.response.is_done(), len(interaction.replies)))
+        await asyncio.sleep(0.1)  # cold render pool
+        raise RuntimeError("no card in tests")
+
+    monkeypatch.setattr(main, "generate_transaction_card", slow_card)
+    loop.run_until_complete(main.release.callback(interaction, player))
+
+    assert events == [("render", True, 1)]  # deferred, and already answered
+    assert [content for _, content in interaction.replies] == ["✅ Released!"]
+    assert league.teams[0] not in player.roles
@@ -0,0 +1,235 @@
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+
+# --- TRACING ---
+# Every slash command and transfer offer button runs inside a trace. Code
+# on the way wraps its work in span("db" / "roles" / "fetch" / "send"), or
+# reports a duration measured elsewhere with record() (card render / encode
+# happen in the render pool). Spans find their trace through a contextvar,
+# so nothing has to be passed around.
+#
+# When a trace finishes, per-stage totals go into histograms (/metrics), the
+# per-command report (/traces) and, if TRACE_LOG is set, one JSON line in
+# that file. The line is written by a single background thread, so a slow
+# disk never stalls the event loop.
+#
+# Profiling is opt-in: set TRACE_PROFILE_MS and a sample of commands
+# (TRACE_PROFILE_SAMPLE) run under cProfile; the ones slower than the
+# threshold are dumped to TRACE_PROFILE_DIR. cProfile sees the whole event
+# loop, so only one trace is profiled at a time and the dump includes
+# whatever else ran meanwhile.
+
+TRACE_LOG = os.environ.get("TRACE_LOG", "")
+PROFILE_MS = float(os.environ.get("TRACE_PROFILE_MS", 0))
+PROFILE_SAMPLE = float(os.environ.get("TRACE_PROFILE_SAMPLE", 1.0))
+PROFILE_DIR = os.environ.get("TRACE_PROFILE_DIR", "profiles")
+REPORT_WINDOW = 500  # recent durations kept per command for percentiles
+PROFILE_ABANDON = 60.0  # seconds before a never-finished profiled trace is dropped
+
+COMMAND_SECONDS = metrics.histogram("command_seconds", "Slash command / button handling time", ("command", "status"))
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time a command spent in each stage", ("command", "stage"))
+
+_current = contextvars.ContextVar("trace", default=None)
+_profiled = None  # the trace cProfile is currently running for
+_log_file = None
+_log_writer = None  # one thread, so lines stay in order
+_commands = {}  # name -> _CommandStats
+
+
+class Trace:
+    __slots__ = ("name", "started", "spans", "profiler", "token", "finished")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []  # (stage, seconds)
+        self.profiler = None
+        self.token = None
+        self.finished = False
+
+    def stages(self):
+        totals = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+
+class _CommandStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.slow = 0
+        self.recent = deque(maxlen=REPORT_WINDOW)
+        self.stages = {}  # stage -> [traces using it, total seconds]
+
+
+# --- TRACES ---
+
+def start(name):
+    global _profiled
+    trace = Trace(name)
+    if PROFILE_MS:
+        if _profiled and time.perf_counter() - _profiled.started > PROFILE_ABANDON:
+            _profiled.profiler.disable()  # its command never reported back
+            _profiled = None
+        if _profiled is None and random.random() < PROFILE_SAMPLE:
+            _profiled = trace
+            trace.profiler = cProfile.Profile()
+            trace.profiler.enable()
+    trace.token = _current.set(trace)
+    return trace
+
+
+def finish(trace, status="ok", error=None):
+    global _profiled
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    duration = time.perf_counter() - trace.started
+    stages = trace.stages()
+
+    profile_path = None
+    if trace.profiler and _profiled is trace:
+        trace.profiler.disable()
+        _profiled = None
+        if duration * 1000 >= PROFILE_MS:
+            profile_path = _dump_profile(trace)
+
+    COMMAND_SECONDS.observe(duration, trace.name, status)
+    stats = _commands.get(trace.name)
+    if stats is None:
+        stats = _commands[trace.name] = _CommandStats()
+    stats.count += 1
+    stats.errors += status != "ok"
+    stats.slow += profile_path is not None
+    stats.recent.append(duration)
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.observe(seconds, trace.name, stage)
+        entry = stats.stages.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    _log({
+        "ts": round(time.time(), 3),
+        "command": trace.name,
+        "status": status,
+        "ms": round(duration * 1000, 3),
+        "stages": {stage: round(seconds * 1000, 3) for stage, seconds in stages.items()},
+        "profile": profile_path,
+        "error": repr(error) if error is not None else None,
+    })
+
+
+@contextmanager
+def span(stage):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((stage, time.perf_counter() - started))
+
+
+def record(stage, seconds):
+    trace = _current.get()
+    if trace is not None:
+        trace.spans.append((stage, seconds))
+
+
+def traced(name):
+    # For callbacks the command tree doesn't see, e.g. persistent buttons
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            trace = start(name)
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException as e:
+                finish(trace, "error", e)
+                raise
+            else:
+                finish(trace)
+            finally:
+                _current.reset(trace.token)
+            return result
+        return inner
+    return wrap
+
+
+# --- OUTPUT ---
+
+def _dump_profile(trace):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{trace.name.replace(' ', '_')}.prof")
+        trace.profiler.dump_stats(path)
+        return path
+    except OSError as e:
+        print(f"System: Could not write profile. Error: {e}")
+        return None
+
+
+def _log(entry):
+    global _log_writer
+    if not TRACE_LOG:
+        return
+    if _log_writer is None:
+        _log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-log")
+    _log_writer.submit(_write_log, TRACE_LOG, json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _write_log(path, line):
+    global _log_file
+    try:
+        if _log_file is None or _log_file.name != path:
+            if _log_file is not None:
+                _log_file.close()
+            _log_file = open(path, "a", encoding="utf-8")
+        _log_file.write(line)
+        _log_file.flush()
+    except OSError as e:
+        print(f"System: Could not write trace log. Error: {e}")
+
+
+def flush_log():
+    # Blocks until every line queued so far is on disk
+    if _log_writer is not None:
+        _log_writer.submit(lambda: None).result()
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report():
+    # Per command: counts, recent latency percentiles and where the time went
+    out = {}
+    for name, stats in sorted(_commands.items()):
+        recent = list(stats.recent)
+        out[name] = {
+            "count": stats.count,
+            "errors": stats.errors,
+            "slow_profiles": stats.slow,
+            "p50_ms": round(_percentile(recent, 0.5) * 1000, 3),
+            "p95_ms": round(_percentile(recent, 0.95) * 1000, 3),
+            "max_ms": round(max(recent) * 1000, 3),
+            "stages": {
+                stage: {"traces": n, "avg_ms": round(total / n * 1000, 3)}
+                for stage, (n, total) in sorted(stats.stages.items())
+            },
+        }
+    return out